@@ -1,15 +1,23 @@
-import io
+import os
 import asyncio
+import time
 import uuid
-import pandas as pd
 from fastapi import FastAPI, UploadFile, File, HTTPException
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
-from typing import Dict
-from multiprocessing import Process
+import pandas as pd
+from typing import Dict, Optional, Union
+from concurrent.futures import ThreadPoolExecutor
 
 from ppo_agent.agent import PPOAgent
-from ppo_agent.data_loader import load_recent_candles, load_from_csv
-from ppo_agent.status import save_training_status, load_training_status
+from ppo_agent.data_loader import load_recent_candles
+from ppo_agent.online_worker import read_health, start_online_worker, stop_online_worker
+from ppo_agent.prediction_cache import PredictionCache, candle_bounds, closed_candles
+from ppo_agent.enums import SUPPORTED_TIMEFRAMES, INTERVAL_TO_TIMESPAN
+from ppo_agent.metrics import REGISTRY, stats_collector
+from ppo_agent.status import get_job_store
+from ppo_agent.scheduler import TrainingExecutor
+from ppo_agent.ingest import UPLOADS_DIR, validate_csv_header
 
 from fastapi import HTTPException, Query
 from ppo_agent.utils import TrainingJournal
@@ -18,7 +26,35 @@ from ppo_agent.utils import TrainingJournal
 
 training_journal = TrainingJournal("ppo_agent/training_journal.json")
 app = FastAPI(title="PPO Agent API")
-agent = PPOAgent()
+# Онлайн-дообучение идёт в отдельном процессе, новые версии моделей подхватываются по mtime
+agent = PPOAgent(watch_models=float(os.getenv("MODEL_WATCH_INTERVAL", "5")))
+
+# process — воркер дообучения запускается вместе с API, external — отдельным
+# сервисом (python -m ppo_agent.online_worker), off — без онлайн-дообучения
+ONLINE_TRAINING = os.getenv("ONLINE_TRAINING", "process")
+online_worker = None
+
+# Ограниченный пул потоков для блокирующих запросов к брокеру и инференса,
+# чтобы они не останавливали event loop
+PREDICT_MAX_WORKERS = int(os.getenv("PREDICT_MAX_WORKERS", "8"))
+predict_executor = ThreadPoolExecutor(max_workers=PREDICT_MAX_WORKERS, thread_name_prefix="predict")
+
+# Сигнал меняется только с закрытием свечи: результаты кэшируются до следующей границы
+prediction_cache = PredictionCache(max_entries=int(os.getenv("PREDICTION_CACHE_SIZE", "10000")))
+
+# Статистика кэшей снимается в момент выгрузки /metrics, без счётчиков на горячем пути
+REGISTRY.register_collector(stats_collector(
+    "ppo_model_cache", agent.models.stats, counters=["hits", "misses", "evictions", "reloads"]))
+REGISTRY.register_collector(stats_collector(
+    "ppo_prediction_cache", prediction_cache.stats, counters=["hits", "misses", "shared"]))
+
+UPLOAD_CHUNK_SIZE = 1 << 20
+
+# Общий пул процессов обучения для всех загрузок CSV
+training_executor = TrainingExecutor(
+    max_workers=int(os.getenv("TRAIN_MAX_WORKERS", "0")) or None,
+    max_concurrent_jobs=int(os.getenv("TRAIN_MAX_CONCURRENT_JOBS", "2")),
+)
 
 
 class InferenceRequest(BaseModel):
@@ -26,19 +62,55 @@ class InferenceRequest(BaseModel):
 
 
 class InferenceResponse(BaseModel):
-    predictions: Dict[str, Dict[str, float]]
+    # {timeframe: {"signal", "confidence"}} или {timeframe: {"error": текст}}
+    predictions: Dict[str, Dict[str, Union[float, str]]]
 
 
 @app.post("/predict", response_model=InferenceResponse)
 async def predict_growth(request: InferenceRequest):
+    loop = asyncio.get_running_loop()
+    asset = request.asset
+    timeframes = agent.get_trained_timeframes(asset)
+    now = time.time()
+
+    # Ключ — граница последней закрытой свечи и версия модели; живёт до закрытия следующей свечи
+    requests = {}
+    for timeframe in timeframes:
+        span = INTERVAL_TO_TIMESPAN[SUPPORTED_TIMEFRAMES[timeframe]].total_seconds()
+        last_closed, expires_at = candle_bounds(now, span)
+        requests[(asset, timeframe, last_closed, agent.model_version(f"{asset}_{timeframe}"))] = expires_at
+
+    async def load(key) -> pd.DataFrame:
+        _, timeframe, last_closed, _ = key
+        df = await loop.run_in_executor(predict_executor, load_recent_candles, asset, timeframe)
+        return closed_candles(df, last_closed)
+
+    async def compute(keys) -> Dict:
+        # Свечи грузятся параллельно, промахи кэша считаются одним батчем predict_batch
+        frames = await asyncio.gather(*(load(key) for key in keys), return_exceptions=True)
+        values = {key: frame for key, frame in zip(keys, frames) if isinstance(frame, Exception)}
+        loaded = {key[1]: frame for key, frame in zip(keys, frames) if not isinstance(frame, Exception)}
+        if loaded:
+            predictions = await loop.run_in_executor(predict_executor, agent.predict_batch, asset, loaded)
+            # Ошибка таймфрейма (нет модели, плохие свечи) достаётся только его ключу
+            for key in keys:
+                prediction = predictions.get(key[1])
+                if isinstance(prediction, Exception):
+                    values[key] = prediction
+                elif prediction is not None:
+                    signal, confidence = prediction
+                    values[key] = {"signal": signal, "confidence": confidence}
+        return values
+
+    # Одинаковые запросы разных клиентов считаются один раз
+    predictions = await prediction_cache.get_or_compute_many(requests, compute)
+
     result = {}
-    for timeframe in agent.get_trained_timeframes(request.asset):
-        try:
-            df = load_recent_candles(request.asset, timeframe)
-            signal, confidence = agent.predict(request.asset, timeframe, df)
-            result[timeframe] = {"signal": signal, "confidence": confidence}
-        except Exception as e:
-            result[timeframe] = {"error": str(e)}
+    for key, prediction in predictions.items():
+        if isinstance(prediction, Exception):
+            result[key[1]] = {"error": str(prediction)}
+        else:
+            result[key[1]] = prediction
     return {"predictions": result}
 
 
@@ -47,63 +119,102 @@ async def train_from_csv(file: UploadFile = File(...)):
     try:
         job_id = str(uuid.uuid4())
         filename = file.filename
-        contents = await file.read()
-        csv_data = io.StringIO(contents.decode("utf-8"))
-        df = pd.read_csv(csv_data)
-
-        def background_train():
-            try:
-                save_training_status(job_id, "started", filename)
-                df_loaded = load_from_csv(io.StringIO(contents.decode("utf-8")))
-                grouped = df_loaded.groupby(["asset", "timeframe"])
-                for (asset, timeframe), group in grouped:
-                    features = group.drop(columns=["asset", "timeframe"])
-                    agent.train(asset, timeframe, features)
-                save_training_status(job_id, "finished", filename)
-            except Exception as e:
-                save_training_status(job_id, f"failed: {e}", filename)
-
-        process = Process(target=background_train)
-        process.start()
-
-        return {"status": "training started", "job_id": job_id, "filename": filename}
+
+        # Файл пишется на диск по частям и целиком в память API не загружается;
+        # блокирующий ввод-вывод идёт в пуле потоков, а не в event loop
+        loop = asyncio.get_running_loop()
+        UPLOADS_DIR.mkdir(parents=True, exist_ok=True)
+        upload_path = UPLOADS_DIR / f"{job_id}.csv"
+        f = await loop.run_in_executor(None, open, upload_path, "wb")
+        try:
+            while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                await loop.run_in_executor(None, f.write, chunk)
+        finally:
+            await loop.run_in_executor(None, f.close)
+
+        try:
+            await loop.run_in_executor(None, validate_csv_header, upload_path)
+        except Exception:
+            upload_path.unlink(missing_ok=True)
+            raise
+
+        training_executor.submit_csv(job_id, filename, upload_path)
+
+        return {"status": "training queued", "job_id": job_id, "filename": filename}
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Ошибка обработки файла: {e}")
 
 
 @app.get("/train/status")
-async def get_training_status():
-    return load_training_status()
-
-
+async def get_training_status(
+    status: Optional[str] = Query(None, description="Фильтр по состоянию: queued, started, finished, failed, cancelled"),
+    limit: int = Query(100, ge=1, le=1000),
+    offset: int = Query(0, ge=0),
+):
+    store = get_job_store()
+    return {
+        "total": store.count(status),
+        "limit": limit,
+        "offset": offset,
+        "jobs": store.list(status, limit, offset),
+    }
+
+
+@app.get("/train/status/{job_id}")
+async def get_training_job_status(job_id: str):
+    # Активные задания этого процесса — из планировщика, остальные — из хранилища
+    progress = training_executor.progress(job_id) or get_job_store().get(job_id)
+    if progress is None:
+        raise HTTPException(status_code=404, detail=f"Задание {job_id} не найдено")
+    return progress
+
+
+@app.delete("/train/{job_id}")
+async def cancel_training(job_id: str):
+    if not training_executor.cancel(job_id):
+        raise HTTPException(status_code=404, detail=f"Нет активного задания {job_id}")
+    return {"status": "cancelled", "job_id": job_id}
 
 
 @app.on_event("startup")
 async def continuous_online_training():
-    async def train_loop():
-        while True:
-            for asset in agent.get_assets():
-                for timeframe in agent.get_trained_timeframes(asset):
-                    try:
-                        df = load_recent_candles(asset, timeframe)
-                        agent.train(asset, timeframe, df)
-                        await asyncio.sleep(0.5)
-                    except Exception as e:
-                        print(f"[TRAIN ERROR] {asset} {timeframe}: {e}")
-            await asyncio.sleep(60)
-
-    asyncio.create_task(train_loop())
+    global online_worker
+    if ONLINE_TRAINING == "process":
+        online_worker = start_online_worker()
+
+
+@app.on_event("shutdown")
+async def shutdown_executors():
+    if online_worker is not None:
+        stop_online_worker(*online_worker)
+    predict_executor.shutdown(wait=False)
+    training_executor.shutdown()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+@app.get("/health")
+async def health():
+    online = read_health() if ONLINE_TRAINING != "off" else {"alive": None, "reason": "disabled"}
+    if online_worker is not None and not online_worker[0].is_alive():
+        online["alive"] = False
+        online["reason"] = f"process exited with code {online_worker[0].exitcode}"
+    return {
+        "status": "ok" if online.get("alive") is not False else "degraded",
+        "online_training": online,
+        "models": agent.models.stats(),
+        "prediction_cache": prediction_cache.stats(),
+    }
 
 @app.get("/training/intervals")
 async def get_training_intervals(figi: str = Query(..., description="FIGI актива")):
     """
     Возвращает список интервалов, на которых обучалась модель для указанного FIGI.
     """
-    result = {}
-    for key, intervals in training_journal.data.items():
-        if key.startswith(figi):
-            _, timeframe = key.split("_", 1)
-            result[timeframe] = intervals
+    result = training_journal.get_all_intervals(figi)
     if not result:
         raise HTTPException(status_code=404, detail=f"Нет обученных интервалов для {figi}")
     return {"figi": figi, "trained_intervals": result}
\ No newline at end of file
@@ -0,0 +1,65 @@
+"""
+Сравнение задержки инференса PPOModel на CPU: три отдельных вызова get_*,
+обычный forward, объединённый рантайм (eager и TorchScript) и numpy.
+
+    python benchmarks/bench_inference.py --input-dim 16 --hidden-dim 128
+"""
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import torch
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from ppo_agent.inference import NumpyRuntime, TorchRuntime, export_weights
+from ppo_agent.model import PPOModel
+
+
+def _time(fn, repeat: int) -> float:
+    fn()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - start) / repeat * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--input-dim", type=int, default=16)
+    parser.add_argument("--hidden-dim", type=int, default=128)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 32, 1024])
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=1)
+    args = parser.parse_args()
+
+    torch.set_num_threads(args.threads)
+    model = PPOModel(args.input_dim, args.hidden_dim).eval()
+
+    runtimes = {
+        "torch_get_heads": lambda x: (model.get_policy(x), model.get_confidence(x), model.get_value(x)),
+        "torch_forward": model,
+    }
+    fused = TorchRuntime.from_model(model)
+    scripted = TorchRuntime.from_model(model, script=True)
+    numpy_runtime = NumpyRuntime(export_weights(model))
+
+    print(f"{'batch':>6} {'runtime':>18} {'us/batch':>10} {'us/row':>8}")
+    for batch in args.batch_sizes:
+        x = np.random.default_rng(0).normal(size=(batch, args.input_dim)).astype(np.float32)
+        tensor = torch.from_numpy(x)
+        results = {}
+        with torch.inference_mode():
+            for name, fn in runtimes.items():
+                results[name] = _time(lambda: fn(tensor), args.repeat)
+        results["fused_torch"] = _time(lambda: fused(x), args.repeat)
+        results["fused_torchscript"] = _time(lambda: scripted(x), args.repeat)
+        results["numpy"] = _time(lambda: numpy_runtime(x), args.repeat)
+        for name, us in results.items():
+            print(f"{batch:>6} {name:>18} {us:>10.1f} {us / batch:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
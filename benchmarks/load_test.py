@@ -0,0 +1,152 @@
+"""
+Нагрузочный тест API: задержки p50/p95/p99 и пропускная способность
+для /predict и /train/csv при заданной конкурентности.
+
+Офлайн-запуск API на replay-брокере:
+
+    PPO_BROKER=replay PPO_REPLAY_LATENCY_MS=30 PPO_REPLAY_JITTER_MS=10 \\
+        uvicorn api.app:app --port 8000
+    python benchmarks/load_test.py --endpoint predict --concurrency 32 --duration 30 \\
+        --assets BBG000B9XRY4 BBG004730N88
+    python benchmarks/load_test.py --endpoint train_csv --concurrency 4 --requests 40 --csv-rows 5000
+"""
+import argparse
+import asyncio
+import io
+import json
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+
+def synthetic_training_csv(rows: int, assets: List[str], seed: int = 0) -> bytes:
+    """CSV для /train/csv: свечи с индикаторами по активам и таймфреймам"""
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 1e-3, rows)))
+    df = pd.DataFrame({
+        "asset": rng.choice(assets, rows),
+        "timeframe": rng.choice(["1m", "1h"], rows),
+        "timestamp": pd.date_range("2025-01-01", periods=rows, freq="min").astype(str),
+        "open": close, "high": close * 1.001, "low": close * 0.999, "close": close,
+        "volume": rng.integers(1, 10_000, rows),
+        "rsi": rng.uniform(0, 100, rows),
+        "macd": rng.normal(0, 1, rows),
+        "atr": rng.uniform(0, 2, rows),
+    })
+    buffer = io.StringIO()
+    df.to_csv(buffer, index=False)
+    return buffer.getvalue().encode()
+
+
+async def _predict(session, base_url: str, asset: str) -> int:
+    async with session.post(f"{base_url}/predict", json={"asset": asset}) as response:
+        await response.read()
+        return response.status
+
+
+async def _train_csv(session, base_url: str, payload: bytes) -> int:
+    form = aiohttp.FormData()
+    form.add_field("file", payload, filename="load_test.csv", content_type="text/csv")
+    async with session.post(f"{base_url}/train/csv", data=form) as response:
+        await response.read()
+        return response.status
+
+
+async def run_load(base_url: str, endpoint: str, concurrency: int, total: Optional[int], duration: Optional[float],
+                   assets: List[str], payload: Optional[bytes], timeout: float) -> Dict:
+    latencies: List[float] = []
+    statuses: Counter = Counter()
+    issued = 0
+    deadline = time.perf_counter() + duration if duration else None
+
+    def next_request() -> Optional[int]:
+        nonlocal issued
+        if total is not None and issued >= total:
+            return None
+        if deadline is not None and time.perf_counter() >= deadline:
+            return None
+        issued += 1
+        return issued
+
+    async def client(session):
+        while (n := next_request()) is not None:
+            start = time.perf_counter()
+            try:
+                if endpoint == "predict":
+                    status = await _predict(session, base_url, assets[n % len(assets)])
+                else:
+                    status = await _train_csv(session, base_url, payload)
+                statuses[str(status)] += 1
+            except Exception as e:
+                statuses[type(e).__name__] += 1
+            latencies.append(time.perf_counter() - start)
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=timeout)) as session:
+        started = time.perf_counter()
+        await asyncio.gather(*(client(session) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    ms = np.array(latencies) * 1e3
+    return {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "elapsed_s": elapsed,
+        "throughput_rps": len(latencies) / elapsed if elapsed else 0.0,
+        "p50_ms": float(np.percentile(ms, 50)) if len(ms) else None,
+        "p95_ms": float(np.percentile(ms, 95)) if len(ms) else None,
+        "p99_ms": float(np.percentile(ms, 99)) if len(ms) else None,
+        "max_ms": float(ms.max()) if len(ms) else None,
+        "statuses": dict(statuses),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--endpoint", choices=["predict", "train_csv"], default="predict")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=None, help="Всего запросов (по умолчанию — по --duration)")
+    parser.add_argument("--duration", type=float, default=None, help="Длительность теста, секунд")
+    parser.add_argument("--assets", nargs="+", default=["BBG000B9XRY4"])
+    parser.add_argument("--csv-rows", type=int, default=2000)
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--output", type=Path, default=None, help="Сохранить отчёт в JSON")
+    args = parser.parse_args()
+
+    if aiohttp is None:
+        print("❌ Для нагрузочного теста нужен пакет aiohttp")
+        return 2
+    if args.requests is None and args.duration is None:
+        args.duration = 10.0
+
+    payload = synthetic_training_csv(args.csv_rows, args.assets) if args.endpoint == "train_csv" else None
+    report = asyncio.run(run_load(args.url, args.endpoint, args.concurrency, args.requests, args.duration,
+                                  args.assets, payload, args.timeout))
+
+    print(f"🚀 {report['endpoint']} x{report['concurrency']}: {report['requests']} запросов "
+          f"за {report['elapsed_s']:.1f} с, {report['throughput_rps']:.1f} rps")
+    if report["requests"]:
+        print(f"⏱️ p50 {report['p50_ms']:.1f} ms | p95 {report['p95_ms']:.1f} ms | "
+              f"p99 {report['p99_ms']:.1f} ms | max {report['max_ms']:.1f} ms")
+    print(f"📊 Ответы: {report['statuses']}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,281 @@
+"""
+Микробенчмарки горячих путей данных и признаков на синтетических свечах.
+
+    python benchmarks/run_benchmarks.py --max-size 100000 --output bench.json
+    python benchmarks/run_benchmarks.py --baseline benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --save-baseline benchmarks/baseline.json
+
+Для каждого случая и размера данных считается медиана и минимум времени
+нескольких прогонов. При сравнении с базовой линией регрессией считается рост
+медианы больше чем на --threshold; в этом случае код выхода — 1.
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from statistics import median
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+DEFAULT_SIZES = [100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000]
+BASE_TIME = datetime(2020, 1, 1)
+
+_candles_cache: Dict[int, pd.DataFrame] = {}
+
+
+def synthetic_candles(size: int, seed: int = 0) -> pd.DataFrame:
+    """Случайное блуждание OHLCV с минутными свечами; одинаково при каждом запуске"""
+    if size not in _candles_cache:
+        rng = np.random.default_rng(seed)
+        close = 100.0 * np.exp(np.cumsum(rng.normal(0, 1e-3, size)))
+        open_ = np.concatenate([[close[0]], close[:-1]])
+        spread = np.abs(rng.normal(0, 5e-4, size)) * close
+        _candles_cache[size] = pd.DataFrame({
+            "open": open_,
+            "high": np.maximum(open_, close) + spread,
+            "low": np.minimum(open_, close) - spread,
+            "close": close,
+            "volume": rng.integers(1, 10_000, size).astype(np.float64),
+        })
+    return _candles_cache[size]
+
+
+class Case:
+    """Бенчмарк: setup(size) готовит данные и возвращает (функцию замера, число операций)"""
+
+    def __init__(self, name: str, setup: Callable[[int, Path], Tuple[Callable[[], object], int]],
+                 max_size: int = DEFAULT_SIZES[-1]):
+        self.name = name
+        self.setup = setup
+        self.max_size = max_size
+
+
+def _compute_all_indicators(size: int, tmp: Path):
+    from ppo_agent.indicators import compute_all_indicators
+    df = synthetic_candles(size)
+    return lambda: compute_all_indicators(df), size
+
+
+def _compute_features(size: int, tmp: Path):
+    from ppo_agent.features import compute_features
+    df = synthetic_candles(size)
+    return lambda: compute_features(df), size
+
+
+def _compute_features_ta(size: int, tmp: Path):
+    """Эталонный расчёт библиотекой ta для сравнения с ядрами"""
+    from ppo_agent.features import compute_features
+    df = synthetic_candles(size)
+    return lambda: compute_features(df, backend="ta"), size
+
+
+def _extract_features(size: int, tmp: Path):
+    from ppo_agent.features import extract_features
+    from ppo_agent.indicators import compute_all_indicators
+    df = compute_all_indicators(synthetic_candles(size))
+    return lambda: extract_features(df), size
+
+
+def _journal(size: int, tmp: Path):
+    """Журнал с size/100 непересекающимися интервалами (по 100 свечей на интервал)"""
+    from ppo_agent.utils import TrainingJournal
+    n_intervals = max(1, size // 100)
+    root = tmp / f"journal_{size}"
+    path = root / "FIGI" / "FIGI_1m.jsonl"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        for i in range(n_intervals):
+            start = BASE_TIME + timedelta(minutes=200 * i)
+            f.write(json.dumps({"from": start.isoformat(), "to": (start + timedelta(minutes=100)).isoformat()}) + "\n")
+    journal = TrainingJournal(str(root))
+    journal.was_trained("FIGI", "1m", BASE_TIME, BASE_TIME)
+    return journal, n_intervals
+
+
+def _journal_was_trained(size: int, tmp: Path):
+    journal, n_intervals = _journal(size, tmp)
+    rng = np.random.default_rng(1)
+    queries = [BASE_TIME + timedelta(minutes=int(m)) for m in rng.integers(0, 200 * n_intervals, 1000)]
+
+    def run():
+        for start in queries:
+            journal.was_trained("FIGI", "1m", start, start + timedelta(minutes=50))
+    return run, len(queries)
+
+
+def _journal_record_training(size: int, tmp: Path):
+    journal, n_intervals = _journal(size, tmp)
+    counter = [n_intervals]
+
+    def run():
+        for _ in range(100):
+            start = BASE_TIME + timedelta(minutes=200 * counter[0])
+            journal.record_training("FIGI", "1m", start, start + timedelta(minutes=100))
+            counter[0] += 1
+    return run, 100
+
+
+def _register_figi(size: int, tmp: Path):
+    """register_figi в реестр, где уже зарегистрировано size активов"""
+    from ppo_agent.asset_registry import AssetRegistry
+    registry = AssetRegistry(tmp / f"registry_{size}.json", flush_interval=0)
+    registry.register_many((f"BBG{i:09d}", "tinkoff") for i in range(size))
+    figis = [f"BBG{i:09d}" for i in np.random.default_rng(2).integers(0, size * 2, 1000)]
+
+    def run():
+        for figi in figis:
+            registry.register_figi(figi, "okx")
+        registry.flush()
+    return run, len(figis)
+
+
+def _ppo_forward(size: int, tmp: Path):
+    """PPOModel.forward на батче из size наблюдений"""
+    import torch
+    from ppo_agent.model import PPOModel
+    torch.set_num_threads(1)
+    model = PPOModel(input_dim=16).eval()
+    x = torch.from_numpy(np.random.default_rng(3).normal(size=(size, 16)).astype(np.float32))
+
+    def run():
+        with torch.inference_mode():
+            model(x)
+    return run, size
+
+
+CASES = [
+    Case("indicators.compute_all_indicators", _compute_all_indicators),
+    Case("features.compute_features", _compute_features, max_size=1_000_000),
+    Case("features.compute_features[ta]", _compute_features_ta, max_size=100_000),
+    Case("features.extract_features", _extract_features),
+    Case("journal.was_trained", _journal_was_trained),
+    Case("journal.record_training", _journal_record_training),
+    Case("asset_registry.register_figi", _register_figi, max_size=100_000),
+    Case("model.PPOModel.forward", _ppo_forward, max_size=1_000_000),
+]
+
+
+def measure(fn: Callable[[], object], min_repeats: int = 3, min_time: float = 0.5, max_time: float = 10.0) -> List[float]:
+    """Прогоны до min_repeats и min_time суммарно, но не дольше max_time"""
+    times: List[float] = []
+    while True:
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+        total = sum(times)
+        if (len(times) >= min_repeats and total >= min_time) or total >= max_time:
+            return times
+
+
+def run_suite(cases: List[Case], sizes: List[int], min_repeats: int) -> List[dict]:
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for case in cases:
+            for size in sizes:
+                if size > case.max_size:
+                    continue
+                entry = {"name": case.name, "size": size}
+                try:
+                    fn, ops = case.setup(size, Path(tmp))
+                    fn()  # прогрев: импорты, кэши, JIT
+                    times = measure(fn, min_repeats=min_repeats)
+                    entry.update({
+                        "median_s": median(times),
+                        "min_s": min(times),
+                        "repeats": len(times),
+                        "ops": ops,
+                        "ns_per_op": median(times) / ops * 1e9,
+                    })
+                    print(f"{case.name:<36} {size:>10} {entry['median_s'] * 1e3:>12.3f} ms {entry['ns_per_op']:>12.1f} ns/op")
+                except Exception as e:
+                    entry["error"] = f"{type(e).__name__}: {e}"
+                    print(f"{case.name:<36} {size:>10} ❌ {entry['error']}")
+                results.append(entry)
+    return results
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+
+def metadata() -> dict:
+    import torch
+    return {
+        "timestamp": datetime.utcnow().isoformat(),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "torch": torch.__version__,
+    }
+
+
+def compare(results: List[dict], baseline: dict, threshold: float) -> List[dict]:
+    """Сравнение медиан с базовой линией; возвращает регрессии"""
+    base = {(r["name"], r["size"]): r for r in baseline["results"] if "median_s" in r}
+    regressions = []
+    print(f"\n{'case':<36} {'size':>10} {'baseline ms':>12} {'current ms':>12} {'ratio':>7}")
+    for result in results:
+        old = base.get((result["name"], result["size"]))
+        if old is None or "median_s" not in result:
+            continue
+        ratio = result["median_s"] / old["median_s"]
+        mark = ""
+        if ratio > 1 + threshold:
+            mark = " ⚠️ регрессия"
+            regressions.append({**result, "baseline_s": old["median_s"], "ratio": ratio})
+        elif ratio < 1 - threshold:
+            mark = " ✅"
+        print(f"{result['name']:<36} {result['size']:>10} {old['median_s'] * 1e3:>12.3f} "
+              f"{result['median_s'] * 1e3:>12.3f} {ratio:>7.2f}{mark}")
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--max-size", type=int, default=None, help="Пропустить размеры больше указанного")
+    parser.add_argument("--cases", nargs="+", default=None, help="Подстроки имён случаев")
+    parser.add_argument("--min-repeats", type=int, default=3)
+    parser.add_argument("--output", type=Path, default=None, help="Куда сохранить результаты в JSON")
+    parser.add_argument("--baseline", type=Path, default=None, help="JSON с базовой линией для сравнения")
+    parser.add_argument("--save-baseline", type=Path, default=None, help="Сохранить результаты как базовую линию")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Допустимый рост медианы, доля")
+    args = parser.parse_args()
+
+    sizes = [s for s in args.sizes if args.max_size is None or s <= args.max_size]
+    cases = [c for c in CASES if not args.cases or any(pattern in c.name for pattern in args.cases)]
+
+    report = {"meta": metadata(), "results": run_suite(cases, sizes, args.min_repeats)}
+    for path in filter(None, [args.output, args.save_baseline]):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Результаты сохранены: {path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report["results"], json.load(f), args.threshold)
+        if regressions:
+            print(f"\n❌ Регрессий: {len(regressions)}")
+            return 1
+        print("\n✅ Регрессий нет")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,31 +1,63 @@
 # broker.py
 
-from tinkoff_api import TinkoffAPI
-from okx_api import OKXAPI
+import os
+import threading
+
+
+def _tinkoff():
+    from brokers.tinkoff_api import TinkoffAPI
+    return TinkoffAPI(token=os.environ["TINKOFF_TOKEN"])
+
+
+def _okx():
+    from brokers.okx_api import OKXAPI
+    return OKXAPI()
+
+
+def _replay():
+    from brokers.replay_api import ReplayBroker
+    return ReplayBroker.from_env()
+
 
 class Broker:
-    _brokers = {
-        "TINKOFF": TinkoffAPI(),
-        "OKX": OKXAPI(),
+    # Клиенты создаются при первом обращении: офлайн-режиму (REPLAY) не нужны
+    # ни токен Tinkoff, ни сеть
+    _factories = {
+        "TINKOFF": _tinkoff,
+        "OKX": _okx,
+        "REPLAY": _replay,
     }
+    _brokers = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def get(cls, broker_name):
+        name = broker_name.upper()
+        with cls._lock:
+            if name not in cls._brokers:
+                factory = cls._factories.get(name)
+                if factory is None:
+                    return None
+                cls._brokers[name] = factory()
+            return cls._brokers[name]
 
     @classmethod
     def get_price(cls, broker_name, figi):
-        broker_api = cls._brokers[broker_name]
+        broker_api = cls.get(broker_name)
         return broker_api.get_price(figi)
 
     @classmethod
     def buy(cls, broker_name, figi, amount):
-        broker_api = cls._brokers[broker_name]
+        broker_api = cls.get(broker_name)
         return broker_api.buy(figi, amount)
 
     @classmethod
     def sell(cls, broker_name, figi, amount):
-        broker_api = cls._brokers[broker_name]
+        broker_api = cls.get(broker_name)
         return broker_api.sell(figi, amount)
 
 def get_broker(broker_name: str):
     """
-    Возвращает объект брокера по имени (TINKOFF, OKX и т.д.)
+    Возвращает объект брокера по имени (TINKOFF, OKX, REPLAY и т.д.)
     """
-    return Broker._brokers.get(broker_name.upper())
\ No newline at end of file
+    return Broker.get(broker_name)
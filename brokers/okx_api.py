@@ -1,16 +1,56 @@
+import asyncio
+import time
 import requests
+import numpy as np
 import pandas as pd
 import logging
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from ppo_agent.metrics import BROKER_ERRORS
+
+try:
+    import aiohttp
+except ImportError:  # aiohttp нужен только асинхронному клиенту
+    aiohttp = None
 
 BASE_URL = 'https://www.okx.com'
 
+CANDLES_ENDPOINT = '/api/v5/market/candles'
+HISTORY_CANDLES_ENDPOINT = '/api/v5/market/history-candles'
+
+# Лимиты OKX REST API по IP: (запросов, за секунд)
+ENDPOINT_RATE_LIMITS = {
+    CANDLES_ENDPOINT: (40, 2.0),
+    HISTORY_CANDLES_ENDPOINT: (20, 2.0),
+}
+
+CANDLE_COLUMNS = ['time', 'open', 'high', 'low', 'close', 'volume']
+
+
+def candles_to_frame(rows: List[List[str]]) -> pd.DataFrame:
+    """
+    Векторный разбор ответа OKX: строки [ts, o, h, l, c, vol, ...] -> DataFrame на numpy-массивах,
+    отсортированный по времени.
+    """
+    if not rows:
+        return pd.DataFrame(columns=CANDLE_COLUMNS)
+
+    raw = np.array([row[:6] for row in rows], dtype=object)
+    times = raw[:, 0].astype(np.int64)
+    values = pd.DataFrame(raw[:, 1:6]).apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64)
+
+    order = np.argsort(times, kind='stable')
+    df = pd.DataFrame(values[order], columns=CANDLE_COLUMNS[1:])
+    df.insert(0, 'time', pd.to_datetime(times[order], unit='ms'))
+    return df
+
 
 class OKXAPI:
     def __init__(self):
         self.session = requests.Session()
 
     def get_historical_candles(self, instrument_id, interval='1h', limit=100):
-        endpoint = f'{BASE_URL}/api/v5/market/history-candles'
+        endpoint = f'{BASE_URL}{HISTORY_CANDLES_ENDPOINT}'
         params = {
             'instId': instrument_id,
             'bar': interval,
@@ -20,27 +60,133 @@ class OKXAPI:
         response = self.session.get(endpoint, params=params)
 
         if response.status_code != 200:
+            BROKER_ERRORS.labels("OKXAPI", f"http_{response.status_code}").inc()
             logging.error(f"Ошибка при запросе данных с OKX: {response.text}")
             return pd.DataFrame()
 
         data = response.json()
 
         if 'data' not in data:
+            BROKER_ERRORS.labels("OKXAPI", "bad_payload").inc()
             logging.error(f"Некорректный формат данных с OKX: {data}")
             return pd.DataFrame()
 
-        candles = data['data']
+        return candles_to_frame(data['data'])
+
+
+class TokenBucket:
+    """Асинхронный токен-бакет: не больше capacity запросов за period секунд"""
+
+    def __init__(self, capacity: int, period: float):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
 
-        df = pd.DataFrame(candles, columns=[
-            'time', 'open', 'high', 'low', 'close', 'volume', 'volCcy', 'volCcyQuote', 'confirm'
-        ])
 
-        df = df[['time', 'open', 'high', 'low', 'close', 'volume']]
+class AsyncOKXAPI:
+    """
+    Асинхронный клиент OKX с общим пулом соединений и ограничением частоты
+    запросов по лимитам каждого эндпоинта. Позволяет параллельно выгружать
+    свечи по многим инструментам и интервалам.
+    """
+
+    def __init__(self, base_url: str = BASE_URL, max_connections: int = 50,
+                 rate_limits: Optional[Dict[str, Tuple[int, float]]] = None,
+                 timeout: float = 10.0, max_retries: int = 3):
+        if aiohttp is None:
+            raise ImportError("Для AsyncOKXAPI требуется пакет aiohttp")
+        self.base_url = base_url.rstrip('/')
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self.max_retries = max_retries
+        limits = ENDPOINT_RATE_LIMITS if rate_limits is None else rate_limits
+        self.buckets = {path: TokenBucket(count, period) for path, (count, period) in limits.items()}
+        self.session: Optional["aiohttp.ClientSession"] = None
+
+    async def __aenter__(self):
+        await self._get_session()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _get_session(self) -> "aiohttp.ClientSession":
+        if self.session is None or self.session.closed:
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.max_connections),
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+            )
+        return self.session
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def _get(self, path: str, params: dict) -> Optional[dict]:
+        session = await self._get_session()
+        bucket = self.buckets.get(path)
+        for attempt in range(self.max_retries + 1):
+            if bucket is not None:
+                await bucket.acquire()
+            async with session.get(f'{self.base_url}{path}', params=params) as response:
+                if response.status == 429:
+                    BROKER_ERRORS.labels("AsyncOKXAPI", "rate_limited").inc()
+                if response.status == 429 and attempt < self.max_retries:
+                    # Превышен лимит OKX — ждём и повторяем
+                    await asyncio.sleep(0.5 * 2 ** attempt)
+                    continue
+                if response.status != 200:
+                    BROKER_ERRORS.labels("AsyncOKXAPI", f"http_{response.status}").inc()
+                    logging.error(f"Ошибка при запросе данных с OKX: {await response.text()}")
+                    return None
+                return await response.json()
+        return None
+
+    async def get_historical_candles(self, instrument_id: str, interval: str = '1h', limit: int = 100,
+                                     history: bool = True) -> pd.DataFrame:
+        path = HISTORY_CANDLES_ENDPOINT if history else CANDLES_ENDPOINT
+        data = await self._get(path, {'instId': instrument_id, 'bar': interval, 'limit': str(limit)})
+
+        if data is None:
+            return pd.DataFrame()
+        if 'data' not in data:
+            logging.error(f"Некорректный формат данных с OKX: {data}")
+            return pd.DataFrame()
 
-        df['time'] = pd.to_datetime(df['time'], unit='ms')
-        df = df.sort_values('time').reset_index(drop=True)
+        return candles_to_frame(data['data'])
 
-        numeric_cols = ['open', 'high', 'low', 'close', 'volume']
-        df[numeric_cols] = df[numeric_cols].apply(pd.to_numeric, errors='coerce')
+    async def get_many(self, requests_: Iterable[Tuple[str, str]], limit: int = 100,
+                       history: bool = True) -> Dict[Tuple[str, str], pd.DataFrame]:
+        """
+        Параллельно загружает свечи для набора (instrument_id, interval).
+        Темп запросов ограничивается токен-бакетом эндпоинта, ошибки по отдельным
+        инструментам дают пустой DataFrame.
+        """
+        keys = list(requests_)
+        results = await asyncio.gather(
+            *(self.get_historical_candles(inst, interval, limit, history) for inst, interval in keys),
+            return_exceptions=True,
+        )
 
-        return df
\ No newline at end of file
+        frames = {}
+        for key, result in zip(keys, results):
+            if isinstance(result, Exception):
+                BROKER_ERRORS.labels("AsyncOKXAPI", type(result).__name__).inc()
+                logging.error(f"Ошибка загрузки свечей OKX {key}: {result}")
+                result = pd.DataFrame()
+            frames[key] = result
+        return frames
@@ -0,0 +1,161 @@
+import os
+import random
+import threading
+import time
+import zlib
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from ppo_agent.enums import INTERVAL_TO_TIMESPAN, SUPPORTED_TIMEFRAMES
+
+CANDLE_COLUMNS = ['time', 'open', 'high', 'low', 'close', 'volume']
+
+TIMEFRAME_SPANS = {timeframe: INTERVAL_TO_TIMESPAN[interval] for timeframe, interval in SUPPORTED_TIMEFRAMES.items()}
+
+_MASK64 = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+
+def _splitmix64(x: np.ndarray) -> np.ndarray:
+    """Векторный хеш uint64 -> uint64: детерминированный «шум» по номеру свечи"""
+    with np.errstate(over='ignore'):
+        z = (x + np.uint64(0x9E3779B97F4A7C15)) & _MASK64
+        z = ((z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)) & _MASK64
+        z = ((z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)) & _MASK64
+        return z ^ (z >> np.uint64(31))
+
+
+def _uniform(x: np.ndarray) -> np.ndarray:
+    return (_splitmix64(x) >> np.uint64(11)).astype(np.float64) * 2.0 ** -53
+
+
+def _to_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+class ReplayBroker:
+    """
+    Офлайн-брокер с интерфейсом get_market_data_history, как у TinkoffAPI.
+    Отдаёт записанные свечи из каталога CandleStore или синтетические.
+    Синтетическая свеча — детерминированная функция (seed, figi, номер свечи),
+    поэтому пересекающиеся запросы согласованы между собой и между процессами.
+    Задержка каждого запроса — нормальная с параметрами latency_ms и jitter_ms.
+    """
+
+    def __init__(self, data_dir: Optional[Path] = None, latency_ms: float = 0.0, jitter_ms: float = 0.0,
+                 seed: int = 0, start_price: float = 100.0, volatility: float = 0.02,
+                 synthetic_fallback: bool = True):
+        self.data_dir = Path(data_dir) if data_dir else None
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.seed = seed
+        self.start_price = start_price
+        self.volatility = volatility
+        self.synthetic_fallback = synthetic_fallback
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._store = None
+        self.calls = 0
+
+    @classmethod
+    def from_env(cls) -> "ReplayBroker":
+        return cls(
+            data_dir=os.getenv("PPO_REPLAY_DIR") or None,
+            latency_ms=float(os.getenv("PPO_REPLAY_LATENCY_MS", "0")),
+            jitter_ms=float(os.getenv("PPO_REPLAY_JITTER_MS", "0")),
+            seed=int(os.getenv("PPO_REPLAY_SEED", "0")),
+        )
+
+    # --- Интервалы ---
+
+    @staticmethod
+    def _span(interval: Union[str, timedelta, object]) -> timedelta:
+        if isinstance(interval, timedelta):
+            return interval
+        if isinstance(interval, str):
+            return TIMEFRAME_SPANS[interval]
+        return INTERVAL_TO_TIMESPAN[interval]
+
+    @staticmethod
+    def _timeframe(interval) -> Optional[str]:
+        if isinstance(interval, str):
+            return interval
+        span = ReplayBroker._span(interval)
+        return next((name for name, value in TIMEFRAME_SPANS.items() if value == span), None)
+
+    def _sleep(self):
+        if self.latency_ms <= 0 and self.jitter_ms <= 0:
+            return
+        with self._lock:
+            delay = self._rng.gauss(self.latency_ms, self.jitter_ms)
+        time.sleep(max(0.0, delay) / 1000.0)
+
+    # --- Источники свечей ---
+
+    def synthetic_candles(self, figi: str, from_: datetime, to_: datetime, span: timedelta,
+                          now: Optional[datetime] = None) -> pd.DataFrame:
+        """Синтетические свечи, начинающиеся в [from_, to_) и не позже текущего момента"""
+        span_s = int(span.total_seconds())
+        from_s = _to_utc(from_).timestamp()
+        to_s = min(_to_utc(to_).timestamp(), _to_utc(now or datetime.now(timezone.utc)).timestamp() + 1e-9)
+        first = int(np.ceil(from_s / span_s))
+        last = int(np.ceil(to_s / span_s))
+        if last <= first:
+            return pd.DataFrame(columns=CANDLE_COLUMNS)
+
+        k = np.arange(first - 1, last, dtype=np.int64)
+        salt = np.uint64((zlib.crc32(f'{figi}:{self.seed}'.encode()) & 0xFFFFFFFF) << 32)
+        keys = k.astype(np.uint64) * np.uint64(4) ^ salt
+        # Логарифм цены: медленные циклы разного периода + детерминированный шум
+        phase = k.astype(np.float64)
+        log_price = (np.log(self.start_price)
+                     + self.volatility * 10 * np.sin(2 * np.pi * phase / 1440)
+                     + self.volatility * 3 * np.sin(2 * np.pi * phase / 97)
+                     + self.volatility * (_uniform(keys) - 0.5))
+        price = np.exp(log_price)
+        open_, close = price[:-1], price[1:]
+        wick = self.volatility * 0.5 * close
+        high = np.maximum(open_, close) + wick * _uniform(keys[1:] + np.uint64(1))
+        low = np.minimum(open_, close) - wick * _uniform(keys[1:] + np.uint64(2))
+        volume = np.floor(100 + 10_000 * _uniform(keys[1:] + np.uint64(3)))
+
+        return pd.DataFrame({
+            'time': pd.to_datetime(k[1:] * span_s, unit='s', utc=True),
+            'open': open_, 'high': high, 'low': low, 'close': close, 'volume': volume,
+        })
+
+    def _recorded(self, figi: str, from_: datetime, to_: datetime, interval) -> pd.DataFrame:
+        if self._store is None:
+            from ppo_agent.candle_store import CandleStore
+            self._store = CandleStore(self.data_dir)
+        timeframe = self._timeframe(interval)
+        df = self._store.read(figi, timeframe, _to_utc(from_), _to_utc(to_))
+        return df.reset_index()[CANDLE_COLUMNS] if not df.empty else pd.DataFrame(columns=CANDLE_COLUMNS)
+
+    # --- Интерфейс брокера ---
+
+    def get_market_data_history(self, figi: str, from_: datetime, to_: datetime, interval) -> pd.DataFrame:
+        self._sleep()
+        with self._lock:
+            self.calls += 1
+        if self.data_dir is not None:
+            df = self._recorded(figi, from_, to_, interval)
+            if not df.empty or not self.synthetic_fallback:
+                return df
+        return self.synthetic_candles(figi, from_, to_, self._span(interval))
+
+    def get_candles(self, figi: str, from_: datetime, to_: datetime, interval) -> pd.DataFrame:
+        return self.get_market_data_history(figi, from_, to_, interval)
+
+    def get_latest_candles(self, figi: str, interval, steps: int) -> pd.DataFrame:
+        to_ = datetime.now(timezone.utc)
+        return self.get_market_data_history(figi, to_ - steps * self._span(interval), to_, interval)
+
+    def get_price(self, figi: str) -> float:
+        df = self.get_latest_candles(figi, '1m', 1)
+        return float(df['close'].iloc[-1]) if not df.empty else float('nan')
@@ -1,11 +1,97 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
 import pandas as pd
 from tinkoff.invest import Client, CandleInterval
 from tinkoff.invest.utils import now
 
+from ppo_agent.metrics import BROKER_ERRORS
+
+
+def quotations_to_numpy(quotations: List) -> np.ndarray:
+    """Векторный перевод Quotation (units + nano) в float64"""
+    count = len(quotations)
+    units = np.fromiter((q.units for q in quotations), dtype=np.int64, count=count)
+    nanos = np.fromiter((q.nano for q in quotations), dtype=np.int64, count=count)
+    return units + nanos / 1e9
+
+
+def candles_to_frame(raw_candles: List) -> pd.DataFrame:
+    if not raw_candles:
+        return pd.DataFrame()
+
+    df = pd.DataFrame({
+        "time": pd.to_datetime([c.time for c in raw_candles], utc=True),
+        "open": quotations_to_numpy([c.open for c in raw_candles]),
+        "high": quotations_to_numpy([c.high for c in raw_candles]),
+        "low": quotations_to_numpy([c.low for c in raw_candles]),
+        "close": quotations_to_numpy([c.close for c in raw_candles]),
+        "volume": np.fromiter((c.volume for c in raw_candles), dtype=np.int64, count=len(raw_candles)),
+    })
+    df.set_index("time", inplace=True)
+    return df
+
+
 class TinkoffAPI:
-    def __init__(self, token: str):
+    """
+    Клиент Tinkoff Invest с долгоживущими gRPC-каналами: канал открывается
+    один раз на поток и переиспользуется между запросами.
+    """
+
+    def __init__(self, token: str, max_workers: int = 4):
         self.token = token
+        self.max_workers = max_workers
+        self._local = threading.local()
+        self._clients: List[Client] = []
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def _services(self):
+        services = getattr(self._local, "services", None)
+        if services is None:
+            client = Client(self.token)
+            services = client.__enter__()
+            self._local.client, self._local.services = client, services
+            with self._lock:
+                self._clients.append(client)
+        return services
+
+    def _drop_client(self):
+        """Закрывает канал текущего потока, чтобы следующий запрос открыл новый"""
+        client = getattr(self._local, "client", None)
+        self._local.client = self._local.services = None
+        if client is not None:
+            with self._lock:
+                if client in self._clients:
+                    self._clients.remove(client)
+            try:
+                client.__exit__(None, None, None)
+            except Exception:
+                pass
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        # Под блокировкой: конкурентные вызовы не должны создать два пула
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="tinkoff")
+            return self._executor
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
+        with self._lock:
+            clients, self._clients = self._clients, []
+        for client in clients:
+            try:
+                client.__exit__(None, None, None)
+            except Exception:
+                pass
+        self._local = threading.local()
 
     def get_candles(
         self,
@@ -14,34 +100,44 @@ class TinkoffAPI:
         to_: datetime,
         interval: CandleInterval
     ) -> pd.DataFrame:
-        candles = []
-
         try:
-            with Client(self.token) as client:
-                raw_candles = list(client.get_all_candles(
-                    figi=figi,
-                    from_=from_,
-                    to=to_,
-                    interval=interval
-                ))
-
-                for c in raw_candles:
-                    candles.append({
-                        "time": c.time,
-                        "open": c.open.units + c.open.nano / 1e9,
-                        "high": c.high.units + c.high.nano / 1e9,
-                        "low": c.low.units + c.low.nano / 1e9,
-                        "close": c.close.units + c.close.nano / 1e9,
-                        "volume": c.volume
-                    })
-
+            raw_candles = list(self._services().get_all_candles(
+                figi=figi,
+                from_=from_,
+                to=to_,
+                interval=interval
+            ))
         except Exception as e:
             print(f"❌ Ошибка получения свечей по {figi}: {e}")
+            BROKER_ERRORS.labels("TinkoffAPI", type(e).__name__).inc()
+            self._drop_client()
             return pd.DataFrame()
 
-        df = pd.DataFrame(candles)
-        df.set_index("time", inplace=True)
-        return df
+        return candles_to_frame(raw_candles)
+
+    def get_market_data_history(
+        self,
+        figi: str,
+        from_: datetime,
+        to_: datetime,
+        interval: CandleInterval
+    ) -> pd.DataFrame:
+        return self.get_candles(figi, from_, to_, interval)
+
+    def get_candles_many(
+        self,
+        figis: Iterable[str],
+        from_: datetime,
+        to_: datetime,
+        interval: CandleInterval
+    ) -> Dict[str, pd.DataFrame]:
+        """
+        Параллельная загрузка свечей по нескольким FIGI через пул потоков,
+        у каждого потока свой постоянный канал.
+        """
+        figis = list(figis)
+        frames = self._get_executor().map(lambda figi: self.get_candles(figi, from_, to_, interval), figis)
+        return dict(zip(figis, frames))
 
     def get_latest_candles(
         self,
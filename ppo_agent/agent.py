@@ -1,23 +1,31 @@
+import os
 from pathlib import Path
 
 import time
 from datetime import datetime
+from threading import Lock
 
-from typing import Dict
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+import torch
+from filelock import FileLock
 
 from ppo_agent.enums import SUPPORTED_TIMEFRAMES, INTERVAL_TO_TIMESPAN
 
 import pandas as pd
 from stable_baselines3 import PPO
-from stable_baselines3.common.vec_env import DummyVecEnv
-from stable_baselines3.common.env_util import make_vec_env
 
 from ppo_agent.data_loader import load_recent_candles
-from ppo_agent.indicators import compute_all_indicators
 from ppo_agent.enums import SUPPORTED_TIMEFRAMES
-from ppo_agent.features import extract_features
+from ppo_agent.features import RunningNormalizer, extract_features, get_feature_names, select_features
+from ppo_agent.env import make_trading_env, compute_rewards
 
 from ppo_agent.utils import TrainingJournal
+from ppo_agent.model_cache import ModelCache
+from ppo_agent.parallel_training import GroupTask, choose_env_mode, train_parallel
+from ppo_agent.shared_policy import SharedPolicy
+from ppo_agent.metrics import stage_timer, timed
 import json
 import pandas as pd
 from typing import Dict, Any
@@ -72,17 +80,221 @@ class DataLoader:
         # ...
         return df
 
+# Одна общая сеть на все ряды вместо отдельной модели на каждый {figi}_{timeframe}
+SHARED_POLICY = os.getenv("PPO_SHARED_POLICY", "0") == "1"
+# Онлайн-дообучение: сколько старых свечей добавляется в буфер на каждую новую
+ONLINE_REPLAY_RATIO = float(os.getenv("PPO_ONLINE_REPLAY_RATIO", "1.0"))
+
+
+def _set_rollout_steps(model: PPO, n_steps: int):
+    """Меняет длину роллаута модели: буфер пересоздаётся, веса, оптимизатор и счётчик шагов сохраняются"""
+    if model.n_steps == n_steps:
+        return
+    model.n_steps = n_steps
+    model.rollout_buffer = model.rollout_buffer_class(
+        n_steps, model.observation_space, model.action_space, device=model.device,
+        gamma=model.gamma, gae_lambda=model.gae_lambda, n_envs=model.n_envs, **model.rollout_buffer_kwargs)
+
+
 class PPOAgent:
-    def __init__(self, model_dir: str = "ppo_agent/models", journal_dir: str = "training_journal"):
+    def __init__(self, model_dir: str = "ppo_agent/models", journal_dir: str = "training_journal",
+                 n_envs: int = 8, episode_length: int = 256, subproc_envs: bool = False,
+                 max_loaded_models: int = 256, max_model_bytes: int = 2 << 30, pinned_models: Iterable[str] = (),
+                 watch_models: float = 0.0, shared_policy: bool = SHARED_POLICY,
+                 online_replay_ratio: float = ONLINE_REPLAY_RATIO):
         self.model_dir = Path(model_dir)
-        self.models: Dict[str, PPO] = {}
-        self.env = DummyVecEnv([lambda: make_vec_env("CartPole-v1", n_envs=1)])
+        # Модели грузятся лениво и вытесняются по LRU; горячий набор закреплён в памяти.
+        # watch_models > 0 — подхватывать модели, которые дообучает другой процесс
+        self.models = ModelCache(self.model_dir, max_models=max_loaded_models,
+                                 max_bytes=max_model_bytes, pinned=pinned_models, watch_interval=watch_models)
+        # Параметры торговой среды, на которой собираются роллауты
+        self.n_envs = n_envs
+        self.episode_length = episode_length
+        self.subproc_envs = subproc_envs
+        self.online_replay_ratio = online_replay_ratio
         self.journal = TrainingJournal(journal_dir)
-        self.load_all_models()
-
-    def train_from_dataframe(self, df: pd.DataFrame):
-        grouped = df.groupby(['figi', 'timeframe'])
-        for (figi, timeframe), group in grouped:
+        # Статистики нормализации признаков, {key}.norm.json рядом с моделью
+        self._normalizers: Dict[str, Tuple[int, RunningNormalizer]] = {}
+        self._normalizers_lock = Lock()
+        # Общая политика с эмбеддингами актива и таймфрейма, shared_policy.pt рядом с моделями
+        self.shared_policy = shared_policy
+        self.shared_policy_path = self.model_dir / "shared_policy.pt"
+        self._shared: Optional[Tuple[int, SharedPolicy]] = None
+        self._shared_lock = Lock()
+
+    def _normalizer_path(self, key: str) -> Path:
+        return self.model_dir / f"{key}.norm.json"
+
+    def get_normalizer(self, key: str) -> Optional[RunningNormalizer]:
+        path = self._normalizer_path(key)
+        try:
+            mtime = path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+        with self._normalizers_lock:
+            cached = self._normalizers.get(key)
+            if cached is not None and cached[0] == mtime:
+                return cached[1]
+            normalizer = RunningNormalizer.load(path)
+            if normalizer is not None:
+                self._normalizers[key] = (mtime, normalizer)
+            return normalizer
+
+    def get_shared_policy(self) -> Optional[SharedPolicy]:
+        """Общая политика; перечитывается, если файл обновил другой процесс"""
+        try:
+            mtime = self.shared_policy_path.stat().st_mtime_ns
+        except FileNotFoundError:
+            return self._shared[1] if self._shared else None
+        with self._shared_lock:
+            if self._shared is None or self._shared[0] != mtime:
+                with stage_timer("model_load"):
+                    self._shared = (mtime, SharedPolicy.load(self.shared_policy_path))
+            return self._shared[1]
+
+    def _shared_columns(self) -> Optional[List[str]]:
+        policy = self.get_shared_policy() if self.shared_policy else None
+        return policy.columns if policy is not None else None
+
+    def model_columns(self, figi: str, timeframe: str) -> List[str]:
+        """
+        Признаки, которые модель ряда берёт из свечей: колонки общей политики или
+        нормализатора ряда; для ещё не обученного ряда — все признаки FEATURE_MAPPING
+        """
+        columns = self._shared_columns()
+        if columns is None:
+            normalizer = self.get_normalizer(f"{figi}_{timeframe}")
+            columns = normalizer.columns if normalizer is not None else get_feature_names()
+        return columns
+
+    def _training_observations(self, key: str, df: pd.DataFrame, required_only: bool = False,
+                               columns: Optional[List[str]] = None,
+                               new_rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, RunningNormalizer]:
+        """
+        Признаки для обучения, нормализованные накопленными статистиками ряда.
+        Статистики обновляются на копии и сохраняются только вместе с моделью.
+        columns — фиксированный набор признаков (у общей политики он один на все ряды).
+        new_rows — маска строк, ещё не учтённых в статистиках (по умолчанию все).
+        """
+        raw = select_features(df, required_only)
+        if columns is not None:
+            missing = [c for c in columns if c not in raw.columns]
+            if missing:
+                raise ValueError(f"{key}: нет признаков {missing}, нужных общей политике")
+            raw = raw[columns]
+        current = self.get_normalizer(key)
+        if current is not None and current.columns == list(raw.columns):
+            normalizer = RunningNormalizer.from_dict(current.to_dict())
+        else:
+            normalizer = RunningNormalizer(raw.columns)
+        values = raw.to_numpy()
+        normalizer.update(values if new_rows is None else values[new_rows])
+        return normalizer.transform(values), normalizer
+
+    @timed("fit")
+    def _fit(self, figi: str, timeframe: str, observations: np.ndarray, rewards: np.ndarray,
+             normalizer: Optional[RunningNormalizer] = None, n_envs: Optional[int] = None,
+             subproc: Optional[bool] = None, rollout_steps: Optional[int] = None) -> PPO:
+        """
+        Обучает модель (figi, timeframe) на торговой среде из готовых признаков и наград.
+        Существующая модель дообучается, если размерность наблюдений совпадает.
+        n_envs и subproc переопределяют параметры среды агента для этой группы,
+        rollout_steps — длину роллаута на время дообучения (на малом буфере).
+        """
+        if self.shared_policy:
+            return self._fit_shared([(figi, timeframe, observations, rewards, normalizer)])
+
+        key = f"{figi}_{timeframe}"
+        model_path = self.model_dir / f"{key}.zip"
+        n_envs = n_envs or self.n_envs
+        env = make_trading_env(observations, rewards, n_envs=n_envs, episode_length=self.episode_length,
+                               subproc=self.subproc_envs if subproc is None else subproc)
+        try:
+            model = self.models.get(key)
+            if model is not None and model.observation_space.shape == env.observation_space.shape:
+                if model.n_envs != env.num_envs and model_path.exists():
+                    # set_env не умеет менять число сред — загружаем сохранённую модель сразу с новой средой
+                    model = PPO.load(model_path, env=env)
+                else:
+                    model.set_env(env)
+                n_steps = model.n_steps
+                _set_rollout_steps(model, rollout_steps or n_steps)
+                try:
+                    model.learn(total_timesteps=len(observations), reset_num_timesteps=False)
+                finally:
+                    _set_rollout_steps(model, n_steps)
+            else:
+                n_steps = max(16, min(2048, self.episode_length))
+                model = PPO("MlpPolicy", env, n_steps=n_steps, batch_size=min(64, n_steps * n_envs), verbose=0)
+                model.learn(total_timesteps=len(observations))
+        finally:
+            env.close()
+
+        # Модель пишется во временный файл и подменяется атомарно: её может читать API
+        tmp_path = self.model_dir / ".tmp" / f"{key}.{os.getpid()}.zip"
+        tmp_path.parent.mkdir(exist_ok=True)
+        model.save(tmp_path)
+        os.replace(tmp_path, model_path)
+        self.models[key] = model
+        # Статистики — после модели: ошибка их записи не теряет обученную модель
+        if normalizer is not None:
+            normalizer.save(self._normalizer_path(key))
+        return model
+
+    def _fit_shared(self, batch: List[Tuple[str, str, np.ndarray, np.ndarray, Optional[RunningNormalizer]]]) -> SharedPolicy:
+        """
+        Совместное обучение общей политики на нескольких рядах за один прогон.
+        Файл политики общий для воркеров обучения и онлайн-дообучения: чтение, обучение
+        и сохранение идут под файловой блокировкой, иначе процессы затирают шаги друг друга.
+        """
+        self.shared_policy_path.parent.mkdir(parents=True, exist_ok=True)
+        with FileLock(str(self.shared_policy_path) + ".lock"):
+            # Под блокировкой перечитываем файл: его мог обновить другой процесс
+            policy = self.get_shared_policy()
+            if policy is None:
+                if batch[0][4] is None:
+                    raise ValueError("Для новой общей политики нужен нормализатор с колонками признаков")
+                policy = SharedPolicy(batch[0][4].columns)
+            policy.learn([(figi, timeframe, observations, rewards)
+                          for figi, timeframe, observations, rewards, _ in batch],
+                         total_timesteps=sum(len(item[2]) for item in batch),
+                         n_envs=self.n_envs, episode_length=self.episode_length)
+
+            policy.save(self.shared_policy_path)
+            with self._shared_lock:
+                self._shared = (self.shared_policy_path.stat().st_mtime_ns, policy)
+            for figi, timeframe, _, _, normalizer in batch:
+                if normalizer is not None:
+                    normalizer.save(self._normalizer_path(f"{figi}_{timeframe}"))
+        return policy
+
+    @timed("train")
+    def train(self, figi: str, timeframe: str, df: pd.DataFrame):
+        """
+        Обучение на свечах с индикаторами одного ряда.
+        Если колонки reward нет, наградой служит доходность следующей свечи.
+        """
+        rewards = df["reward"].to_numpy(dtype=np.float32) if "reward" in df.columns else compute_rewards(df)
+        observations, normalizer = self._training_observations(f"{figi}_{timeframe}", df, required_only=True,
+                                                               columns=self._shared_columns())
+        if len(observations) < 10:
+            raise ValueError(f"Недостаточно данных для обучения: {figi} {timeframe}")
+        self._fit(figi, timeframe, observations, rewards, normalizer)
+
+    def train_from_dataframe(self, df: pd.DataFrame, workers: int = 1,
+                             n_envs: Union[int, Dict[Tuple[str, str], int], None] = None, env_mode: str = "auto"):
+        """
+        Обучение по всем группам (figi, timeframe) таблицы.
+        :param workers: процессов обучения; 0 — по числу ядер. Группы упаковываются
+                        в задачи пула (мелкие вместе) и раздаются по убыванию стоимости
+        :param n_envs: число сред на группу — одно на все или {(figi, timeframe): n}
+        :param env_mode: auto, inprocess или subproc — где шагают среды группы
+        """
+        workers = workers or os.cpu_count() or 1
+        groups: Dict[Tuple[str, str], GroupTask] = {}
+        intervals: Dict[Tuple[str, str], Tuple[datetime, datetime]] = {}
+        shared_batch = []
+        for (figi, timeframe), group in df.groupby(['figi', 'timeframe']):
             if not figi or timeframe not in SUPPORTED_TIMEFRAMES:
                 continue
 
@@ -94,12 +306,14 @@ class PPOAgent:
                 print(f"⏭️ Пропуск обучения: {figi} {timeframe} уже обучен в интервале {from_time} - {to_time}")
                 continue
 
-            features = extract_features(group)
             if 'reward' not in group.columns:
                 print(f"⚠️ Нет колонки reward: {figi} {timeframe}")
                 continue
 
-            observations = features.to_numpy()
+            columns = self._shared_columns()
+            if self.shared_policy and columns is None and shared_batch:
+                columns = shared_batch[0][4].columns
+            observations, normalizer = self._training_observations(f"{figi}_{timeframe}", group, columns=columns)
             rewards = group['reward'].to_numpy()
 
             if len(observations) < 10:
@@ -108,53 +322,231 @@ class PPOAgent:
 
             print(f"🧠 Обучение {figi} {timeframe} | примеров: {len(observations)} | reward avg: {rewards.mean():.4f}")
 
-            model = PPO("MlpPolicy", self.env, verbose=0)
-            model.learn(total_timesteps=len(observations))
-            model_path = self.model_dir / f"{figi}_{timeframe}.zip"
-            model.save(model_path)
-            self.models[f"{figi}_{timeframe}"] = model
+            if self.shared_policy:
+                shared_batch.append((figi, timeframe, observations, rewards, normalizer, from_time, to_time))
+                continue
+
+            group_envs = (n_envs.get((figi, timeframe)) if isinstance(n_envs, dict) else n_envs) or self.n_envs
+            subproc = choose_env_mode(len(observations), group_envs, workers, env_mode) \
+                if env_mode != "auto" or workers > 1 else self.subproc_envs
+            groups[(figi, timeframe)] = (figi, timeframe, observations, rewards, normalizer, group_envs, subproc)
+            intervals[(figi, timeframe)] = (from_time, to_time)
+
+        if shared_batch:
+            # Все ряды CSV обучают одну сеть за один прогон
+            self._fit_shared([item[:5] for item in shared_batch])
+            for figi, timeframe, _, _, _, from_time, to_time in shared_batch:
+                self.journal.record_training(figi, timeframe, from_time, to_time)
+
+        if workers <= 1 or len(groups) <= 1:
+            for key, (figi, timeframe, observations, rewards, normalizer, group_envs, subproc) in groups.items():
+                self._fit(figi, timeframe, observations, rewards, normalizer, n_envs=group_envs, subproc=subproc)
+                self.journal.record_training(figi, timeframe, *intervals[key])
+            return
+
+        # Журнал пишет только этот процесс; модели воркеры сохраняют в общий каталог
+        agent_kwargs = {"model_dir": str(self.model_dir), "journal_dir": str(self.journal.root),
+                        "n_envs": self.n_envs, "episode_length": self.episode_length,
+                        "max_loaded_models": 1, "shared_policy": False}
+        for (figi, timeframe), samples, seconds, error in train_parallel(groups, agent_kwargs, workers):
+            if error is not None:
+                print(f"❌ Ошибка обучения {figi} {timeframe}: {error}")
+                continue
+            self.models.invalidate(f"{figi}_{timeframe}")
+            self.journal.record_training(figi, timeframe, *intervals[(figi, timeframe)])
+            print(f"✅ Обучено: {figi} {timeframe} | {samples} примеров за {seconds:.1f} с")
+        self.models.refresh_index()
 
-            self.journal.record_training(figi, timeframe, from_time, to_time)
+    @timed("fine_tune")
+    def fine_tune(self, figi: str, timeframe: str, df: pd.DataFrame, now: Optional[datetime] = None) -> int:
+        """
+        Онлайн-дообучение только на новых свечах.
+        Буфер — закрытые свечи новее отметки журнала плюс ограниченная выборка
+        старых (online_replay_ratio на новую), чтобы модель не забывала окно.
+        Стоимость прохода растёт с числом новых свечей, а не с размером окна.
+        :param df: свечи с индикаторами и колонкой time (как у load_recent_candles)
+        :return: сколько новых свечей выучено (0 — дообучать нечего)
+        """
+        if "time" not in df.columns:
+            raise ValueError(f"Нет времени свечей для дообучения: {figi} {timeframe}")
+        span = INTERVAL_TO_TIMESPAN[SUPPORTED_TIMEFRAMES[timeframe]]
+        now = now or datetime.utcnow()
+        closed_before = now - (now - datetime(1970, 1, 1)) % span
+
+        df = df[df["time"] < closed_before].sort_values("time").reset_index(drop=True)
+        # Награда строки — доходность следующей свечи, поэтому последняя закрытая пока без награды
+        rewards = compute_rewards(df)[:-1]
+        df = df.iloc[:-1]
+        times = df["time"].to_numpy()
+
+        key = f"{figi}_{timeframe}"
+        # Отметка журнала — закрытие последней выученной свечи, новые свечи открываются не раньше неё
+        mark = self.journal.last_trained(figi, timeframe)
+        new_rows = times >= np.datetime64(mark) if mark is not None else np.ones(len(df), dtype=bool)
+        n_new = int(new_rows.sum())
+        if n_new == 0:
+            return 0
+
+        old_idx = np.flatnonzero(~new_rows)
+        n_replay = min(len(old_idx), int(np.ceil(n_new * self.online_replay_ratio)))
+        replay_idx = np.random.default_rng().choice(old_idx, n_replay, replace=False) if n_replay else old_idx[:0]
+        buffer_idx = np.sort(np.concatenate([replay_idx, np.flatnonzero(new_rows)]))
+        if len(buffer_idx) < 2:
+            return 0
+
+        observations, normalizer = self._training_observations(key, df, columns=self._shared_columns(),
+                                                               new_rows=new_rows)
+        observations, rewards = observations[buffer_idx], rewards[buffer_idx]
+        # Один роллаут на весь буфер: столько шагов, сколько в нём свечей
+        self._fit(figi, timeframe, observations, rewards, normalizer,
+                  rollout_steps=int(np.ceil(len(buffer_idx) / self.n_envs)))
+
+        # В журнал — от открытия первой новой свечи до закрытия последней: смежные проходы
+        # сливаются в один интервал, а пропуск между отметкой и окном остаётся необученным
+        start = pd.Timestamp(times[new_rows][0]).to_pydatetime()
+        if mark is not None:
+            start = max(mark, start)
+        end = (pd.Timestamp(times[-1]) + span).to_pydatetime()
+        self.journal.record_training(figi, timeframe, start, end)
+        self.models.refresh_index()
+        return n_new
 
     def self_training_loop(self, interval_sec: float = 0.5):
         while True:
-            for key in list(self.models.keys()):
+            for key in self.trained_keys():
                 try:
                     figi, timeframe = key.rsplit("_", 1)
-                    interval = SUPPORTED_TIMEFRAMES.get(timeframe)
-                    if not interval:
-                        continue
-
-                    to_time = datetime.utcnow()
-                    from_time = to_time - INTERVAL_TO_TIMESPAN[interval] * 100
-
-                    # Проверка, обучался ли уже этот интервал
-                    if self.journal.was_trained(figi, timeframe, from_time, to_time):
-                        print(f"⏭️ Пропуск {figi} {timeframe}: уже обучено за {from_time} — {to_time}")
+                    if timeframe not in SUPPORTED_TIMEFRAMES:
                         continue
 
                     df = load_recent_candles(figi, timeframe, 100)
-                    if df.empty or len(df) < 52:
-                        print(f"⚠️ Недостаточно свечей: {figi} {timeframe}")
-                        continue
-
-                    features_df = compute_all_indicators(df)
-                    if 'reward' not in features_df.columns:
-                        print(f"⚠️ Нет reward: {figi} {timeframe}")
-                        continue
-
-                    features_df = extract_features(features_df)
-                    observations = features_df.to_numpy()
-                    rewards = features_df["reward"].to_numpy()
-
-                    model = self.models[key]
-                    model.learn(total_timesteps=len(observations))
-                    model.save(self.model_dir / f"{figi}_{timeframe}.zip")
-
-                    self.journal.record_training(figi, timeframe, from_time, to_time)
-                    print(f"✅ Дообучено: {figi} {timeframe} | {len(observations)} примеров")
+                    trained = self.fine_tune(figi, timeframe, df)
+                    if trained:
+                        print(f"✅ Дообучено: {figi} {timeframe} | новых свечей: {trained}")
+                    else:
+                        print(f"⏭️ Пропуск {figi} {timeframe}: новых закрытых свечей нет")
 
                 except Exception as e:
                     print(f"❌ Ошибка в self_training {key}: {e}")
 
-                time.sleep(interval_sec)
\ No newline at end of file
+                time.sleep(interval_sec)
+
+    def trained_keys(self) -> List[str]:
+        """Ряды {figi}_{timeframe}, для которых есть обученная модель (или которые знает общая политика)"""
+        if self.shared_policy:
+            policy = self.get_shared_policy()
+            return sorted(policy.series) if policy is not None else []
+        return list(self.models.keys())
+
+    def model_version(self, key: str) -> Optional[int]:
+        """Версия модели ряда на диске — меняется при каждом сохранении"""
+        if self.shared_policy:
+            try:
+                return self.shared_policy_path.stat().st_mtime_ns
+            except FileNotFoundError:
+                return None
+        return self.models.version(key)
+
+    def get_trained_timeframes(self, figi: str) -> List[str]:
+        """Список таймфреймов, для которых есть обученная модель актива"""
+        timeframes = []
+        for key in self.trained_keys():
+            key_figi, timeframe = key.rsplit("_", 1)
+            if key_figi == figi:
+                timeframes.append(timeframe)
+        return timeframes
+
+    def predict(self, figi: str, timeframe: str, df: pd.DataFrame) -> Tuple[float, float]:
+        result = self.predict_batch(figi, {timeframe: df})[timeframe]
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    @timed("predict_batch")
+    def predict_batch(self, figi: str, frames: Dict[str, pd.DataFrame]) -> Dict[str, Union[Tuple[float, float], Exception]]:
+        """
+        Предсказания сразу по нескольким таймфреймам актива.
+        :param frames: {timeframe: DataFrame со свечами и индикаторами}
+        :return: {timeframe: (signal, confidence) или исключение этого таймфрейма}
+        """
+        result = self.predict_many({(figi, timeframe): df for timeframe, df in frames.items()})
+        return {timeframe: value for (_, timeframe), value in result.items()}
+
+    def predict_many(self, frames: Dict[Tuple[str, str], pd.DataFrame]
+                     ) -> Dict[Tuple[str, str], Union[Tuple[float, float], Exception]]:
+        """
+        Предсказания по любым рядам (figi, timeframe).
+        Наблюдения группируются по модели, и на каждую модель делается один
+        прямой проход политики по всему батчу; у общей политики это один
+        проход на все активы сразу. Ошибка ряда (нет модели, плохие свечи)
+        возвращается значением этого ряда и не роняет остальные.
+        :return: {(figi, timeframe): (signal, confidence) или исключение}
+        """
+        policy = self.get_shared_policy() if self.shared_policy else None
+        result: Dict[Tuple[str, str], Union[Tuple[float, float], Exception]] = {}
+        batches: Dict[str, List[Tuple[Tuple[str, str], np.ndarray]]] = {}
+        for (figi, timeframe), df in frames.items():
+            key = f"{figi}_{timeframe}"
+            try:
+                known = policy.has_series(key) if policy is not None else not self.shared_policy and key in self.models
+                if not known:
+                    raise KeyError(f"Нет обученной модели {key}")
+                with stage_timer("build_observation"):
+                    observation = self._build_observation(df, self.get_normalizer(key),
+                                                          columns=policy.columns if policy is not None else None)
+            except Exception as e:
+                result[(figi, timeframe)] = e
+                continue
+            # У общей политики одна модель на все ряды
+            batches.setdefault("shared" if policy is not None else key, []).append(((figi, timeframe), observation))
+
+        for key, items in batches.items():
+            try:
+                obs = np.stack([observation for _, observation in items])
+                with stage_timer("inference"):
+                    if policy is not None:
+                        signals, confidences = policy.predict([f for (f, _), _ in items],
+                                                              [tf for (_, tf), _ in items], obs)
+                    else:
+                        signals, confidences = self._policy_outputs(self.models[key], obs)
+            except Exception as e:
+                # Ошибка прохода модели относится ко всем рядам её батча
+                for series, _ in items:
+                    result[series] = e
+                continue
+            for (series, _), signal, confidence in zip(items, signals, confidences):
+                result[series] = (float(signal), float(confidence))
+        return result
+
+    @staticmethod
+    def _build_observation(df: pd.DataFrame, normalizer: Optional[RunningNormalizer] = None,
+                           columns: Optional[List[str]] = None) -> np.ndarray:
+        if normalizer is not None:
+            # Сохранённые статистики: нужна только последняя свеча
+            return extract_features(df.iloc[-1:], required_only=True, normalizer=normalizer).iloc[-1].to_numpy()
+        features = extract_features(df, required_only=True)
+        if columns is not None:
+            features = features.reindex(columns=columns, fill_value=0.0)
+        return features.iloc[-1].to_numpy(dtype=np.float32)
+
+    @staticmethod
+    def _policy_outputs(model: PPO, obs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Один прямой проход политики по батчу наблюдений.
+        Сигнал — детерминированное действие, приведённое к [-1, 1],
+        уверенность — вероятность этого действия.
+        """
+        policy = model.policy
+        obs_tensor, _ = policy.obs_to_tensor(obs)
+        with torch.no_grad():
+            distribution = policy.get_distribution(obs_tensor)
+            actions = distribution.get_actions(deterministic=True)
+            confidences = distribution.log_prob(actions).exp()
+
+        actions = actions.cpu().numpy().reshape(len(obs), -1)[:, 0].astype(np.float64)
+        n_actions = getattr(model.action_space, "n", None)
+        if n_actions:
+            signals = 2.0 * actions / max(n_actions - 1, 1) - 1.0
+        else:
+            signals = np.clip(actions, -1.0, 1.0)
+        return signals, np.clip(confidences.cpu().numpy(), 0.0, 1.0)
\ No newline at end of file
@@ -1,11 +1,14 @@
+import atexit
+import copy
 import json
 import os
-from datetime import datetime
-from typing import Dict, Tuple, Optional
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Union
 from pathlib import Path
 import logging
-from threading import Lock
+from threading import Event, RLock, Thread
 import re
+import shutil
 from functools import lru_cache
 from contextlib import contextmanager
 
@@ -16,17 +19,49 @@ class AssetRegistryError(Exception):
     pass
 
 class AssetRegistry:
+    """
+    Реестр активов в памяти с индексами по FIGI, брокеру и статусу.
+    Изменения сначала копятся в памяти и пачками дописываются в журнал
+    (write-behind); журнал периодически сворачивается в снимок, из старых
+    снимков хранится не больше keep_snapshots. В журнал пишутся только
+    изменения: новая запись истории и изменившиеся поля, а не весь актив.
+    Операции журнала пронумерованы (seq), снимок помнит номер последней
+    вошедшей в него: повтор журнала поверх снимка ничего не применяет дважды.
+    """
     FIGI_PATTERN = re.compile(r'^BBG[A-Z0-9]{9}$|^[A-Z0-9]{12}$')
-    
-    def __init__(self, file_path='asset_registry.json', max_cache_size=1000):
+
+    def __init__(self, file_path='asset_registry.json', max_cache_size=1000, flush_interval: float = 5.0,
+                 snapshot_every: int = 10000, keep_snapshots: int = 3):
         self.file_path = Path(file_path)
-        self.lock = Lock()
+        self.journal_path = self.file_path.with_suffix('.journal')
+        self.lock = RLock()
         self.logger = logging.getLogger(__name__)
         self._setup_logging()
-        self._ensure_registry_exists()
         self.cache_size = max_cache_size
+        self.snapshot_every = snapshot_every
+        self.keep_snapshots = keep_snapshots
+
+        self.registry: Dict = {}
+        self._by_broker: Dict[str, Set[str]] = {}
+        self._by_status: Dict[str, Set[str]] = {}
+        self._by_ticker: Dict[str, str] = {}
+        self._pending: List[Dict] = []
+        self._journal_ops = 0
+        self._seq = 0
+
+        self._ensure_registry_exists()
+        self._load()
+
+        self._stop = Event()
+        self._flusher = None
+        if flush_interval:
+            self._flusher = Thread(target=self._flush_loop, args=(flush_interval,), name="asset-registry-flush", daemon=True)
+            self._flusher.start()
+        atexit.register(self.close)
 
     def _setup_logging(self):
+        if any(isinstance(h, logging.FileHandler) for h in self.logger.handlers):
+            return
         handler = logging.FileHandler('asset_registry.log')
         formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
         handler.setFormatter(formatter)
@@ -36,7 +71,7 @@ class AssetRegistry:
     def _ensure_registry_exists(self):
         """Создает структуру реестра, если она не существует"""
         if not self.file_path.exists():
-            self._save_registry({
+            self._write_snapshot({
                 "assets": {},
                 "metadata": {
                     "version": "2.0",
@@ -62,8 +97,10 @@ class AssetRegistry:
             return False
         return bool(self.FIGI_PATTERN.match(figi))
 
+    # --- Загрузка и сохранение ---
+
     def _load_registry(self) -> Dict:
-        """Загружает реестр с обработкой ошибок"""
+        """Загружает снимок реестра с обработкой ошибок"""
         with self._file_lock():
             try:
                 with open(self.file_path, 'r') as f:
@@ -71,6 +108,7 @@ class AssetRegistry:
                 # Валидация структуры данных
                 if not isinstance(data, dict) or "assets" not in data:
                     raise ValueError("Invalid registry structure")
+                data.setdefault("metadata", {})
                 return data
             except json.JSONDecodeError as e:
                 self.logger.error(f"Registry file corrupted: {e}")
@@ -80,80 +118,284 @@ class AssetRegistry:
                     self.file_path.rename(backup_path)
                 return {"assets": {}, "metadata": {}}
 
+    def _load(self):
+        """Снимок + повтор операций из журнала, затем построение индексов"""
+        self.registry = self._load_registry()
+        self._seq = self.registry["metadata"].get("journal_seq", 0)
+        if self.journal_path.exists():
+            with open(self.journal_path, 'r') as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        op = json.loads(line)
+                    except json.JSONDecodeError:
+                        # Оборванная последняя запись после аварийного завершения
+                        self.logger.error("Skipping corrupted registry journal line")
+                        continue
+                    # Операция уже в снимке (сбой между os.replace и удалением журнала)
+                    # или записана повторно после ошибки сброса
+                    if "seq" in op:
+                        if op["seq"] <= self._seq:
+                            continue
+                        self._seq = op["seq"]
+                    self._apply(op)
+                    self._journal_ops += 1
+
+        for figi, asset in self.registry["assets"].items():
+            self._index(figi, asset)
+
+    def _write_tmp(self, data: Dict) -> Path:
+        tmp_path = self.file_path.with_suffix('.json.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump(data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        return tmp_path
+
+    def _write_snapshot(self, data: Dict) -> None:
+        os.replace(self._write_tmp(data), self.file_path)
+
+    def _rotate_snapshots(self):
+        """Копирует текущий снимок в бэкап (жёсткой ссылкой) и удаляет лишние старые бэкапы"""
+        if not self.file_path.exists():
+            return
+        backup_path = self.file_path.with_suffix(f'.json.bak{datetime.now().strftime("%Y%m%d%H%M%S%f")}')
+        try:
+            os.link(self.file_path, backup_path)
+        except OSError:
+            # ФС без жёстких ссылок
+            shutil.copy2(self.file_path, backup_path)
+        backups = sorted(self.file_path.parent.glob(f'{self.file_path.stem}.json.bak2*'))
+        for old in backups[:-self.keep_snapshots] if self.keep_snapshots else backups:
+            old.unlink(missing_ok=True)
+
     def _save_registry(self, data: Dict) -> None:
-        """Сохраняет реестр с созданием бэкапа"""
+        """
+        Сворачивает журнал в новый снимок реестра.
+        Новый снимок сначала целиком пишется во временный файл, старый остаётся
+        на месте до os.replace: при сбое на любом шаге основной файл существует.
+        """
         with self._file_lock():
-            # Создаем бэкап перед сохранением
-            if self.file_path.exists():
-                backup_path = self.file_path.with_suffix(f'.json.bak{datetime.now().strftime("%Y%m%d%H%M%S")}')
-                self.file_path.rename(backup_path)
-            
-            with open(self.file_path, 'w') as f:
-                json.dump(data, f, indent=2)
-            
             data["metadata"]["last_backup"] = datetime.utcnow().isoformat()
+            data["metadata"]["journal_seq"] = self._seq
+            tmp_path = self._write_tmp(data)
+            self._rotate_snapshots()
+            os.replace(tmp_path, self.file_path)
+            self.journal_path.unlink(missing_ok=True)
+            self._journal_ops = 0
+
+    def flush(self) -> None:
+        """Дописывает накопленные изменения в журнал одной операцией записи"""
+        with self._file_lock():
+            if not self._pending:
+                return
+            size = self.journal_path.stat().st_size if self.journal_path.exists() else 0
+            try:
+                with open(self.journal_path, 'a') as f:
+                    f.write(''.join(json.dumps(op) + '\n' for op in self._pending))
+                    f.flush()
+                    os.fsync(f.fileno())
+            except OSError:
+                # Операции остаются в очереди до следующего сброса; недописанный хвост
+                # отрезается, чтобы следующая запись не склеилась с оборванной строкой
+                try:
+                    os.truncate(self.journal_path, size)
+                except OSError:
+                    pass
+                raise
+            self._journal_ops += len(self._pending)
+            self._pending = []
+            if self._journal_ops >= self.snapshot_every:
+                self._save_registry(self.registry)
+
+    def _flush_loop(self, interval: float):
+        while not self._stop.wait(interval):
+            try:
+                self.flush()
+            except AssetRegistryError:
+                pass
+
+    def close(self):
+        self._stop.set()
+        try:
+            self.flush()
+        except AssetRegistryError:
+            pass
+
+    # --- Индексы ---
+
+    def _index(self, figi: str, asset: Dict):
+        self._by_broker.setdefault(asset["broker"], set()).add(figi)
+        self._by_status.setdefault(asset["status"], set()).add(figi)
+        ticker = asset.get("additional_info", {}).get("ticker")
+        if ticker:
+            self._by_ticker[ticker] = figi
+
+    def _unindex(self, figi: str, asset: Dict):
+        self._by_broker.get(asset["broker"], set()).discard(figi)
+        self._by_status.get(asset["status"], set()).discard(figi)
+        ticker = asset.get("additional_info", {}).get("ticker")
+        if ticker and self._by_ticker.get(ticker) == figi:
+            del self._by_ticker[ticker]
+
+    def _apply(self, op: Dict):
+        assets = self.registry["assets"]
+        if op["op"] == "upsert":
+            # Копия: последующие update меняют актив на месте, а op ещё ждёт записи в журнал
+            assets[op["figi"]] = copy.deepcopy(op["asset"])
+        elif op["op"] == "update":
+            asset = assets[op["figi"]]
+            asset["update_history"].append(op["history"])
+            asset.update(op["set"])
+            asset["additional_info"].update(op.get("info", {}))
+        elif op["op"] == "delete":
+            assets.pop(op["figi"], None)
+
+    def _record(self, op: Dict):
+        """Применяет операцию в памяти и ставит её в очередь на запись"""
+        self._seq += 1
+        op["seq"] = self._seq
+        figi = op["figi"]
+        old = self.registry["assets"].get(figi)
+        if old is not None:
+            self._unindex(figi, old)
+        self._apply(op)
+        if op["op"] != "delete":
+            self._index(figi, self.registry["assets"][figi])
+        self._pending.append(op)
+
+    def _update(self, figi: str, now: str, changes: Dict, info: Optional[Dict] = None):
+        """Изменение существующего актива: прежние broker и status уходят в историю"""
+        asset = self.registry["assets"][figi]
+        op = {
+            "op": "update",
+            "figi": figi,
+            "history": {"timestamp": now, "broker": asset["broker"], "status": asset["status"]},
+            "set": dict(changes, last_updated=now),
+        }
+        if info:
+            op["info"] = info
+        self._record(op)
+
+    # --- Регистрация ---
+
+    def _upsert(self, figi: str, broker: str, additional_info: Optional[Dict], now: str):
+        if figi in self.registry["assets"]:
+            self._update(figi, now, {"broker": broker}, additional_info)
+            return
+        asset = {
+            "broker": broker,
+            "first_seen": now,
+            "last_updated": now,
+            "status": "active",
+            "update_history": [],
+            "additional_info": dict(additional_info or {})
+        }
+        self._record({"op": "upsert", "figi": figi, "asset": asset})
 
     def register_figi(self, figi: str, broker: str, additional_info: Optional[Dict] = None) -> None:
         """Регистрирует новый FIGI с расширенной валидацией"""
         if not self._validate_figi(figi):
             raise FIGIValidationError(f"Invalid FIGI format: {figi}")
 
-        registry = self._load_registry()
-        now = datetime.utcnow().isoformat()
-
         try:
-            if figi not in registry["assets"]:
-                registry["assets"][figi] = {
-                    "broker": broker,
-                    "first_seen": now,
-                    "last_updated": now,
-                    "status": "active",
-                    "update_history": [],
-                    "additional_info": additional_info or {}
-                }
-            else:
-                asset = registry["assets"][figi]
-                # Сохраняем историю изменений
-                asset["update_history"].append({
-                    "timestamp": now,
-                    "broker": asset["broker"],
-                    "status": asset["status"]
-                })
-                asset["broker"] = broker
-                asset["last_updated"] = now
-                if additional_info:
-                    asset["additional_info"].update(additional_info)
-
-            self._save_registry(registry)
+            with self.lock:
+                self._upsert(figi, broker, additional_info, datetime.utcnow().isoformat())
             self.logger.info(f"Successfully registered/updated FIGI: {figi}")
 
         except Exception as e:
             self.logger.error(f"Error registering FIGI {figi}: {e}")
             raise AssetRegistryError(f"Failed to register FIGI: {e}")
 
+    def register_many(self, assets: Iterable[Union[Tuple, Dict]]) -> int:
+        """
+        Массовая регистрация: [(figi, broker[, additional_info])] или [{"figi", "broker", "additional_info"}].
+        Все FIGI проверяются до изменений, запись на диск — одним сбросом журнала.
+        :return: количество зарегистрированных FIGI
+        """
+        items = []
+        for item in assets:
+            if isinstance(item, dict):
+                items.append((item["figi"], item["broker"], item.get("additional_info")))
+            else:
+                items.append((item[0], item[1], item[2] if len(item) > 2 else None))
+
+        invalid = [figi for figi, _, _ in items if not self._validate_figi(figi)]
+        if invalid:
+            raise FIGIValidationError(f"Invalid FIGI format: {', '.join(map(str, invalid[:10]))}")
+
+        now = datetime.utcnow().isoformat()
+        with self.lock:
+            for figi, broker, additional_info in items:
+                self._upsert(figi, broker, additional_info, now)
+        self.flush()
+        self.logger.info(f"Successfully registered/updated {len(items)} FIGI")
+        return len(items)
+
+    def set_status(self, figi: str, status: str) -> None:
+        with self.lock:
+            if figi not in self.registry["assets"]:
+                raise AssetRegistryError(f"Unknown FIGI: {figi}")
+            self._update(figi, datetime.utcnow().isoformat(), {"status": status})
+
+    # --- Запросы ---
+
+    def get(self, figi: str) -> Optional[Dict]:
+        with self.lock:
+            return self.registry["assets"].get(figi)
+
+    def find_figi(self, name: str) -> Optional[str]:
+        """FIGI по самому FIGI или по тикеру из additional_info"""
+        with self.lock:
+            if name in self.registry["assets"]:
+                return name
+            return self._by_ticker.get(name)
+
+    def get_by_broker(self, broker: str) -> List[str]:
+        with self.lock:
+            return sorted(self._by_broker.get(broker, ()))
+
+    def get_by_status(self, status: str) -> List[str]:
+        with self.lock:
+            return sorted(self._by_status.get(status, ()))
+
     def get_inactive_assets(self, days_threshold: int = 30) -> list:
         """Находит неактивные активы"""
-        registry = self._load_registry()
-        inactive = []
-        threshold = datetime.utcnow() - pd.Timedelta(days=days_threshold)
-        
-        for figi, data in registry["assets"].items():
-            last_updated = datetime.fromisoformat(data["last_updated"])
-            if last_updated < threshold:
-                inactive.append(figi)
-        
-        return inactive
+        threshold = datetime.utcnow() - timedelta(days=days_threshold)
+        with self.lock:
+            return [
+                figi for figi, data in self.registry["assets"].items()
+                if datetime.fromisoformat(data["last_updated"]) < threshold
+            ]
 
     def cleanup_old_records(self, days_threshold: int = 90):
         """Очищает старые записи"""
-        registry = self._load_registry()
-        threshold = datetime.utcnow() - pd.Timedelta(days=days_threshold)
-        
-        for figi in list(registry["assets"].keys()):
-            data = registry["assets"][figi]
-            last_updated = datetime.fromisoformat(data["last_updated"])
-            if last_updated < threshold and data["status"] != "active":
-                del registry["assets"][figi]
-                self.logger.info(f"Removed old record: {figi}")
-        
-        self._save_registry(registry)
\ No newline at end of file
+        threshold = datetime.utcnow() - timedelta(days=days_threshold)
+        with self.lock:
+            for figi in list(self.registry["assets"].keys()):
+                data = self.registry["assets"][figi]
+                last_updated = datetime.fromisoformat(data["last_updated"])
+                if last_updated < threshold and data["status"] != "active":
+                    self._record({"op": "delete", "figi": figi})
+                    self.logger.info(f"Removed old record: {figi}")
+        self.flush()
+
+
+_default_registry: Optional[AssetRegistry] = None
+
+
+def get_registry() -> AssetRegistry:
+    global _default_registry
+    if _default_registry is None:
+        _default_registry = AssetRegistry()
+    return _default_registry
+
+
+def get_broker_and_figi(asset_name: str) -> Tuple[Optional[str], Optional[str]]:
+    """Брокер и FIGI актива по FIGI или тикеру; (None, None), если актив не зарегистрирован"""
+    registry = get_registry()
+    figi = registry.find_figi(asset_name)
+    if figi is None:
+        return None, None
+    return registry.get(figi)["broker"], figi
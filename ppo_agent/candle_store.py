@@ -0,0 +1,228 @@
+import json
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+from filelock import FileLock
+
+from ppo_agent import DATA_DIR
+from ppo_agent.enums import SUPPORTED_TIMEFRAMES, INTERVAL_TO_TIMESPAN
+from ppo_agent.metrics import BROKER_ERRORS, BROKER_REQUESTS, stage_timer
+
+# Формат хранения свечей: время в наносекундах UTC + OHLCV
+CANDLE_DTYPE = np.dtype([
+    ("time", "<i8"),
+    ("open", "<f8"),
+    ("high", "<f8"),
+    ("low", "<f8"),
+    ("close", "<f8"),
+    ("volume", "<f8"),
+])
+PRICE_COLUMNS = ["open", "high", "low", "close", "volume"]
+
+
+def _to_ns(value: datetime) -> int:
+    ts = pd.Timestamp(value)
+    if ts.tzinfo is None:
+        ts = ts.tz_localize("UTC")
+    return int(ts.value)
+
+
+def _from_ns(value: int) -> datetime:
+    return pd.Timestamp(value, unit="ns", tz="UTC").to_pydatetime()
+
+
+def _merge_ranges(ranges: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def _subtract_ranges(start: int, end: int, covered: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    missing = []
+    cursor = start
+    for c_start, c_end in covered:
+        if c_end <= cursor:
+            continue
+        if c_start >= end:
+            break
+        if c_start > cursor:
+            missing.append((cursor, c_start))
+        cursor = max(cursor, c_end)
+    if cursor < end:
+        missing.append((cursor, end))
+    return missing
+
+
+def candles_to_records(df: pd.DataFrame) -> np.ndarray:
+    """
+    Приводит DataFrame брокера (время в колонке time или в индексе) к массиву CANDLE_DTYPE.
+    """
+    if df.empty:
+        return np.empty(0, dtype=CANDLE_DTYPE)
+
+    times = df["time"] if "time" in df.columns else df.index
+    times = pd.DatetimeIndex(pd.to_datetime(times, utc=True)).tz_convert(None)
+
+    records = np.empty(len(df), dtype=CANDLE_DTYPE)
+    records["time"] = np.asarray(times, dtype="datetime64[ns]").view("int64")
+    for col in PRICE_COLUMNS:
+        records[col] = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=np.float64) if col in df.columns else np.nan
+
+    records = records[np.argsort(records["time"], kind="stable")]
+    # При дублях оставляем последнюю версию свечи
+    keep = np.append(records["time"][1:] != records["time"][:-1], True)
+    return records[keep]
+
+
+def records_to_frame(records: np.ndarray) -> pd.DataFrame:
+    df = pd.DataFrame({col: np.asarray(records[col]) for col in PRICE_COLUMNS})
+    df.index = pd.to_datetime(np.asarray(records["time"]), unit="ns", utc=True)
+    df.index.name = "time"
+    return df
+
+
+class CandleStore:
+    """
+    Локальное колоночное хранилище свечей с инкрементальной догрузкой.
+
+    Каждая пара (figi, timeframe) хранится в отдельном каталоге:
+    candles.bin — отсортированный по времени массив CANDLE_DTYPE, читается через memmap,
+    meta.json — интервалы времени, уже запрошенные у брокера.
+    У брокера запрашиваются только непокрытые интервалы (хвост и дыры).
+    """
+
+    def __init__(self, root_dir: Path = DATA_DIR / "candles"):
+        self.root = Path(root_dir)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+    def _partition(self, figi: str, timeframe: str) -> Path:
+        path = self.root / figi / timeframe
+        path.mkdir(parents=True, exist_ok=True)
+        return path
+
+    def _get_lock(self, partition: Path) -> FileLock:
+        return FileLock(str(partition / "candles.lock"))
+
+    def _load_meta(self, partition: Path) -> dict:
+        meta_path = partition / "meta.json"
+        if meta_path.exists():
+            with open(meta_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        return {"covered": []}
+
+    def _save_meta(self, partition: Path, meta: dict):
+        tmp_path = partition / "meta.json.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, partition / "meta.json")
+
+    def _read_records(self, partition: Path) -> np.ndarray:
+        data_path = partition / "candles.bin"
+        if not data_path.exists() or data_path.stat().st_size == 0:
+            return np.empty(0, dtype=CANDLE_DTYPE)
+        return np.memmap(data_path, dtype=CANDLE_DTYPE, mode="r")
+
+    def _write_records(self, partition: Path, records: np.ndarray):
+        if len(records) == 0:
+            return
+        data_path = partition / "candles.bin"
+        stored = self._read_records(partition)
+
+        if len(stored) == 0 or records["time"][0] > stored["time"][-1]:
+            # Обычный случай — только новые свечи в хвосте: дописываем в конец файла
+            with open(data_path, "ab") as f:
+                f.write(records.tobytes())
+            return
+
+        # Догрузка дыры — сливаем и переписываем раздел целиком
+        merged = np.concatenate([np.asarray(stored), records])
+        order = np.argsort(merged["time"], kind="stable")
+        merged = merged[order]
+        keep = np.append(merged["time"][1:] != merged["time"][:-1], True)
+        del stored
+
+        tmp_path = partition / "candles.bin.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(merged[keep].tobytes())
+        os.replace(tmp_path, data_path)
+
+    def last_timestamp(self, figi: str, timeframe: str):
+        """Время последней сохранённой свечи или None"""
+        records = self._read_records(self._partition(figi, timeframe))
+        if len(records) == 0:
+            return None
+        return _from_ns(int(records["time"][-1]))
+
+    def read(self, figi: str, timeframe: str, from_: datetime, to_: datetime) -> pd.DataFrame:
+        """Свечи из хранилища в интервале [from_, to_)"""
+        records = self._read_records(self._partition(figi, timeframe))
+        times = records["time"]
+        lo = np.searchsorted(times, _to_ns(from_), side="left")
+        hi = np.searchsorted(times, _to_ns(to_), side="left")
+        return records_to_frame(records[lo:hi])
+
+    def missing_ranges(self, figi: str, timeframe: str, from_: datetime, to_: datetime) -> List[Tuple[datetime, datetime]]:
+        meta = self._load_meta(self._partition(figi, timeframe))
+        covered = [tuple(r) for r in meta["covered"]]
+        return [(_from_ns(a), _from_ns(b)) for a, b in _subtract_ranges(_to_ns(from_), _to_ns(to_), covered)]
+
+    @staticmethod
+    def _fetch(broker, figi: str, from_ns: int, to_ns: int, interval) -> pd.DataFrame:
+        name = type(broker).__name__
+        BROKER_REQUESTS.labels(name).inc()
+        try:
+            with stage_timer("broker_fetch"):
+                return broker.get_market_data_history(
+                    figi=figi,
+                    from_=_from_ns(from_ns),
+                    to_=_from_ns(to_ns),
+                    interval=interval
+                )
+        except Exception:
+            BROKER_ERRORS.labels(name, "exception").inc()
+            raise
+
+    def sync(self, broker, figi: str, timeframe: str, from_: datetime, to_: datetime) -> pd.DataFrame:
+        """
+        Догружает у брокера только недостающие закрытые свечи и возвращает окно [from_, to_].
+        Незакрытая (текущая) свеча запрашивается всегда, но в хранилище не пишется.
+        """
+        interval = SUPPORTED_TIMEFRAMES[timeframe]
+        span_ns = int(INTERVAL_TO_TIMESPAN[interval] / timedelta(microseconds=1)) * 1000
+        from_ns, to_ns = _to_ns(from_), _to_ns(to_)
+        closed_ns = max(from_ns, to_ns - to_ns % span_ns)
+
+        partition = self._partition(figi, timeframe)
+        with self._get_lock(partition):
+            meta = self._load_meta(partition)
+            covered = [tuple(r) for r in meta["covered"]]
+
+            for start, end in _subtract_ranges(from_ns, closed_ns, covered):
+                fetched = candles_to_records(self._fetch(broker, figi, start, end, interval))
+                if len(fetched) == 0:
+                    # Пустой ответ может быть и ошибкой брокера — не помечаем интервал покрытым
+                    BROKER_ERRORS.labels(type(broker).__name__, "empty").inc()
+                    continue
+                self._write_records(partition, fetched[fetched["time"] < end])
+                covered.append((start, end))
+
+            meta["covered"] = [list(r) for r in _merge_ranges(covered)]
+            self._save_meta(partition, meta)
+
+            stored = self.read(figi, timeframe, _from_ns(from_ns), _from_ns(closed_ns))
+
+        if closed_ns >= to_ns:
+            return stored
+
+        tail = records_to_frame(candles_to_records(self._fetch(broker, figi, closed_ns, to_ns, interval)))
+        if tail.empty:
+            return stored
+        return pd.concat([stored, tail[tail.index >= pd.Timestamp(closed_ns, unit="ns", tz="UTC")]])
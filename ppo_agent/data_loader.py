@@ -1,14 +1,22 @@
+import os
 import pandas as pd
 from datetime import datetime
 from typing import Literal
 
-from ppo_agent.indicators import compute_all_indicators
+from ppo_agent import DATA_DIR
+from ppo_agent.indicators import IndicatorEngine
+from ppo_agent.candle_store import CandleStore
 from brokers.broker import get_broker
 from ppo_agent.enums import SUPPORTED_TIMEFRAMES, INTERVAL_TO_TIMESPAN
+from ppo_agent.metrics import stage_timer, timed
 
 
-broker = get_broker("tinkoff")
+# PPO_BROKER=replay — офлайн-режим на записанных или синтетических свечах
+broker = get_broker(os.getenv("PPO_BROKER", "tinkoff"))
+candle_store = CandleStore()
+indicator_engine = IndicatorEngine(state_dir=DATA_DIR / "indicators")
 
+@timed("load_recent_candles")
 def load_recent_candles(asset: str, timeframe: Literal["1m", "5m", "15m", "1h", "1d"], steps: int = 100) -> pd.DataFrame:
     """
     Загружает последние свечи и считает индикаторы.
@@ -17,18 +25,28 @@ def load_recent_candles(asset: str, timeframe: Literal["1m", "5m", "15m", "1h",
     interval_duration = INTERVAL_TO_TIMESPAN[interval]
     to_time = datetime.utcnow()
     from_time = to_time - steps * interval_duration
+    key = (asset, timeframe)
 
-    df = broker.get_market_data_history(
-        figi=asset,
-        from_=from_time,
-        to_=to_time,
-        interval=interval
-    )
+    # Индикаторы считаются потоково: догружаем свечи начиная с последней обработанной
+    state = indicator_engine.get_state(key)
+    if state is not None and state.last_time is not None:
+        last_time = pd.Timestamp(state.last_time, unit="ns").to_pydatetime()
+        if last_time < from_time - steps * interval_duration:
+            indicator_engine.reset(key)
+        else:
+            from_time = min(from_time, last_time)
+
+    # Из брокера догружаются только новые свечи, остальное читается из локального хранилища
+    with stage_timer("candle_sync"):
+        df = candle_store.sync(broker, asset, timeframe, from_time, to_time)
 
     if df.empty or len(df) < 10:
         raise ValueError(f"Недостаточно свечей для {asset} на таймфрейме {timeframe}")
 
-    return compute_all_indicators(df)
+    closed_before = to_time - (to_time - datetime(1970, 1, 1)) % interval_duration
+    with stage_timer("indicators_update"):
+        result = indicator_engine.update(key, df, closed_before)
+    return result.tail(steps).reset_index(drop=True)
 
 
 def load_from_csv(csv_path: str) -> pd.DataFrame:
@@ -0,0 +1,157 @@
+from functools import partial
+from typing import Any, List, Optional, Sequence
+
+import gymnasium as gym
+import numpy as np
+import pandas as pd
+from gymnasium import spaces
+from stable_baselines3.common.vec_env import SubprocVecEnv, VecEnv
+
+# Действия: 0 — шорт, 1 — вне позиции, 2 — лонг
+N_ACTIONS = 3
+
+
+def compute_rewards(df: pd.DataFrame) -> np.ndarray:
+    """
+    Награда строки — доходность следующей свечи: при позиции p на шаге t агент получает p * reward[t].
+    """
+    return df["close"].pct_change().shift(-1).fillna(0.0).to_numpy(dtype=np.float32)
+
+
+def _validate(features: np.ndarray, rewards: np.ndarray):
+    if features.ndim != 2:
+        raise ValueError(f"Ожидается матрица признаков (time, features), получено {features.shape}")
+    if len(features) != len(rewards):
+        raise ValueError("Длины признаков и наград не совпадают")
+    if len(features) < 2:
+        raise ValueError("Для среды нужно минимум 2 строки данных")
+
+
+class CandleTradingVecEnv(VecEnv):
+    """
+    Векторная торговая среда поверх заранее рассчитанных признаков и наград.
+    N эпизодов шагают одновременно одной numpy-операцией; каждый эпизод начинается
+    со случайной строки и длится episode_length шагов (или до конца данных).
+    """
+
+    render_mode = None
+
+    def __init__(self, features: np.ndarray, rewards: np.ndarray, n_envs: int = 1,
+                 episode_length: Optional[int] = None, seed: Optional[int] = None):
+        features = np.ascontiguousarray(features, dtype=np.float32)
+        rewards = np.ascontiguousarray(rewards, dtype=np.float32).reshape(-1)
+        _validate(features, rewards)
+
+        observation_space = spaces.Box(-np.inf, np.inf, shape=(features.shape[1],), dtype=np.float32)
+        super().__init__(n_envs, observation_space, spaces.Discrete(N_ACTIONS))
+
+        self.features = features
+        self.rewards = rewards
+        self.episode_length = min(episode_length or len(features) - 1, len(features) - 1)
+        self.rng = np.random.default_rng(seed)
+
+        self.positions = np.zeros(n_envs, dtype=np.int64)
+        self.steps = np.zeros(n_envs, dtype=np.int64)
+        self.episode_returns = np.zeros(n_envs, dtype=np.float64)
+        self.actions = np.zeros(n_envs, dtype=np.int64)
+
+    def _random_starts(self, n: int) -> np.ndarray:
+        return self.rng.integers(0, len(self.features) - self.episode_length, size=n)
+
+    def seed(self, seed: Optional[int] = None) -> Sequence[Optional[int]]:
+        self.rng = np.random.default_rng(seed)
+        return [seed] * self.num_envs
+
+    def reset(self) -> np.ndarray:
+        self.positions[:] = self._random_starts(self.num_envs)
+        self.steps[:] = 0
+        self.episode_returns[:] = 0.0
+        return self.features[self.positions]
+
+    def step_async(self, actions: np.ndarray):
+        self.actions = np.asarray(actions, dtype=np.int64).reshape(self.num_envs)
+
+    def step_wait(self):
+        step_rewards = (self.actions - 1) * self.rewards[self.positions]
+        self.episode_returns += step_rewards
+        self.positions += 1
+        self.steps += 1
+
+        dones = self.steps >= self.episode_length
+        obs = self.features[self.positions]
+        infos: List[dict] = [{} for _ in range(self.num_envs)]
+
+        if dones.any():
+            done_idx = np.flatnonzero(dones)
+            for i in done_idx:
+                # Конец эпизода — ограничение по времени, а не терминальное состояние рынка
+                infos[i] = {
+                    "terminal_observation": obs[i].copy(),
+                    "TimeLimit.truncated": True,
+                    "episode": {"r": float(self.episode_returns[i]), "l": int(self.steps[i])},
+                }
+            self.positions[done_idx] = self._random_starts(len(done_idx))
+            self.steps[done_idx] = 0
+            self.episode_returns[done_idx] = 0.0
+            obs = self.features[self.positions]
+
+        return obs, step_rewards.astype(np.float32), dones, infos
+
+    def close(self):
+        pass
+
+    def get_attr(self, attr_name: str, indices=None) -> List[Any]:
+        return [getattr(self, attr_name)] * len(self._get_indices(indices))
+
+    def set_attr(self, attr_name: str, value: Any, indices=None):
+        setattr(self, attr_name, value)
+
+    def env_method(self, method_name: str, *method_args, indices=None, **method_kwargs) -> List[Any]:
+        return [getattr(self, method_name)(*method_args, **method_kwargs) for _ in self._get_indices(indices)]
+
+    def env_is_wrapped(self, wrapper_class, indices=None) -> List[bool]:
+        return [False] * len(self._get_indices(indices))
+
+
+class CandleTradingEnv(gym.Env):
+    """Одиночная версия среды для запуска в подпроцессах через SubprocVecEnv"""
+
+    def __init__(self, features: np.ndarray, rewards: np.ndarray, episode_length: Optional[int] = None):
+        super().__init__()
+        self.features = np.ascontiguousarray(features, dtype=np.float32)
+        self.rewards = np.ascontiguousarray(rewards, dtype=np.float32).reshape(-1)
+        _validate(self.features, self.rewards)
+
+        self.observation_space = spaces.Box(-np.inf, np.inf, shape=(self.features.shape[1],), dtype=np.float32)
+        self.action_space = spaces.Discrete(N_ACTIONS)
+        self.episode_length = min(episode_length or len(self.features) - 1, len(self.features) - 1)
+        self.position = 0
+        self.steps = 0
+
+    def reset(self, *, seed: Optional[int] = None, options: Optional[dict] = None):
+        super().reset(seed=seed)
+        self.position = int(self.np_random.integers(0, len(self.features) - self.episode_length))
+        self.steps = 0
+        return self.features[self.position], {}
+
+    def step(self, action):
+        reward = float((int(action) - 1) * self.rewards[self.position])
+        self.position += 1
+        self.steps += 1
+        truncated = self.steps >= self.episode_length
+        return self.features[self.position], reward, False, truncated, {}
+
+
+def make_trading_env(features: np.ndarray, rewards: np.ndarray, n_envs: int = 1,
+                     episode_length: Optional[int] = None, subproc: bool = False,
+                     seed: Optional[int] = None) -> VecEnv:
+    """
+    Создаёт векторную торговую среду: по умолчанию все эпизоды шагают в одном процессе,
+    subproc=True — каждый эпизод в отдельном подпроцессе.
+    """
+    if not subproc:
+        return CandleTradingVecEnv(features, rewards, n_envs=n_envs, episode_length=episode_length, seed=seed)
+
+    env = SubprocVecEnv([partial(CandleTradingEnv, features, rewards, episode_length) for _ in range(n_envs)])
+    env.seed(seed)
+    return env
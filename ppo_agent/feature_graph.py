@@ -0,0 +1,266 @@
+from typing import Callable, Dict, Iterable, List, Mapping, Optional
+
+import numpy as np
+
+from ppo_agent import kernels
+
+
+class Node:
+    """
+    Узел графа признаков: операция, входы (другие узлы) и параметры.
+    Узлы с одинаковыми операцией, входами и параметрами равны, поэтому
+    общее подвыражение (true range, EMA close) вычисляется один раз за прогон.
+    """
+    __slots__ = ("op", "inputs", "params", "key")
+
+    def __init__(self, op: str, *inputs: "Node", **params):
+        if op not in OPS:
+            raise ValueError(f"Неизвестная операция графа признаков: {op}")
+        self.op = op
+        self.inputs = inputs
+        self.params = params
+        self.key = (op, tuple(node.key for node in inputs), tuple(sorted(params.items())))
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Node) and self.key == other.key
+
+    def __hash__(self) -> int:
+        return hash(self.key)
+
+    def __repr__(self) -> str:
+        args = [repr(node) for node in self.inputs] + [f"{k}={v!r}" for k, v in sorted(self.params.items())]
+        return f"{self.op}({', '.join(args)})"
+
+
+OPS: Dict[str, Callable[..., np.ndarray]] = {}
+
+
+def op(name: str):
+    """Регистрирует операцию: fn(*массивы входов, **параметры) -> массив"""
+    def decorator(func):
+        OPS[name] = func
+        return func
+    return decorator
+
+
+# --- Операции ---
+
+@op("column")
+def _column(*, data, name: str) -> np.ndarray:
+    return np.asarray(data[name], dtype=np.float64)
+
+
+@op("diff")
+def _diff(x: np.ndarray) -> np.ndarray:
+    out = np.full(len(x), np.nan)
+    out[1:] = x[1:] - x[:-1]
+    return out
+
+
+@op("clip")
+def _clip(x: np.ndarray, lower: Optional[float] = None, upper: Optional[float] = None) -> np.ndarray:
+    return np.clip(x, lower, upper)
+
+
+@op("negate")
+def _negate(x: np.ndarray) -> np.ndarray:
+    return -x
+
+
+@op("fillna")
+def _fillna(x: np.ndarray, value: float) -> np.ndarray:
+    return np.where(np.isnan(x), value, x)
+
+
+@op("affine")
+def _affine(a: np.ndarray, b: np.ndarray, k: float) -> np.ndarray:
+    """a + k * b"""
+    return a + k * b
+
+
+@op("ewm")
+def _ewm(x: np.ndarray, alpha: float) -> np.ndarray:
+    """ewm(alpha, adjust=False) от первого значения без NaN"""
+    out = np.full(len(x), np.nan)
+    valid = np.flatnonzero(~np.isnan(x))
+    if len(valid):
+        out[valid[0]:] = kernels.ewm(x[valid[0]:], alpha)
+    return out
+
+
+@op("warmup")
+def _warmup(x: np.ndarray, periods: int) -> np.ndarray:
+    """NaN на первых periods-1 значениях после начала ряда, как min_periods у pandas"""
+    out = x.copy()
+    valid = np.flatnonzero(~np.isnan(x))
+    end = valid[0] + periods - 1 if len(valid) else len(x)
+    out[:end] = np.nan
+    return out
+
+
+@op("rolling")
+def _rolling(x: np.ndarray, window: int, stat: str) -> np.ndarray:
+    return kernels.rolling(x, window, stat)[0]
+
+
+@op("true_range")
+def _true_range(high: np.ndarray, low: np.ndarray, close: np.ndarray) -> np.ndarray:
+    return kernels.true_range(high, low, close)
+
+
+@op("wilder")
+def _wilder(x: np.ndarray, window: int) -> np.ndarray:
+    return kernels.wilder_average(x, window)
+
+
+@op("adx")
+def _adx(high: np.ndarray, low: np.ndarray, tr: np.ndarray, window: int) -> np.ndarray:
+    return kernels.adx_from_true_range(high, low, tr, window)
+
+
+@op("rsi")
+def _rsi(up: np.ndarray, down: np.ndarray, zero_down: Optional[float] = None) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = 100 - 100 / (1 + up / down)
+    if zero_down is not None:
+        rsi = np.where(down == 0, zero_down, rsi)
+    return rsi
+
+
+@op("typical_price")
+def _typical_price(high: np.ndarray, low: np.ndarray, close: np.ndarray) -> np.ndarray:
+    return (high + low + close) / 3.0
+
+
+@op("cci")
+def _cci(typical: np.ndarray, mean: np.ndarray, mad: np.ndarray, constant: float) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (typical - mean) / (constant * mad)
+
+
+@op("willr")
+def _willr(close: np.ndarray, highest: np.ndarray, lowest: np.ndarray) -> np.ndarray:
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return -100 * (highest - close) / (highest - lowest)
+
+
+# --- Построители узлов ---
+
+def column(name: str) -> Node:
+    return Node("column", name=name)
+
+
+def ema(x: Node, span: int) -> Node:
+    return Node("ewm", x, alpha=2.0 / (span + 1))
+
+
+def rolling(x: Node, window: int, stat: str = "mean") -> Node:
+    return Node("rolling", x, window=window, stat=stat)
+
+
+def sub(a: Node, b: Node) -> Node:
+    return Node("affine", a, b, k=-1.0)
+
+
+class FeatureGraph:
+    """
+    Декларативный набор признаков: имя колонки -> узел графа.
+    compute() строит план только для запрошенных колонок, обходит общие
+    подвыражения один раз и хранит промежуточные массивы в кэше прогона.
+    """
+
+    def __init__(self, outputs: Mapping[str, Node]):
+        self.outputs = dict(outputs)
+
+    @property
+    def columns(self) -> List[str]:
+        return list(self.outputs)
+
+    def plan(self, columns: Optional[Iterable[str]] = None) -> List[Node]:
+        """Узлы, нужные для columns, в порядке вычисления (без повторов)"""
+        order: List[Node] = []
+        seen = set()
+
+        def visit(node: Node):
+            if node in seen:
+                return
+            seen.add(node)
+            for child in node.inputs:
+                visit(child)
+            order.append(node)
+
+        for name in self.columns if columns is None else columns:
+            if name not in self.outputs:
+                raise KeyError(f"Признак {name} не описан в графе")
+            visit(self.outputs[name])
+        return order
+
+    def compute(self, data, columns: Optional[Iterable[str]] = None,
+                cache: Optional[Dict[Node, np.ndarray]] = None) -> Dict[str, np.ndarray]:
+        """
+        :param data: источник колонок (DataFrame или словарь массивов)
+        :param columns: какие признаки нужны; по умолчанию все
+        :param cache: общий кэш узлов, чтобы несколько вызовов на одних данных делили промежуточные массивы
+        """
+        columns = self.columns if columns is None else list(columns)
+        cache = {} if cache is None else cache
+        for node in self.plan(columns):
+            if node in cache:
+                continue
+            if node.op == "column":
+                cache[node] = OPS["column"](data=data, **node.params)
+            else:
+                cache[node] = OPS[node.op](*(cache[child] for child in node.inputs), **node.params)
+        return {name: cache[self.outputs[name]] for name in columns}
+
+
+# --- Общие узлы ---
+
+HIGH, LOW, CLOSE = column("high"), column("low"), column("close")
+TRUE_RANGE = Node("true_range", HIGH, LOW, CLOSE)
+GAIN = Node("clip", Node("diff", CLOSE), lower=0.0)
+LOSS = Node("negate", Node("clip", Node("diff", CLOSE), upper=0.0))
+MACD_LINE = sub(ema(CLOSE, 12), ema(CLOSE, 26))
+TYPICAL_PRICE = Node("typical_price", HIGH, LOW, CLOSE)
+
+# Индикаторы indicators.compute_all_indicators: средние по окну, EMA без прогрева
+INDICATOR_GRAPH = FeatureGraph({
+    "rsi": Node("rsi", rolling(GAIN, 14), rolling(LOSS, 14)),
+    "macd": MACD_LINE,
+    "atr": rolling(TRUE_RANGE, 14),
+    "sma14": rolling(CLOSE, 14),
+    "ema14": ema(CLOSE, 14),
+})
+
+
+def _ta_features() -> Dict[str, Node]:
+    # Те же формулы, что у ta (эталон features.compute_ta_indicators)
+    rsi_alpha = 1.0 / kernels.RSI_WINDOW
+    rsi = Node("rsi",
+               Node("ewm", Node("fillna", GAIN, value=0.0), alpha=rsi_alpha),
+               Node("ewm", Node("fillna", LOSS, value=0.0), alpha=rsi_alpha),
+               zero_down=100.0)
+    macd = Node("warmup", MACD_LINE, periods=kernels.MACD_SLOW)
+    signal = Node("warmup", ema(macd, kernels.MACD_SIGNAL), periods=kernels.MACD_SIGNAL)
+    bb_mean = rolling(CLOSE, kernels.BB_WINDOW)
+    bb_std = rolling(CLOSE, kernels.BB_WINDOW, "std")
+    return {
+        "rsi": Node("warmup", rsi, periods=kernels.RSI_WINDOW),
+        "atr": Node("wilder", TRUE_RANGE, window=kernels.ATR_WINDOW),
+        "macd": macd,
+        "macd_signal": signal,
+        "macd_hist": sub(macd, signal),
+        "ema12": Node("warmup", ema(CLOSE, kernels.MACD_FAST), periods=kernels.MACD_FAST),
+        "ema26": Node("warmup", ema(CLOSE, kernels.MACD_SLOW), periods=kernels.MACD_SLOW),
+        "bb_upper": Node("affine", bb_mean, bb_std, k=kernels.BB_DEV),
+        "bb_lower": Node("affine", bb_mean, bb_std, k=-kernels.BB_DEV),
+        "adx": Node("adx", HIGH, LOW, TRUE_RANGE, window=kernels.ADX_WINDOW),
+        "cci": Node("cci", TYPICAL_PRICE, rolling(TYPICAL_PRICE, kernels.CCI_WINDOW),
+                    rolling(TYPICAL_PRICE, kernels.CCI_WINDOW, "mad"), constant=kernels.CCI_CONSTANT),
+        "willr": Node("willr", CLOSE, rolling(HIGH, kernels.WILLR_WINDOW, "max"),
+                      rolling(LOW, kernels.WILLR_WINDOW, "min")),
+    }
+
+
+# Признаки features.compute_features (семантика библиотеки ta)
+FEATURE_GRAPH = FeatureGraph(_ta_features())
@@ -1,7 +1,17 @@
+import json
+import os
+import threading
+from pathlib import Path
+from typing import List, Dict, Optional, Sequence
+
+import numpy as np
 import pandas as pd
-from typing import List, Dict
 import ta  # Technical Analysis library
 
+from ppo_agent.feature_graph import FEATURE_GRAPH
+from ppo_agent.kernels import compute_feature_arrays
+from ppo_agent.metrics import timed
+
 
 # Соответствия между названиями колонок в CSV и используемыми признаками модели
 FEATURE_MAPPING: Dict[str, str] = {
@@ -23,9 +33,75 @@ FEATURE_MAPPING: Dict[str, str] = {
 }
 
 
-def extract_features(df: pd.DataFrame, required_only: bool = False) -> pd.DataFrame:
+class RunningNormalizer:
     """
-    Преобразует таблицу данных, оставляя только валидные признаки, переименовывает их, заполняет пропуски.
+    Потоковые статистики признаков (среднее и дисперсия по Уэлфорду,
+    пачки объединяются формулой Чана). Хранятся рядом с чекпоинтом модели,
+    обновляются при обучении и применяются к одной свече за O(признаков).
+    """
+
+    def __init__(self, columns: Sequence[str], count: int = 0,
+                 mean: Optional[Sequence[float]] = None, m2: Optional[Sequence[float]] = None, eps: float = 1e-6):
+        self.columns = list(columns)
+        self.count = int(count)
+        self.mean = np.zeros(len(self.columns)) if mean is None else np.asarray(mean, dtype=np.float64)
+        self.m2 = np.zeros(len(self.columns)) if m2 is None else np.asarray(m2, dtype=np.float64)
+        self.eps = eps
+
+    @property
+    def std(self) -> np.ndarray:
+        if self.count < 2:
+            return np.ones(len(self.columns))
+        return np.sqrt(self.m2 / (self.count - 1))
+
+    def update(self, values: np.ndarray) -> None:
+        """Добавляет пачку наблюдений формы (n, признаков); строки с NaN пропускаются"""
+        values = np.asarray(values, dtype=np.float64).reshape(-1, len(self.columns))
+        values = values[np.isfinite(values).all(axis=1)]
+        n = len(values)
+        if n == 0:
+            return
+        batch_mean = values.mean(axis=0)
+        batch_m2 = ((values - batch_mean) ** 2).sum(axis=0)
+        total = self.count + n
+        delta = batch_mean - self.mean
+        self.mean = self.mean + delta * n / total
+        self.m2 = self.m2 + batch_m2 + delta ** 2 * self.count * n / total
+        self.count = total
+
+    def transform(self, values: np.ndarray) -> np.ndarray:
+        """z-нормализация; пропуски заменяются средним (то есть нулём)"""
+        normalized = (np.asarray(values, dtype=np.float64) - self.mean) / (self.std + self.eps)
+        return np.nan_to_num(normalized, nan=0.0, posinf=0.0, neginf=0.0).astype(np.float32)
+
+    def to_dict(self) -> dict:
+        return {"columns": self.columns, "count": self.count, "mean": self.mean.tolist(),
+                "m2": self.m2.tolist(), "eps": self.eps}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "RunningNormalizer":
+        return cls(data["columns"], data["count"], data["mean"], data["m2"], data.get("eps", 1e-6))
+
+    def save(self, path: Path) -> None:
+        path = Path(path)
+        # Один ряд могут сохранять воркер обучения CSV и онлайн-воркер: у каждого свой временный файл
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> Optional["RunningNormalizer"]:
+        path = Path(path)
+        if not path.exists():
+            return None
+        with open(path, "r") as f:
+            return cls.from_dict(json.load(f))
+
+
+def select_features(df: pd.DataFrame, required_only: bool = False) -> pd.DataFrame:
+    """
+    Оставляет только валидные признаки, переименовывает их и заполняет пропуски, без нормализации.
     """
     features = []
     for col in df.columns:
@@ -37,12 +113,29 @@ def extract_features(df: pd.DataFrame, required_only: bool = False) -> pd.DataFr
 
     feature_df = df[[orig for orig, _ in features]].copy()
     feature_df.columns = [new for _, new in features]
+    return feature_df.ffill().bfill()
+
+
+@timed("extract_features")
+def extract_features(df: pd.DataFrame, required_only: bool = False,
+                     normalizer: Optional[RunningNormalizer] = None) -> pd.DataFrame:
+    """
+    Преобразует таблицу данных, оставляя только валидные признаки, переименовывает их, заполняет пропуски.
+    С normalizer признаки нормализуются сохранёнными статистиками, без него — по самому окну.
+    """
+    feature_df = select_features(df, required_only)
 
-    # Заполняем пропуски и нормализуем (по желанию — тут простая нормализация)
-    feature_df = feature_df.fillna(method="ffill").fillna(method="bfill")
-    feature_df = (feature_df - feature_df.mean()) / (feature_df.std() + 1e-6)
+    if normalizer is not None:
+        values = normalizer.transform(feature_df.reindex(columns=normalizer.columns).to_numpy())
+        return pd.DataFrame(values, index=feature_df.index, columns=normalizer.columns)
 
-    return feature_df
+    return (feature_df - feature_df.mean()) / (feature_df.std() + 1e-6)
+
+
+def required_indicators(columns: Sequence[str]) -> List[str]:
+    """Индикаторы графа признаков, которые нужны для колонок модели (через FEATURE_MAPPING)"""
+    names = {FEATURE_MAPPING[c.lower()] for c in columns if c.lower() in FEATURE_MAPPING}
+    return [name for name in FEATURE_GRAPH.columns if name in names]
 
 
 def get_feature_names() -> List[str]:
@@ -51,43 +144,70 @@ def get_feature_names() -> List[str]:
     """
     return list(FEATURE_MAPPING.values())
 
-def compute_features(df: pd.DataFrame) -> pd.DataFrame:
+def compute_ta_indicators(df: pd.DataFrame) -> Dict[str, pd.Series]:
+    """
+    Эталонный расчёт индикаторов библиотекой ta (каждый индикатор — отдельные проходы pandas).
+    Используется для проверки эквивалентности быстрых ядер.
+    """
+    high, low, close = df["high"], df["low"], df["close"]
+    macd = ta.trend.MACD(close=close)
+    bb = ta.volatility.BollingerBands(close=close)
+    return {
+        "rsi": ta.momentum.RSIIndicator(close=close).rsi(),
+        "atr": ta.volatility.AverageTrueRange(high=high, low=low, close=close).average_true_range(),
+        "macd": macd.macd(),
+        "macd_signal": macd.macd_signal(),
+        "macd_hist": macd.macd_diff(),
+        "ema12": ta.trend.EMAIndicator(close=close, window=12).ema_indicator(),
+        "ema26": ta.trend.EMAIndicator(close=close, window=26).ema_indicator(),
+        "bb_upper": bb.bollinger_hband(),
+        "bb_lower": bb.bollinger_lband(),
+        "adx": ta.trend.ADXIndicator(high=high, low=low, close=close).adx(),
+        "cci": ta.trend.CCIIndicator(high=high, low=low, close=close).cci(),
+        "willr": ta.momentum.WilliamsRIndicator(high=high, low=low, close=close).williams_r(),
+    }
+
+
+@timed("compute_features")
+def compute_features(df: pd.DataFrame, backend: str = "auto",
+                     columns: Optional[Sequence[str]] = None) -> pd.DataFrame:
     """
     Вычисляет технические индикаторы из исходных OHLCV-данных.
     :param df: DataFrame с колонками open, high, low, close, volume
+    :param backend: "auto" (numba, если установлен, иначе numpy), "numba", "numpy" или "ta" (эталон)
+    :param columns: признаки модели (например, колонки её нормализатора); индикаторы
+                    вне этого списка не считаются — используется граф признаков,
+                    поэтому совместимы только backend "auto" и "ta"
     :return: DataFrame с рассчитанными признаками
     """
+    if columns is not None and backend not in ("auto", "ta"):
+        raise ValueError(f"backend={backend!r} не поддерживает columns: выборочный расчёт идёт через граф признаков")
     df = df.copy()
 
     if "close" not in df.columns:
         raise ValueError("Для вычисления индикаторов требуется колонка 'close'")
 
-    # RSI
-    df["rsi"] = ta.momentum.RSIIndicator(close=df["close"]).rsi()
-
-    # ATR
-    df["atr"] = ta.volatility.AverageTrueRange(high=df["high"], low=df["low"], close=df["close"]).average_true_range()
-
-    # MACD
-    macd = ta.trend.MACD(close=df["close"])
-    df["macd"] = macd.macd()
-    df["ema12"] = macd.ema12()
-    df["ema26"] = macd.ema26()
-
-    # Bollinger Bands
-    bb = ta.volatility.BollingerBands(close=df["close"])
-    df["bb_upper"] = bb.bollinger_hband()
-    df["bb_lower"] = bb.bollinger_lband()
-
-    # ADX
-    df["adx"] = ta.trend.ADXIndicator(high=df["high"], low=df["low"], close=df["close"]).adx()
-
-    # CCI
-    df["cci"] = ta.trend.CCIIndicator(high=df["high"], low=df["low"], close=df["close"]).cci()
-
-    # Williams %R
-    df["willr"] = ta.momentum.WilliamsRIndicator(high=df["high"], low=df["low"], close=df["close"]).williams_r()
-
-    # Очистка и нормализация
-    df = df.dropna()
-    return extract_features(df)
+    if backend == "ta":
+        indicators = compute_ta_indicators(df)
+        if columns is not None:
+            indicators = {name: indicators[name] for name in required_indicators(columns)}
+    elif columns is not None:
+        indicators = FEATURE_GRAPH.compute(df, required_indicators(columns))
+    else:
+        indicators = compute_feature_arrays(df["high"].to_numpy(), df["low"].to_numpy(),
+                                            df["close"].to_numpy(), backend=backend)
+    for name, values in indicators.items():
+        df[name] = values
+
+    # Индикаторы вне FEATURE_MAPPING (сигнальная линия и гистограмма MACD) отдаются
+    # только здесь: в признаки моделей они не входят, размер наблюдения не меняется
+    extra = [name for name in indicators if name not in FEATURE_MAPPING]
+
+    # Очистка и нормализация; строки отбрасываются только по признакам модели,
+    # более долгий прогрев дополнительных индикаторов заполняется средним (нулём)
+    df = df[df.drop(columns=extra).notna().all(axis=1)]
+    features = extract_features(df)
+    if extra:
+        extra_df = df[extra]
+        features[extra] = ((extra_df - extra_df.mean()) / (extra_df.std() + 1e-6)).fillna(0.0)
+    return features
@@ -1,5 +1,18 @@
+import json
+import os
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from threading import Lock
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 import pandas as pd
 
+from ppo_agent.feature_graph import INDICATOR_GRAPH
+from ppo_agent.metrics import timed
+
 
 def compute_rsi(series: pd.Series, period: int = 14) -> pd.Series:
     delta = series.diff()
@@ -39,14 +52,421 @@ def compute_ema(series: pd.Series, period: int = 14) -> pd.Series:
     return series.ewm(span=period, adjust=False).mean()
 
 
-def compute_all_indicators(df: pd.DataFrame) -> pd.DataFrame:
+INDICATOR_COLUMNS = ["rsi", "macd", "atr", "sma14", "ema14"]
+
+
+@timed("compute_all_indicators")
+def compute_all_indicators(df: pd.DataFrame, columns: Optional[Iterable[str]] = None) -> pd.DataFrame:
+    """
+    Индикаторы через граф признаков: общие части (true range, EMA) считаются один раз.
+    :param columns: если задано — считаются только перечисленные индикаторы (остальные колонки игнорируются)
+    """
     df = df.copy()
 
-    df["rsi"] = compute_rsi(df["close"])
-    df["macd"] = compute_macd(df["close"])
-    df["atr"] = compute_atr(df)
-    df["sma14"] = compute_sma(df["close"], 14)
-    df["ema14"] = compute_ema(df["close"], 14)
+    wanted = INDICATOR_COLUMNS if columns is None else [c for c in INDICATOR_COLUMNS if c in set(columns)]
+    for name, values in INDICATOR_GRAPH.compute(df, wanted).items():
+        df[name] = values
 
     df = df.dropna().reset_index(drop=True)
     return df
+
+
+class StreamingIndicators:
+    """
+    Потоковый расчёт индикаторов compute_all_indicators: каждая новая свеча
+    обрабатывается за O(1) без пересчёта всего окна — суммы окон ведутся
+    нарастающим итогом и периодически пересчитываются, чтобы не копить ошибку float.
+    Результаты совпадают с пакетными функциями с точностью до погрешности float.
+    """
+
+    # Через столько свечей суммы окон пересчитываются заново
+    RESUM_EVERY = 1024
+
+    def __init__(self, rsi_period: int = 14, span_short: int = 12, span_long: int = 26,
+                 atr_period: int = 14, sma_period: int = 14, ema_period: int = 14):
+        self.rsi_period = rsi_period
+        self.span_short = span_short
+        self.span_long = span_long
+        self.atr_period = atr_period
+        self.sma_period = sma_period
+        self.ema_period = ema_period
+
+        self.prev_close = None
+        self.gains = deque(maxlen=rsi_period)
+        self.losses = deque(maxlen=rsi_period)
+        self.true_ranges = deque(maxlen=atr_period)
+        self.closes = deque(maxlen=sma_period)
+        self._windows = (self.gains, self.losses, self.true_ranges, self.closes)
+        self._sums = [0.0] * len(self._windows)
+        self._nonzero = [0] * len(self._windows)
+        self._since_resum = 0
+        self.ema_short = None
+        self.ema_long = None
+        self.ema = None
+        self.last_time = None
+
+    @staticmethod
+    def _ewm(prev, value: float, span: int) -> float:
+        # Аналог ewm(span=span, adjust=False)
+        if prev is None:
+            return value
+        alpha = 2.0 / (span + 1)
+        return alpha * value + (1 - alpha) * prev
+
+    def _push(self, i: int, value: float):
+        window = self._windows[i]
+        if len(window) == window.maxlen:
+            self._sums[i] -= window[0]
+            self._nonzero[i] -= window[0] != 0
+        window.append(value)
+        self._sums[i] += value
+        self._nonzero[i] += value != 0
+
+    def _resum(self):
+        self._sums = [float(sum(window)) for window in self._windows]
+        self._nonzero = [sum(value != 0 for value in window) for window in self._windows]
+        self._since_resum = 0
+
+    def update(self, high: float, low: float, close: float, time: int = None) -> Dict[str, float]:
+        """
+        Добавляет закрытую свечу и возвращает значения индикаторов на ней
+        (NaN, пока не накоплено достаточно истории).
+        """
+        if self.prev_close is not None:
+            delta = close - self.prev_close
+            self._push(0, max(delta, 0.0))
+            self._push(1, max(-delta, 0.0))
+            true_range = max(high - low, abs(high - self.prev_close), abs(low - self.prev_close))
+        else:
+            true_range = high - low
+        self._push(2, true_range)
+        self._push(3, close)
+        self._since_resum += 1
+        if self._since_resum >= self.RESUM_EVERY:
+            self._resum()
+
+        self.ema_short = self._ewm(self.ema_short, close, self.span_short)
+        self.ema_long = self._ewm(self.ema_long, close, self.span_long)
+        self.ema = self._ewm(self.ema, close, self.ema_period)
+        self.prev_close = close
+        if time is not None:
+            self.last_time = time
+
+        return self.current()
+
+    def current(self) -> Dict[str, float]:
+        nan = float("nan")
+
+        rsi = nan
+        sum_gain, sum_loss, sum_tr, sum_close = self._sums
+        if len(self.gains) == self.rsi_period:
+            avg_gain = sum_gain / self.rsi_period
+            avg_loss = sum_loss / self.rsi_period
+            # Нулевое окно определяется счётчиком: у нарастающей суммы может остаться остаток float
+            if self._nonzero[1]:
+                rsi = 100 - 100 / (1 + avg_gain / avg_loss)
+            elif self._nonzero[0]:
+                rsi = 100.0
+
+        atr = sum_tr / self.atr_period if len(self.true_ranges) == self.atr_period else nan
+        sma = sum_close / self.sma_period if len(self.closes) == self.sma_period else nan
+        macd = self.ema_short - self.ema_long if self.ema_short is not None else nan
+
+        return {
+            "rsi": rsi,
+            "macd": macd,
+            "atr": atr,
+            "sma14": sma,
+            "ema14": self.ema if self.ema is not None else nan,
+        }
+
+    def copy(self) -> "StreamingIndicators":
+        return StreamingIndicators.from_dict(self.to_dict())
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "params": {
+                "rsi_period": self.rsi_period,
+                "span_short": self.span_short,
+                "span_long": self.span_long,
+                "atr_period": self.atr_period,
+                "sma_period": self.sma_period,
+                "ema_period": self.ema_period,
+            },
+            "prev_close": self.prev_close,
+            "gains": list(self.gains),
+            "losses": list(self.losses),
+            "true_ranges": list(self.true_ranges),
+            "closes": list(self.closes),
+            "sums": list(self._sums),
+            "since_resum": self._since_resum,
+            "ema_short": self.ema_short,
+            "ema_long": self.ema_long,
+            "ema": self.ema,
+            "last_time": self.last_time,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "StreamingIndicators":
+        state = cls(**data["params"])
+        state.prev_close = data["prev_close"]
+        state.gains.extend(data["gains"])
+        state.losses.extend(data["losses"])
+        state.true_ranges.extend(data["true_ranges"])
+        state.closes.extend(data["closes"])
+        state._resum()
+        if "sums" in data:
+            # Сохранённые суммы — чтобы восстановленное состояние совпадало с исходным до бита
+            state._sums = list(data["sums"])
+            state._since_resum = data["since_resum"]
+        state.ema_short = data["ema_short"]
+        state.ema_long = data["ema_long"]
+        state.ema = data["ema"]
+        state.last_time = data["last_time"]
+        return state
+
+
+class IndicatorEngine:
+    """
+    Набор потоковых состояний индикаторов, по одному на (asset, timeframe),
+    с буфером последних рассчитанных строк.
+    На диске — снимок {key}.json и журнал {key}.jsonl закрытых свечей после него:
+    свеча дописывается в журнал, а снимок переписывается, только когда журнал
+    дорастает до history строк.
+    """
+
+    def __init__(self, history: int = 500, state_dir: Optional[Path] = None):
+        self.history = history
+        self.state_dir = Path(state_dir) if state_dir else None
+        self.states: Dict[Tuple[str, str], StreamingIndicators] = {}
+        self.rows: Dict[Tuple[str, str], deque] = {}
+        self.log_sizes: Dict[Tuple[str, str], int] = {}
+        self.lock = Lock()
+        if self.state_dir:
+            self.state_dir.mkdir(parents=True, exist_ok=True)
+
+    def _state_path(self, key: Tuple[str, str]) -> Path:
+        return self.state_dir / f"{key[0]}_{key[1]}.json"
+
+    def _log_path(self, key: Tuple[str, str]) -> Path:
+        return self.state_dir / f"{key[0]}_{key[1]}.jsonl"
+
+    def get_state(self, key: Tuple[str, str]) -> Optional[StreamingIndicators]:
+        if key not in self.states and self.state_dir and (
+                self._state_path(key).exists() or self._log_path(key).exists()):
+            self.load(key)
+        return self.states.get(key)
+
+    def reset(self, key: Tuple[str, str]):
+        self.states.pop(key, None)
+        self.rows.pop(key, None)
+        self.log_sizes.pop(key, None)
+
+    def save(self, key: Tuple[str, str]):
+        """Полный снимок состояния; журнал после него больше не нужен"""
+        path = self._state_path(key)
+        tmp_path = path.with_suffix(".json.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"state": self.states[key].to_dict(), "rows": list(self.rows[key])}, f)
+        os.replace(tmp_path, path)
+        self._log_path(key).unlink(missing_ok=True)
+        self.log_sizes[key] = 0
+
+    def _append_log(self, key: Tuple[str, str], entries: List[Dict[str, Any]]):
+        """Дописывает закрытые свечи: входы состояния и строка буфера (None, если индикаторы ещё NaN)"""
+        with open(self._log_path(key), "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(entry) + "\n" for entry in entries))
+        self.log_sizes[key] = self.log_sizes.get(key, 0) + len(entries)
+        if self.log_sizes[key] >= self.history:
+            self.save(key)
+
+    def load(self, key: Tuple[str, str]):
+        state, rows = StreamingIndicators(), deque(maxlen=self.history)
+        if self._state_path(key).exists():
+            with open(self._state_path(key), "r", encoding="utf-8") as f:
+                data = json.load(f)
+            state = StreamingIndicators.from_dict(data["state"])
+            rows.extend(data["rows"])
+
+        # Свечи после снимка переигрываются через состояние
+        replayed = 0
+        log_path = self._log_path(key)
+        if log_path.exists():
+            with open(log_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        break  # Недописанная строка при аварийной остановке
+                    high, low, close, time = entry["candle"]
+                    if state.last_time is not None and time <= state.last_time:
+                        continue  # Уже в снимке: сбой между записью снимка и удалением журнала
+                    state.update(high, low, close, time)
+                    if entry["row"] is not None:
+                        rows.append(entry["row"])
+                    replayed += 1
+        self.states[key] = state
+        self.rows[key] = rows
+        self.log_sizes[key] = replayed
+
+    def update(self, key: Tuple[str, str], df: pd.DataFrame, closed_before: Optional[datetime] = None) -> pd.DataFrame:
+        """
+        Прогоняет через состояние только свечи новее последней обработанной.
+        Свечи с временем >= closed_before (незакрытые) считаются на копии состояния
+        и в состояние не попадают. Время свечи (UTC) возвращается в колонке time.
+        :return: DataFrame в формате compute_all_indicators по буферу истории
+        """
+        times = df["time"] if "time" in df.columns else df.index
+        times = pd.DatetimeIndex(pd.to_datetime(times, utc=True)).tz_convert(None)
+        times = np.asarray(times, dtype="datetime64[ns]").view("int64")
+        closed_ns = None
+        if closed_before is not None:
+            closed_ts = pd.Timestamp(closed_before)
+            closed_ns = (closed_ts.tz_convert(None) if closed_ts.tzinfo else closed_ts).value
+
+        columns = [c for c in df.columns if c != "time"]
+        values = df[columns].to_numpy()
+        high_idx, low_idx, close_idx = columns.index("high"), columns.index("low"), columns.index("close")
+
+        with self.lock:
+            state = self.get_state(key)
+            if state is None:
+                state = self.states[key] = StreamingIndicators()
+                self.rows[key] = deque(maxlen=self.history)
+            rows = self.rows[key]
+
+            preview_state = None
+            preview_rows = []
+            committed = []
+            for time, row in zip(times, values):
+                time = int(time)
+                if state.last_time is not None and time <= state.last_time:
+                    continue
+                is_closed = closed_ns is None or time < closed_ns
+                target = state if is_closed else (preview_state or state.copy())
+                if not is_closed:
+                    preview_state = target
+
+                candle = [float(row[high_idx]), float(row[low_idx]), float(row[close_idx]), time]
+                result = target.update(*candle)
+                out = None
+                if not any(value != value for value in result.values()):
+                    out = dict(zip(columns, row.tolist()))
+                    out.update(result)
+                    out["time"] = time
+                if is_closed:
+                    committed.append({"candle": candle, "row": out})
+                    if out is not None:
+                        rows.append(out)
+                elif out is not None:
+                    preview_rows.append(out)
+
+            if committed and self.state_dir:
+                self._append_log(key, committed)
+
+            result = pd.DataFrame(list(rows) + preview_rows)
+        if "time" in result.columns:
+            result["time"] = pd.to_datetime(result["time"], unit="ns")
+        return result
+
+
+# --- Панельный режим: индикаторы сразу для многих рядов (asset × time или asset × timeframe × time) ---
+
+PANEL_COLUMNS = ["open", "high", "low", "close", "volume"]
+
+
+def _panel_shift(x: np.ndarray) -> np.ndarray:
+    shifted = np.full_like(x, np.nan)
+    shifted[..., 1:] = x[..., :-1]
+    return shifted
+
+
+def _panel_rolling_mean(x: np.ndarray, window: int) -> np.ndarray:
+    # Как rolling(window).mean(): NaN, если в окне есть пропуск
+    out = np.full_like(x, np.nan)
+    if x.shape[-1] >= window:
+        out[..., window - 1:] = sliding_window_view(x, window, axis=-1).mean(axis=-1)
+    return out
+
+
+def _panel_ewm(x: np.ndarray, span: int) -> np.ndarray:
+    # Как ewm(span=span, adjust=False).mean(): стартует с первого валидного значения ряда.
+    # Цикл идёт по времени, а все ряды панели обрабатываются одной векторной операцией.
+    alpha = 2.0 / (span + 1)
+    out = np.full_like(x, np.nan)
+    prev = np.full(x.shape[:-1], np.nan)
+    for t in range(x.shape[-1]):
+        value = x[..., t]
+        step = np.where(np.isnan(prev), value, alpha * value + (1 - alpha) * prev)
+        prev = np.where(np.isnan(value), prev, step)
+        out[..., t] = np.where(np.isnan(value), np.nan, step)
+    return out
+
+
+@timed("compute_panel_indicators")
+def compute_panel_indicators(panel: Dict[str, np.ndarray],
+                             columns: Optional[Iterable[str]] = None) -> Dict[str, np.ndarray]:
+    """
+    Векторный расчёт индикаторов compute_all_indicators для блока рядов.
+    :param panel: {"high", "low", "close", ...} -> массивы формы (..., time), время по последней оси;
+                  ряды разной длины дополняются NaN в начале или в конце
+    :param columns: если задано — считаются только перечисленные индикаторы (как у compute_all_indicators)
+    :return: {индикатор: массив той же формы} и маска "valid" — строки, которые
+             compute_all_indicators оставил бы после dropna()
+    """
+    wanted = set(INDICATOR_COLUMNS if columns is None else columns)
+    high = np.asarray(panel["high"], dtype=np.float64)
+    low = np.asarray(panel["low"], dtype=np.float64)
+    close = np.asarray(panel["close"], dtype=np.float64)
+    prev_close = _panel_shift(close)
+
+    result = {}
+    if "rsi" in wanted:
+        with np.errstate(divide="ignore", invalid="ignore"):
+            delta = close - prev_close
+            avg_gain = _panel_rolling_mean(np.clip(delta, 0, None), 14)
+            avg_loss = _panel_rolling_mean(-np.clip(delta, None, 0), 14)
+            result["rsi"] = 100 - (100 / (1 + avg_gain / avg_loss))
+    if "macd" in wanted:
+        result["macd"] = _panel_ewm(close, 12) - _panel_ewm(close, 26)
+    if "atr" in wanted:
+        true_range = np.fmax(np.fmax(high - low, np.abs(high - prev_close)), np.abs(low - prev_close))
+        result["atr"] = _panel_rolling_mean(true_range, 14)
+    if "sma14" in wanted:
+        result["sma14"] = _panel_rolling_mean(close, 14)
+    if "ema14" in wanted:
+        result["ema14"] = _panel_ewm(close, 14)
+
+    valid = np.ones(close.shape, dtype=bool)
+    for values in list(result.values()) + [np.asarray(panel[c], dtype=np.float64) for c in panel]:
+        valid &= ~np.isnan(values)
+    result["valid"] = valid
+    return result
+
+
+def stack_panel(frames: List[pd.DataFrame], columns: List[str] = PANEL_COLUMNS) -> Dict[str, np.ndarray]:
+    """
+    Собирает свечи нескольких рядов в панель (n_series, max_len), выравнивая по последней свече:
+    более короткие истории дополняются NaN в начале.
+    """
+    length = max((len(df) for df in frames), default=0)
+    panel = {}
+    for col in columns:
+        block = np.full((len(frames), length), np.nan)
+        for i, df in enumerate(frames):
+            if len(df) and col in df.columns:
+                block[i, length - len(df):] = pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=np.float64)
+        panel[col] = block
+    return panel
+
+
+def unstack_panel(panel: Dict[str, np.ndarray], indicators: Dict[str, np.ndarray]) -> List[pd.DataFrame]:
+    """Разбирает 2-D панель обратно в DataFrame'ы в формате compute_all_indicators"""
+    frames = []
+    valid = indicators["valid"]
+    for i in range(valid.shape[0]):
+        mask = valid[i]
+        data = {col: values[i][mask] for col, values in panel.items()}
+        data.update({col: indicators[col][i][mask] for col in INDICATOR_COLUMNS if col in indicators})
+        frames.append(pd.DataFrame(data))
+    return frames
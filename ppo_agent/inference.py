@@ -0,0 +1,154 @@
+import copy
+from pathlib import Path
+from typing import Dict, Tuple
+
+import numpy as np
+
+try:
+    import torch
+    import torch.nn as nn
+except ImportError:  # pragma: no cover - узлы инференса без torch
+    torch = None
+    nn = None
+
+Heads = Tuple[np.ndarray, np.ndarray, np.ndarray]
+
+
+def export_weights(model) -> Dict[str, np.ndarray]:
+    """
+    Веса PPOModel в numpy: два слоя общей части и одна объединённая матрица голов
+    [policy | confidence | value], чтобы все выходы считались одним умножением.
+    """
+    linear1, linear2 = model.shared[0], model.shared[2]
+    heads = [model.policy_head, model.confidence_head, model.value_head]
+
+    def np32(t):
+        return t.detach().cpu().numpy().astype(np.float32)
+
+    return {
+        "w1": np32(linear1.weight).T.copy(), "b1": np32(linear1.bias),
+        "w2": np32(linear2.weight).T.copy(), "b2": np32(linear2.bias),
+        "wh": np.concatenate([np32(h.weight) for h in heads]).T.copy(),
+        "bh": np.concatenate([np32(h.bias) for h in heads]),
+        "output_dim": np.array(model.policy_head.out_features),
+    }
+
+
+class NumpyRuntime:
+    """Инференс PPOModel на чистом numpy для CPU-узлов без torch"""
+
+    def __init__(self, weights: Dict[str, np.ndarray]):
+        self.w1, self.b1 = weights["w1"], weights["b1"]
+        self.w2, self.b2 = weights["w2"], weights["b2"]
+        self.wh, self.bh = weights["wh"], weights["bh"]
+        self.output_dim = int(weights["output_dim"])
+
+    @classmethod
+    def load(cls, path: Path) -> "NumpyRuntime":
+        with np.load(path) as data:
+            return cls({key: data[key] for key in data.files})
+
+    def __call__(self, x: np.ndarray) -> Heads:
+        x = np.atleast_2d(np.asarray(x, dtype=np.float32))
+        h = np.maximum(x @ self.w1 + self.b1, 0.0)
+        h = np.maximum(h @ self.w2 + self.b2, 0.0)
+        out = h @ self.wh + self.bh
+        o = self.output_dim
+        signal = np.tanh(out[:, :o])
+        confidence = 1.0 / (1.0 + np.exp(-out[:, o:o + 1]))
+        return signal, confidence, out[:, o + 1:]
+
+
+if nn is not None:
+    class FusedPPOModule(nn.Module):
+        """
+        Общая часть считается один раз, все головы — одним Linear.
+        Модуль — снимок весов модели: и общая часть, и головы копируются,
+        поэтому продолжающееся обучение исходной модели его не меняет.
+        """
+
+        def __init__(self, model):
+            super().__init__()
+            self.output_dim = model.policy_head.out_features
+            self.shared = copy.deepcopy(model.shared)
+            heads = [model.policy_head, model.confidence_head, model.value_head]
+            self.heads = nn.Linear(model.policy_head.in_features, self.output_dim + 2)
+            with torch.no_grad():
+                self.heads.weight.copy_(torch.cat([h.weight for h in heads]))
+                self.heads.bias.copy_(torch.cat([h.bias for h in heads]))
+
+        def forward(self, x: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+            out = self.heads(self.shared(x))
+            o = self.output_dim
+            return torch.tanh(out[:, :o]), torch.sigmoid(out[:, o:o + 1]), out[:, o + 1:]
+
+
+class TorchRuntime:
+    """Инференс объединённой модели (или загруженного TorchScript) в режиме inference_mode"""
+
+    def __init__(self, module):
+        self.module = module.eval()
+
+    @classmethod
+    def from_model(cls, model, script: bool = False) -> "TorchRuntime":
+        fused = FusedPPOModule(model).eval()
+        return cls(torch.jit.script(fused) if script else fused)
+
+    @classmethod
+    def load(cls, path: Path) -> "TorchRuntime":
+        return cls(torch.jit.load(str(path), map_location="cpu"))
+
+    def __call__(self, x: np.ndarray) -> Heads:
+        with torch.inference_mode():
+            tensor = torch.as_tensor(np.atleast_2d(np.asarray(x, dtype=np.float32)))
+            return tuple(t.numpy() for t in self.module(tensor))
+
+
+class OnnxRuntime:
+    """Инференс экспортированной ONNX-модели через onnxruntime"""
+
+    def __init__(self, path: Path):
+        import onnxruntime as ort
+        self.session = ort.InferenceSession(str(path), providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, x: np.ndarray) -> Heads:
+        x = np.atleast_2d(np.asarray(x, dtype=np.float32))
+        return tuple(self.session.run(None, {self.input_name: x}))
+
+
+def export_torchscript(model, path: Path) -> Path:
+    path = Path(path)
+    torch.jit.save(torch.jit.script(FusedPPOModule(model).eval()), str(path))
+    return path
+
+
+def export_onnx(model, path: Path) -> Path:
+    """Экспорт в ONNX с динамическим размером батча (нужен пакет onnx)"""
+    path = Path(path)
+    fused = FusedPPOModule(model).eval()
+    dummy = torch.zeros(1, model.shared[0].in_features)
+    torch.onnx.export(
+        fused, (dummy,), str(path),
+        input_names=["x"], output_names=["signal", "confidence", "value"],
+        dynamic_axes={name: {0: "batch"} for name in ("x", "signal", "confidence", "value")},
+    )
+    return path
+
+
+def export_numpy(model, path: Path) -> Path:
+    path = Path(path)
+    np.savez(path, **export_weights(model))
+    return path
+
+
+def load_runtime(path: Path):
+    """Выбор рантайма по расширению: .npz — numpy, .onnx — onnxruntime, иначе TorchScript"""
+    path = Path(path)
+    if path.suffix == ".npz":
+        return NumpyRuntime.load(path)
+    if path.suffix == ".onnx":
+        return OnnxRuntime(path)
+    if torch is None:
+        raise RuntimeError(f"Для загрузки {path.name} нужен torch, используйте экспорт в .npz")
+    return TorchRuntime.load(path)
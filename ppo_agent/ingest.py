@@ -0,0 +1,79 @@
+from pathlib import Path
+from typing import Dict, Tuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from ppo_agent import DATA_DIR
+
+UPLOADS_DIR = DATA_DIR / "uploads"
+GROUP_COLUMNS = ["asset", "timeframe"]
+
+
+def validate_csv_header(csv_path: Path) -> list:
+    """Проверяет заголовок CSV без чтения данных"""
+    columns = list(pd.read_csv(csv_path, nrows=0).columns)
+    if not set(GROUP_COLUMNS).issubset(columns):
+        raise ValueError(f"CSV должен содержать минимум колонки: {set(GROUP_COLUMNS)}")
+    return columns
+
+
+def infer_csv_dtypes(csv_path: Path, sample_rows: int = 10_000) -> Dict[str, str]:
+    """
+    Фиксирует типы колонок по первым строкам файла, чтобы все чанки писались одинаково:
+    числовые колонки — float64, остальные — строки. Выборка не гарантирует тип
+    для всего файла, поэтому split_csv_groups приводит числовые колонки в каждом чанке.
+    """
+    sample = pd.read_csv(csv_path, nrows=sample_rows)
+    dtypes = {}
+    for col in sample.columns:
+        if col in GROUP_COLUMNS or not pd.api.types.is_numeric_dtype(sample[col]):
+            dtypes[col] = "str"
+        else:
+            dtypes[col] = "float64"
+    return dtypes
+
+
+def split_csv_groups(csv_path: Path, out_dir: Path, chunksize: int = 200_000) -> Dict[Tuple[str, str], Path]:
+    """
+    Потоково разбирает CSV по чанкам и раскладывает каждую группу (asset, timeframe)
+    в отдельный parquet-файл. В памяти одновременно находится только один чанк.
+    """
+    csv_path, out_dir = Path(csv_path), Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    validate_csv_header(csv_path)
+    dtypes = infer_csv_dtypes(csv_path)
+    numeric = [col for col, dtype in dtypes.items() if dtype == "float64"]
+    rejected = dict.fromkeys(numeric, 0)
+
+    writers: Dict[Tuple[str, str], pq.ParquetWriter] = {}
+    paths: Dict[Tuple[str, str], Path] = {}
+    try:
+        # Числовые колонки читаются строками и приводятся в каждом чанке:
+        # нечисловое значение после выборки становится NaN, а не ошибкой записи
+        for chunk in pd.read_csv(csv_path, chunksize=chunksize, dtype=dict(dtypes, **dict.fromkeys(numeric, "str"))):
+            for col in numeric:
+                values = pd.to_numeric(chunk[col], errors="coerce")
+                rejected[col] += int((values.isna() & chunk[col].notna()).sum())
+                chunk[col] = values.astype("float64")
+            for (asset, timeframe), group in chunk.groupby(GROUP_COLUMNS, sort=False):
+                key = (asset, timeframe)
+                table = pa.Table.from_pandas(group.drop(columns=GROUP_COLUMNS), preserve_index=False)
+                writer = writers.get(key)
+                if writer is None:
+                    paths[key] = out_dir / f"group_{len(paths):05d}.parquet"
+                    writer = writers[key] = pq.ParquetWriter(paths[key], table.schema)
+                writer.write_table(table.cast(writer.schema))
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    for col, count in rejected.items():
+        if count:
+            print(f"⚠️ {csv_path.name}: {count} нечисловых значений в колонке {col} заменены на NaN")
+    return paths
+
+
+def read_group(path: Path) -> pd.DataFrame:
+    return pd.read_parquet(path)
@@ -0,0 +1,397 @@
+import math
+from itertools import accumulate
+from typing import Dict
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+try:
+    import numba
+except ImportError:  # pragma: no cover - numba опционален, есть numpy-ядро
+    numba = None
+
+# Периоды совпадают с параметрами по умолчанию индикаторов библиотеки ta
+RSI_WINDOW = 14
+ATR_WINDOW = 14
+MACD_FAST = 12
+MACD_SLOW = 26
+MACD_SIGNAL = 9
+BB_WINDOW = 20
+BB_DEV = 2.0
+ADX_WINDOW = 14
+CCI_WINDOW = 20
+CCI_CONSTANT = 0.015
+WILLR_WINDOW = 14
+
+FEATURE_COLUMNS = ("rsi", "atr", "macd", "macd_signal", "macd_hist", "ema12", "ema26",
+                   "bb_upper", "bb_lower", "adx", "cci", "willr")
+_RSI, _ATR, _MACD, _SIGNAL, _HIST, _EMA12, _EMA26, _BB_UPPER, _BB_LOWER, _ADX, _CCI, _WILLR = range(len(FEATURE_COLUMNS))
+
+BACKENDS = ("auto", "numba", "numpy")
+
+# Блок линейного скана выбирается так, чтобы decay**-block не превышал этого значения
+_SCAN_RANGE = 1e8
+# Сколько окон rolling-статистик обрабатывается за раз (ограничивает память)
+_ROLLING_CHUNK = 1 << 16
+
+
+def _linear_scan(x: np.ndarray, decay: float, init: float = 0.0) -> np.ndarray:
+    """
+    y[i] = decay * y[i-1] + x[i], y[-1] = init.
+    Внутри блока рекурсия раскрывается в cumsum, между блоками переносится
+    одно значение, поэтому цикл Python идёт по блокам, а не по элементам.
+    """
+    n = len(x)
+    if n == 0:
+        return np.empty(0)
+    if decay <= 0.0:
+        block = 1
+    elif decay >= 1.0:
+        block = n
+    else:
+        block = int(min(n, max(1, math.log(_SCAN_RANGE) // -math.log(decay))))
+
+    padded = np.zeros(-(-n // block) * block)
+    padded[:n] = x
+    blocks = padded.reshape(-1, block)
+    powers = decay ** np.arange(block)
+    local = np.cumsum(blocks / powers, axis=1) * powers
+
+    tail = decay ** block
+    carry = np.fromiter(accumulate(local[:, -1], lambda c, v: c * tail + v, initial=init),
+                        dtype=np.float64, count=len(local) + 1)[:-1]
+    return (local + carry[:, None] * (powers * decay)).ravel()[:n]
+
+
+def ewm(x: np.ndarray, alpha: float) -> np.ndarray:
+    """Аналог pandas ewm(alpha=alpha, adjust=False).mean() без min_periods"""
+    y = np.empty(len(x))
+    if len(x):
+        y[0] = x[0]
+        y[1:] = _linear_scan(alpha * x[1:], 1.0 - alpha, x[0])
+    return y
+
+
+def rolling(x: np.ndarray, window: int, *stats: str):
+    """
+    Скользящие статистики окна window (mean, std с ddof=0, mad, max, min);
+    первые window-1 значений — NaN, как у pandas rolling с min_periods=window.
+    """
+    n = len(x)
+    results = [np.full(n, np.nan) for _ in stats]
+    if n < window:
+        return results
+    view = sliding_window_view(x, window)
+    for start in range(0, len(view), _ROLLING_CHUNK):
+        chunk = view[start:start + _ROLLING_CHUNK]
+        target = slice(window - 1 + start, window - 1 + start + len(chunk))
+        mean = chunk.mean(axis=1) if {"mean", "std", "mad"} & set(stats) else None
+        for result, stat in zip(results, stats):
+            if stat == "mean":
+                result[target] = mean
+            elif stat == "std":
+                result[target] = np.sqrt(((chunk - mean[:, None]) ** 2).mean(axis=1))
+            elif stat == "mad":
+                result[target] = np.abs(chunk - mean[:, None]).mean(axis=1)
+            elif stat == "max":
+                result[target] = chunk.max(axis=1)
+            elif stat == "min":
+                result[target] = chunk.min(axis=1)
+            else:
+                raise ValueError(f"Неизвестная статистика окна: {stat}")
+    return results
+
+
+def true_range(high: np.ndarray, low: np.ndarray, close: np.ndarray) -> np.ndarray:
+    """max(high - low, |high - prev_close|, |low - prev_close|); на первой свече high - low"""
+    tr = high - low
+    if len(tr) > 1:
+        prev_close = close[:-1]
+        tr[1:] = np.maximum.reduce([tr[1:], np.abs(high[1:] - prev_close), np.abs(low[1:] - prev_close)])
+    return tr
+
+
+def wilder_average(x: np.ndarray, window: int) -> np.ndarray:
+    """Сглаживание Уайлдера, как ATR в ta: нули до window-1, затем (prev * (w-1) + x) / w"""
+    out = np.zeros(len(x))
+    if len(x) >= window:
+        start = x[:window].mean()
+        out[window - 1] = start
+        out[window:] = _linear_scan(x[window:] / window, (window - 1) / window, start)
+    return out
+
+
+def adx_from_true_range(high: np.ndarray, low: np.ndarray, tr: np.ndarray, window: int) -> np.ndarray:
+    """
+    ADX в варианте ta: сглаженные суммы по Уайлдеру и нули до индекса 2 * window - 1.
+    Направленное движение max(high, prev_close) - min(low, prev_close) совпадает с true range.
+    """
+    n = len(tr)
+    out = np.zeros(n)
+    w = window
+    if n < 2 * w:
+        return out
+    diff_up = high[1:] - high[:-1]
+    diff_down = low[:-1] - low[1:]
+    pos = np.where((diff_up > diff_down) & (diff_up > 0), diff_up, 0.0)
+    neg = np.where((diff_down > diff_up) & (diff_down > 0), diff_down, 0.0)
+
+    decay = 1.0 - 1.0 / w
+    trs, dip, din = (np.concatenate(([s[:w].sum()], _linear_scan(s[w:], decay, s[:w].sum())))
+                     for s in (tr[1:], pos, neg))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dip_pct = np.where(trs != 0, 100 * (dip / trs), 0.0)
+        din_pct = np.where(trs != 0, 100 * (din / trs), 0.0)
+        total = dip_pct + din_pct
+        dx = np.where(total != 0, 100 * np.abs((dip_pct - din_pct) / total), 0.0)
+    start = dx[:w].mean()
+    out[2 * w - 1] = start
+    out[2 * w:] = _linear_scan(dx[w:] / w, (w - 1) / w, start)
+    return out
+
+
+def _numpy_features(high: np.ndarray, low: np.ndarray, close: np.ndarray) -> np.ndarray:
+    """Векторизованное ядро: проходы по массивам numpy без промежуточных Series"""
+    n = len(close)
+    out = np.full((n, len(FEATURE_COLUMNS)), np.nan)
+    if n == 0:
+        return out
+
+    # RSI: сглаживание Уайлдера движений вверх и вниз
+    diff = np.diff(close)
+    up = np.concatenate(([0.0], np.where(diff > 0, diff, 0.0)))
+    down = np.concatenate(([0.0], np.where(diff < 0, -diff, 0.0)))
+    ema_up = ewm(up, 1.0 / RSI_WINDOW)
+    ema_down = ewm(down, 1.0 / RSI_WINDOW)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rsi = np.where(ema_down == 0, 100.0, 100.0 - 100.0 / (1.0 + ema_up / ema_down))
+    out[RSI_WINDOW - 1:, _RSI] = rsi[RSI_WINDOW - 1:]
+
+    # ATR: true range общий с ADX; до первого окна нули, как в ta
+    tr = true_range(high, low, close)
+    out[:, _ATR] = wilder_average(tr, ATR_WINDOW)
+
+    # MACD: EMA считаются один раз и идут и в признаки, и в MACD
+    ema_fast = ewm(close, 2.0 / (MACD_FAST + 1))
+    ema_slow = ewm(close, 2.0 / (MACD_SLOW + 1))
+    out[MACD_FAST - 1:, _EMA12] = ema_fast[MACD_FAST - 1:]
+    out[MACD_SLOW - 1:, _EMA26] = ema_slow[MACD_SLOW - 1:]
+    macd = ema_fast - ema_slow
+    out[MACD_SLOW - 1:, _MACD] = macd[MACD_SLOW - 1:]
+    signal_start = MACD_SLOW + MACD_SIGNAL - 2
+    if n > signal_start:
+        signal = ewm(macd[MACD_SLOW - 1:], 2.0 / (MACD_SIGNAL + 1))[MACD_SIGNAL - 1:]
+        out[signal_start:, _SIGNAL] = signal
+        out[signal_start:, _HIST] = macd[signal_start:] - signal
+
+    # Полосы Боллинджера
+    bb_mean, bb_std = rolling(close, BB_WINDOW, "mean", "std")
+    out[:, _BB_UPPER] = bb_mean + BB_DEV * bb_std
+    out[:, _BB_LOWER] = bb_mean - BB_DEV * bb_std
+
+    # ADX в варианте ta поверх того же true range
+    out[:, _ADX] = adx_from_true_range(high, low, tr, ADX_WINDOW)
+
+    # CCI по типичной цене
+    typical = (high + low + close) / 3.0
+    tp_mean, tp_mad = rolling(typical, CCI_WINDOW, "mean", "mad")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out[:, _CCI] = (typical - tp_mean) / (CCI_CONSTANT * tp_mad)
+
+    # Williams %R
+    highest = rolling(high, WILLR_WINDOW, "max")[0]
+    lowest = rolling(low, WILLR_WINDOW, "min")[0]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out[:, _WILLR] = -100 * (highest - close) / (highest - lowest)
+    return out
+
+
+def _divide(a: float, b: float) -> float:
+    """Деление с семантикой numpy: x/0 -> ±inf, 0/0 -> NaN"""
+    if b != 0.0:
+        return a / b
+    if a == 0.0 or a != a:
+        return np.nan
+    return math.copysign(np.inf, a) * math.copysign(1.0, b)
+
+
+def _fused_loop_py(high, low, close, out):
+    """
+    Однопроходное ядро: все индикаторы за один цикл по свечам.
+    Без numba работает как обычная функция Python (медленно, для проверок);
+    с numba компилируется в _fused_loop.
+    """
+    n = close.shape[0]
+    out[:, :] = np.nan
+    if n == 0:
+        return
+    out[:, _ATR] = 0.0
+    out[:, _ADX] = 0.0
+
+    a_rsi = 1.0 / RSI_WINDOW
+    a_fast = 2.0 / (MACD_FAST + 1)
+    a_slow = 2.0 / (MACD_SLOW + 1)
+    a_signal = 2.0 / (MACD_SIGNAL + 1)
+    w = ADX_WINDOW
+
+    ema_up = 0.0
+    ema_down = 0.0
+    ema_fast = close[0]
+    ema_slow = close[0]
+    signal = 0.0
+    tr_sum = 0.0
+    atr = 0.0
+    trs = 0.0
+    dip = 0.0
+    din = 0.0
+    dx_sum = 0.0
+    adx = 0.0
+
+    for t in range(n):
+        h = high[t]
+        l = low[t]
+        c = close[t]
+
+        if t == 0:
+            tr = h - l
+        else:
+            pc = close[t - 1]
+            tr = max(h - l, abs(h - pc), abs(l - pc))
+            diff = c - pc
+            up = diff if diff > 0 else 0.0
+            down = -diff if diff < 0 else 0.0
+            ema_up = (1.0 - a_rsi) * ema_up + a_rsi * up
+            ema_down = (1.0 - a_rsi) * ema_down + a_rsi * down
+            ema_fast = (1.0 - a_fast) * ema_fast + a_fast * c
+            ema_slow = (1.0 - a_slow) * ema_slow + a_slow * c
+
+        # RSI
+        if t >= RSI_WINDOW - 1:
+            out[t, _RSI] = 100.0 if ema_down == 0 else 100.0 - 100.0 / (1.0 + ema_up / ema_down)
+
+        # ATR
+        if t < ATR_WINDOW:
+            tr_sum += tr
+            if t == ATR_WINDOW - 1:
+                atr = tr_sum / ATR_WINDOW
+                out[t, _ATR] = atr
+        else:
+            atr = (atr * (ATR_WINDOW - 1) + tr) / ATR_WINDOW
+            out[t, _ATR] = atr
+
+        # MACD
+        if t >= MACD_FAST - 1:
+            out[t, _EMA12] = ema_fast
+        if t >= MACD_SLOW - 1:
+            macd = ema_fast - ema_slow
+            out[t, _EMA26] = ema_slow
+            out[t, _MACD] = macd
+            if t == MACD_SLOW - 1:
+                signal = macd
+            else:
+                signal = (1.0 - a_signal) * signal + a_signal * macd
+            if t >= MACD_SLOW + MACD_SIGNAL - 2:
+                out[t, _SIGNAL] = signal
+                out[t, _HIST] = macd - signal
+
+        # Полосы Боллинджера
+        if t >= BB_WINDOW - 1:
+            total = 0.0
+            for k in range(t - BB_WINDOW + 1, t + 1):
+                total += close[k]
+            mean = total / BB_WINDOW
+            var = 0.0
+            for k in range(t - BB_WINDOW + 1, t + 1):
+                var += (close[k] - mean) ** 2
+            std = math.sqrt(var / BB_WINDOW)
+            out[t, _BB_UPPER] = mean + BB_DEV * std
+            out[t, _BB_LOWER] = mean - BB_DEV * std
+
+        # ADX (вариант ta); значения начинаются с индекса 2 * w - 1
+        if t >= 1 and n >= 2 * w:
+            pc = close[t - 1]
+            movement = max(h, pc) - min(l, pc)
+            diff_up = h - high[t - 1]
+            diff_down = low[t - 1] - l
+            pos = diff_up if (diff_up > diff_down and diff_up > 0) else 0.0
+            neg = diff_down if (diff_down > diff_up and diff_down > 0) else 0.0
+            if t <= w:
+                trs += movement
+                dip += pos
+                din += neg
+            else:
+                trs = trs - trs / w + movement
+                dip = dip - dip / w + pos
+                din = din - din / w + neg
+            if t >= w:
+                dip_pct = 100 * (dip / trs) if trs != 0 else 0.0
+                din_pct = 100 * (din / trs) if trs != 0 else 0.0
+                total = dip_pct + din_pct
+                dx = 100 * abs((dip_pct - din_pct) / total) if total != 0 else 0.0
+                i = t - w
+                if i < w:
+                    dx_sum += dx
+                    if i == w - 1:
+                        adx = dx_sum / w
+                        out[t, _ADX] = adx
+                else:
+                    adx = (adx * (w - 1) + dx) / w
+                    out[t, _ADX] = adx
+
+        # CCI
+        if t >= CCI_WINDOW - 1:
+            total = 0.0
+            for k in range(t - CCI_WINDOW + 1, t + 1):
+                total += (high[k] + low[k] + close[k]) / 3.0
+            mean = total / CCI_WINDOW
+            mad = 0.0
+            for k in range(t - CCI_WINDOW + 1, t + 1):
+                mad += abs((high[k] + low[k] + close[k]) / 3.0 - mean)
+            mad /= CCI_WINDOW
+            out[t, _CCI] = _divide((h + l + c) / 3.0 - mean, CCI_CONSTANT * mad)
+
+        # Williams %R
+        if t >= WILLR_WINDOW - 1:
+            highest = high[t]
+            lowest = low[t]
+            for k in range(t - WILLR_WINDOW + 1, t):
+                highest = max(highest, high[k])
+                lowest = min(lowest, low[k])
+            out[t, _WILLR] = _divide(-100 * (highest - c), highest - lowest)
+
+
+if numba is not None:
+    _divide = numba.njit(cache=True)(_divide)
+    _fused_loop = numba.njit(cache=True, nogil=True)(_fused_loop_py)
+else:
+    _fused_loop = None
+
+
+def resolve_backend(backend: str = "auto") -> str:
+    if backend not in BACKENDS:
+        raise ValueError(f"Неизвестный бэкенд признаков: {backend}, доступны {BACKENDS}")
+    if backend == "auto":
+        return "numba" if _fused_loop is not None else "numpy"
+    if backend == "numba" and _fused_loop is None:
+        raise ImportError("Для бэкенда numba нужен пакет numba")
+    return backend
+
+
+def compute_feature_arrays(high, low, close, backend: str = "auto") -> Dict[str, np.ndarray]:
+    """
+    Индикаторы compute_features (RSI, ATR, MACD, EMA, Боллинджер, ADX, CCI, Williams %R)
+    по непрерывным массивам float64. Результаты совпадают с библиотекой ta
+    с точностью до погрешности float, включая NaN в начале рядов.
+    """
+    high = np.ascontiguousarray(high, dtype=np.float64)
+    low = np.ascontiguousarray(low, dtype=np.float64)
+    close = np.ascontiguousarray(close, dtype=np.float64)
+    if not (len(high) == len(low) == len(close)):
+        raise ValueError("Ряды high, low и close должны быть одной длины")
+
+    if resolve_backend(backend) == "numba":
+        out = np.empty((len(close), len(FEATURE_COLUMNS)))
+        _fused_loop(high, low, close, out)
+    else:
+        out = _numpy_features(high, low, close)
+    return {name: out[:, i] for i, name in enumerate(FEATURE_COLUMNS)}
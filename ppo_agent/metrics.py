@@ -0,0 +1,245 @@
+import math
+import time
+from bisect import bisect_left
+from functools import wraps
+from threading import Lock
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple
+
+# Границы корзин гистограмм, секунды: от 100 мкс до 30 с
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Sample = Tuple[str, Dict[str, str], float]
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    escaped = (f'{k}="{str(v).replace(chr(92), chr(92) * 2).replace(chr(34), chr(92) + chr(34))}"'
+               for k, v in labels.items())
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = Lock()
+
+    def labels(self, *values, **kwargs):
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        key = tuple(str(v) for v in values)
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def samples(self) -> List[Sample]:
+        raise NotImplementedError
+
+
+class _CounterChild:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = Lock()
+
+    def inc(self, amount: float = 1.0):
+        with self._lock:
+            self.value += amount
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name if name.endswith("_total") else f"{name}_total", documentation, labelnames)
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0):
+        self.labels().inc(amount)
+
+    def samples(self) -> List[Sample]:
+        return [(self.name, dict(zip(self.labelnames, key)), child.value)
+                for key, child in list(self._children.items())]
+
+
+class _HistogramChild:
+    __slots__ = ("buckets", "counts", "sum", "_lock")
+
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self._lock = Lock()
+
+    def observe(self, value: float):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.sum += value
+
+    def time(self) -> "_Timer":
+        return _Timer(self)
+
+
+class _Timer:
+    """Контекстный менеджер: время блока в гистограмму, исключения — в счётчик ошибок"""
+    __slots__ = ("child", "errors", "start")
+
+    def __init__(self, child: _HistogramChild, errors: _CounterChild = None):
+        self.child = child
+        self.errors = errors
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.child.observe(time.perf_counter() - self.start)
+        if exc_type is not None and self.errors is not None:
+            self.errors.inc()
+        return False
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def samples(self) -> List[Sample]:
+        result = []
+        for key, child in list(self._children.items()):
+            labels = dict(zip(self.labelnames, key))
+            with child._lock:
+                counts, total = list(child.counts), child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                result.append((f"{self.name}_bucket", {**labels, "le": _format_value(bound)}, cumulative))
+            result.append((f"{self.name}_sum", labels, total))
+            result.append((f"{self.name}_count", labels, cumulative))
+        return result
+
+
+class Registry:
+    """
+    Реестр метрик процесса. Помимо собственных метрик принимает коллекторы —
+    функции, которые в момент выгрузки возвращают готовые значения (например,
+    статистику кэшей), чтобы не трогать горячий путь.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, _Metric] = {}
+        self._collectors: List[Callable[[], Iterable[Tuple[str, str, str, List[Sample]]]]] = []
+        self._lock = Lock()
+
+    def _get_or_create(self, cls, name: str, documentation: str, labelnames: Sequence[str], **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def register_collector(self, collector: Callable[[], Iterable[Tuple[str, str, str, List[Sample]]]]):
+        """collector() -> [(имя, тип, описание, [(имя сэмпла, метки, значение)])]"""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Текстовый формат Prometheus (exposition format 0.0.4)"""
+        families = [(m.name, m.kind, m.documentation, m.samples()) for m in list(self._metrics.values())]
+        for collector in list(self._collectors):
+            try:
+                families.extend(collector())
+            except Exception:
+                continue
+
+        lines = []
+        for name, kind, documentation, samples in families:
+            lines.append(f"# HELP {name} {documentation}")
+            lines.append(f"# TYPE {name} {kind}")
+            for sample_name, labels, value in samples:
+                lines.append(f"{sample_name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram("ppo_stage_seconds", "Время этапов конвейера данных и модели", ["stage"])
+STAGE_ERRORS = REGISTRY.counter("ppo_stage_errors", "Исключения на этапах конвейера", ["stage"])
+BROKER_REQUESTS = REGISTRY.counter("ppo_broker_requests", "Запросы свечей к брокерам", ["broker"])
+BROKER_ERRORS = REGISTRY.counter("ppo_broker_errors", "Ошибки и пустые ответы брокеров", ["broker", "reason"])
+
+
+def stage_timer(stage: str) -> _Timer:
+    """with stage_timer("extract_features"): ..."""
+    return _Timer(STAGE_SECONDS.labels(stage), STAGE_ERRORS.labels(stage))
+
+
+def timed(stage: str):
+    """Декоратор: время каждого вызова функции как этап stage"""
+    def decorator(func):
+        histogram = STAGE_SECONDS.labels(stage)
+        errors = STAGE_ERRORS.labels(stage)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with _Timer(histogram, errors):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def stats_collector(prefix: str, stats: Callable[[], Dict[str, int]], counters: Iterable[str] = ()):
+    """
+    Коллектор для объектов со stats(): поля из counters выгружаются как счётчики
+    {prefix}_{поле}_total, остальные — как gauge {prefix}_{поле}.
+    """
+    counters = set(counters)
+
+    def collect():
+        families = []
+        for field, value in stats().items():
+            if field in counters:
+                name = f"{prefix}_{field}_total"
+                families.append((name, "counter", f"{prefix}: {field}", [(name, {}, value)]))
+            else:
+                name = f"{prefix}_{field}"
+                families.append((name, "gauge", f"{prefix}: {field}", [(name, {}, value)]))
+        return families
+    return collect
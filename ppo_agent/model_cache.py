@@ -0,0 +1,203 @@
+import time
+from collections import OrderedDict
+from pathlib import Path
+from threading import Lock, RLock
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from ppo_agent.metrics import stage_timer
+
+
+def _load_ppo(path: Path):
+    from stable_baselines3 import PPO
+    return PPO.load(path)
+
+
+def model_nbytes(model) -> int:
+    """Оценка занимаемой моделью памяти: веса политики и состояние оптимизатора"""
+    policy = getattr(model, "policy", None)
+    if policy is None:
+        return 0
+    total = sum(p.numel() * p.element_size() for p in policy.parameters())
+    optimizer = getattr(policy, "optimizer", None)
+    if optimizer is not None:
+        for state in optimizer.state.values():
+            for value in state.values():
+                if hasattr(value, "numel"):
+                    total += value.numel() * value.element_size()
+    return total
+
+
+class ModelCache:
+    """
+    Ленивый LRU-кэш моделей {figi}_{timeframe}.zip.
+    Модели загружаются с диска при первом обращении и вытесняются по давности
+    использования при превышении лимита по количеству или по памяти.
+    Закреплённые (pinned) модели загружаются сразу и не вытесняются.
+    При watch_interval > 0 кэш следит за каталогом: подхватывает новые модели
+    и перечитывает файлы, изменённые другим процессом (по mtime).
+    """
+
+    def __init__(self, model_dir: Path, max_models: int = 256, max_bytes: int = 2 << 30,
+                 pinned: Iterable[str] = (), loader: Callable[[Path], Any] = _load_ppo,
+                 sizeof: Callable[[Any], int] = model_nbytes, watch_interval: float = 0.0):
+        self.model_dir = Path(model_dir)
+        self.model_dir.mkdir(parents=True, exist_ok=True)
+        self.max_models = max_models
+        self.max_bytes = max_bytes
+        self.loader = loader
+        self.sizeof = sizeof
+        self.watch_interval = watch_interval
+
+        self.lock = RLock()
+        self._models: "OrderedDict[str, Any]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._load_locks: Dict[str, Lock] = {}
+        self._mtimes: Dict[str, int] = {}
+        self._checked_at: Dict[str, float] = {}
+        self._index = {path.stem for path in self.model_dir.glob("*.zip")}
+        self._index_refreshed_at = time.monotonic()
+        self.pinned = set(pinned)
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.reloads = 0
+
+        for key in self.pinned:
+            if key in self._index:
+                self[key]
+
+    def _path(self, key: str) -> Path:
+        return self.model_dir / f"{key}.zip"
+
+    def _mtime(self, key: str) -> Optional[int]:
+        try:
+            return self._path(key).stat().st_mtime_ns
+        except FileNotFoundError:
+            return None
+
+    def _maybe_refresh_index(self):
+        if self.watch_interval > 0 and time.monotonic() - self._index_refreshed_at >= self.watch_interval:
+            self.refresh_index()
+
+    def _is_stale(self, key: str) -> bool:
+        """Файл модели перезаписан другим процессом после загрузки"""
+        if self.watch_interval <= 0:
+            return False
+        now = time.monotonic()
+        if now - self._checked_at.get(key, 0.0) < self.watch_interval:
+            return False
+        self._checked_at[key] = now
+        mtime = self._mtime(key)
+        return mtime is not None and mtime != self._mtimes.get(key)
+
+    def version(self, key: str) -> Optional[int]:
+        """Версия модели на диске (mtime файла) — меняется при каждом сохранении"""
+        return self._mtime(key)
+
+    def keys(self) -> List[str]:
+        """Все известные модели — и загруженные, и лежащие на диске"""
+        self._maybe_refresh_index()
+        with self.lock:
+            return sorted(self._index)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.keys())
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, key: str) -> bool:
+        self._maybe_refresh_index()
+        return key in self._index
+
+    def get(self, key: str, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __getitem__(self, key: str):
+        with self.lock:
+            if key in self._models and not self._is_stale(key):
+                self.hits += 1
+                self._models.move_to_end(key)
+                return self._models[key]
+            if key not in self._index:
+                raise KeyError(key)
+            load_lock = self._load_locks.setdefault(key, Lock())
+
+        # Разные модели грузятся параллельно, одна и та же — только один раз
+        with load_lock:
+            with self.lock:
+                mtime = self._mtime(key)
+                if key in self._models:
+                    if self.watch_interval <= 0 or mtime is None or mtime == self._mtimes.get(key):
+                        self.hits += 1
+                        self._models.move_to_end(key)
+                        return self._models[key]
+                    self.reloads += 1
+                self.misses += 1
+            with stage_timer("model_load"):
+                model = self.loader(self._path(key))
+            self._put(key, model, mtime)
+        return model
+
+    def __setitem__(self, key: str, model):
+        self._put(key, model, self._mtime(key))
+
+    def _put(self, key: str, model, mtime: Optional[int] = None):
+        size = self.sizeof(model)
+        with self.lock:
+            self._index.add(key)
+            self._mtimes[key] = mtime
+            if key in self._models:
+                self.bytes -= self._sizes.pop(key, 0)
+            self._models[key] = model
+            self._models.move_to_end(key)
+            self._sizes[key] = size
+            self.bytes += size
+            self._evict(keep=key)
+
+    def _evict(self, keep: Optional[str] = None):
+        while len(self._models) > self.max_models or self.bytes > self.max_bytes:
+            victim = next((k for k in self._models if k not in self.pinned and k != keep), None)
+            if victim is None:
+                return
+            del self._models[victim]
+            self.bytes -= self._sizes.pop(victim, 0)
+            self.evictions += 1
+
+    def pin(self, keys: Iterable[str]):
+        """Закрепляет модели в памяти и сразу их загружает"""
+        keys = list(keys)
+        with self.lock:
+            self.pinned.update(keys)
+        for key in keys:
+            if key in self._index:
+                self[key]
+
+    def invalidate(self, key: str):
+        """Выгружает модель, чтобы следующее обращение перечитало её с диска"""
+        with self.lock:
+            if self._models.pop(key, None) is not None:
+                self.bytes -= self._sizes.pop(key, 0)
+
+    def refresh_index(self):
+        """Подхватывает модели, появившиеся на диске после старта"""
+        with self.lock:
+            self._index |= {path.stem for path in self.model_dir.glob("*.zip")}
+            self._index_refreshed_at = time.monotonic()
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            return {
+                "known": len(self._index),
+                "loaded": len(self._models),
+                "pinned": len(self.pinned),
+                "bytes": self.bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "reloads": self.reloads,
+            }
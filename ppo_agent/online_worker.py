@@ -0,0 +1,174 @@
+import heapq
+import json
+import multiprocessing
+import os
+import time
+import traceback
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from ppo_agent import DATA_DIR, MODELS_DIR
+from ppo_agent.enums import INTERVAL_TO_TIMESPAN, SUPPORTED_TIMEFRAMES
+
+HEALTH_PATH = DATA_DIR / "online_worker.json"
+
+# Длительность свечи в секундах; ряд дообучается после закрытия очередной свечи
+TIMEFRAME_SECONDS = {
+    timeframe: int(INTERVAL_TO_TIMESPAN[interval].total_seconds())
+    for timeframe, interval in SUPPORTED_TIMEFRAMES.items()
+}
+
+
+def next_boundary(now: float, timeframe: str) -> float:
+    span = TIMEFRAME_SECONDS[timeframe]
+    return (now // span + 1) * span
+
+
+def _write_json(path: Path, data: dict):
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+
+class OnlineTrainingWorker:
+    """
+    Онлайн-дообучение в отдельном процессе.
+    С API воркер общается только через каталог моделей: сохраняет дообученные
+    модели, а API подхватывает их по mtime. Свой планировщик держит очередь
+    рядов по времени закрытия следующей свечи; состояние и отставание
+    пишутся в health-файл после каждого шага.
+    """
+
+    def __init__(self, model_dir: Path = MODELS_DIR, health_path: Path = HEALTH_PATH,
+                 idle_sec: float = 5.0, step_pause: float = 0.0, torch_threads: int = 1):
+        self.model_dir = Path(model_dir)
+        self.health_path = Path(health_path)
+        self.idle_sec = idle_sec
+        self.step_pause = step_pause
+        self.torch_threads = torch_threads
+
+        self.queue: List[Tuple[float, str]] = []
+        self.known: set = set()
+        self.started_at = time.time()
+        self.trained = 0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+        self.last_lag = 0.0
+        self.last_step_seconds = 0.0
+
+    def _schedule_new(self, keys: List[str], now: float):
+        for key in keys:
+            if key in self.known:
+                continue
+            _, timeframe = key.rsplit("_", 1)
+            if timeframe not in TIMEFRAME_SECONDS:
+                continue
+            self.known.add(key)
+            heapq.heappush(self.queue, (now, key))
+
+    def health(self, now: Optional[float] = None) -> dict:
+        now = now or time.time()
+        overdue = [now - due for due, _ in self.queue if due <= now]
+        return {
+            "pid": os.getpid(),
+            "started_at": self.started_at,
+            "heartbeat_at": now,
+            "series": len(self.known),
+            "trained_total": self.trained,
+            "errors_total": self.errors,
+            "last_error": self.last_error,
+            "last_step_seconds": self.last_step_seconds,
+            "last_lag_seconds": self.last_lag,
+            "overdue_series": len(overdue),
+            "max_lag_seconds": max(overdue, default=0.0),
+        }
+
+    def _heartbeat(self):
+        _write_json(self.health_path, self.health())
+
+    def run(self, stop_event=None):
+        import torch
+        from ppo_agent.agent import PPOAgent
+        from ppo_agent.data_loader import load_recent_candles
+
+        torch.set_num_threads(self.torch_threads)
+        agent = PPOAgent(model_dir=str(self.model_dir))
+        print(f"🚀 Онлайн-дообучение запущено (pid {os.getpid()})")
+
+        while stop_event is None or not stop_event.is_set():
+            now = time.time()
+            agent.models.refresh_index()
+            self._schedule_new(agent.trained_keys(), now)
+
+            if not self.queue or self.queue[0][0] > now:
+                self._heartbeat()
+                wait = self.idle_sec if not self.queue else min(self.idle_sec, self.queue[0][0] - now)
+                if stop_event is not None:
+                    stop_event.wait(wait)
+                else:
+                    time.sleep(wait)
+                continue
+
+            due, key = heapq.heappop(self.queue)
+            figi, timeframe = key.rsplit("_", 1)
+            self.last_lag = now - due
+            started = time.perf_counter()
+            try:
+                df = load_recent_candles(figi, timeframe)
+                # Дообучение только на свечах, закрывшихся после прошлого шага
+                if agent.fine_tune(figi, timeframe, df):
+                    self.trained += 1
+            except Exception as e:
+                self.errors += 1
+                self.last_error = f"{key}: {e}"
+                print(f"❌ [TRAIN ERROR] {figi} {timeframe}: {e}")
+                traceback.print_exc()
+            self.last_step_seconds = time.perf_counter() - started
+            heapq.heappush(self.queue, (next_boundary(time.time(), timeframe), key))
+            self._heartbeat()
+
+            if self.step_pause:
+                time.sleep(self.step_pause)
+
+
+def _run_worker(stop_event, kwargs: dict):
+    OnlineTrainingWorker(**kwargs).run(stop_event)
+
+
+def start_online_worker(**kwargs):
+    """Запускает воркер в отдельном процессе; возвращает (процесс, событие остановки)"""
+    ctx = multiprocessing.get_context("spawn")
+    stop_event = ctx.Event()
+    process = ctx.Process(target=_run_worker, args=(stop_event, kwargs), name="online-training", daemon=True)
+    process.start()
+    return process, stop_event
+
+
+def stop_online_worker(process, stop_event, timeout: float = 30.0):
+    stop_event.set()
+    process.join(timeout)
+    if process.is_alive():
+        process.terminate()
+        process.join()
+
+
+def read_health(path: Path = HEALTH_PATH, stale_after: float = 120.0) -> dict:
+    """Состояние воркера по health-файлу; alive=False, если heartbeat устарел"""
+    path = Path(path)
+    if not path.exists():
+        return {"alive": False, "reason": "no heartbeat"}
+    with open(path, "r") as f:
+        data = json.load(f)
+    age = time.time() - data["heartbeat_at"]
+    data["heartbeat_age_seconds"] = age
+    data["alive"] = age < stale_after
+    return data
+
+
+if __name__ == "__main__":
+    # Отдельный сервис: python -m ppo_agent.online_worker
+    OnlineTrainingWorker(
+        idle_sec=float(os.getenv("ONLINE_IDLE_SEC", "5")),
+        torch_threads=int(os.getenv("ONLINE_TORCH_THREADS", "1")),
+    ).run()
@@ -0,0 +1,141 @@
+import multiprocessing
+import os
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, Hashable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+ENV_MODES = ("auto", "inprocess", "subproc")
+
+# Ниже этого числа строк подпроцессы среды не окупают пересылку наблюдений
+SUBPROC_MIN_ROWS = 50_000
+
+GroupKey = Tuple[str, str]
+# Задача группы: (figi, timeframe, наблюдения, награды, нормализатор, n_envs, subproc)
+GroupTask = Tuple[str, str, np.ndarray, np.ndarray, object, int, bool]
+
+
+def pack_groups(costs: Dict[Hashable, float], workers: int, tasks_per_worker: int = 4) -> List[List[Hashable]]:
+    """
+    Упаковка групп в задачи пула.
+    Крупные группы идут отдельными задачами, мелкие склеиваются до целевой
+    стоимости total / (workers * tasks_per_worker). Задачи возвращаются по
+    убыванию стоимости: пул раздаёт их свободным процессам, что даёт
+    жадное LPT-расписание и ровную загрузку ядер.
+    """
+    if not costs:
+        return []
+    target = sum(costs.values()) / max(1, workers * tasks_per_worker)
+    tasks: List[Tuple[float, List[Hashable]]] = []
+    bucket: List[Hashable] = []
+    bucket_cost = 0.0
+    for key in sorted(costs, key=costs.get, reverse=True):
+        cost = costs[key]
+        if cost >= target:
+            tasks.append((cost, [key]))
+            continue
+        bucket.append(key)
+        bucket_cost += cost
+        if bucket_cost >= target:
+            tasks.append((bucket_cost, bucket))
+            bucket, bucket_cost = [], 0.0
+    if bucket:
+        tasks.append((bucket_cost, bucket))
+    tasks.sort(key=lambda task: task[0], reverse=True)
+    return [keys for _, keys in tasks]
+
+
+def choose_env_mode(rows: int, n_envs: int, workers: int, mode: str = "auto",
+                    cpu_count: Optional[int] = None) -> bool:
+    """
+    True — среды группы в подпроцессах (SubprocVecEnv), False — в процессе обучения.
+    В auto подпроцессы выбираются, только если на процесс пула приходится
+    несколько свободных ядер, а группа достаточно длинная: CandleTradingVecEnv
+    и так шагает все среды одной numpy-операцией.
+    """
+    if mode not in ENV_MODES:
+        raise ValueError(f"Неизвестный режим сред: {mode}, доступны {ENV_MODES}")
+    if mode != "auto":
+        return mode == "subproc"
+    spare_cores = (cpu_count or os.cpu_count() or 1) // max(1, workers)
+    return n_envs > 1 and spare_cores >= 2 and rows >= SUBPROC_MIN_ROWS
+
+
+# Агент процесса пула создаётся один раз в инициализаторе
+_worker_agent = None
+
+
+def _init_worker(agent_kwargs: dict, torch_threads: int):
+    global _worker_agent
+    import torch
+    from ppo_agent.agent import PPOAgent
+
+    torch.set_num_threads(torch_threads)
+    _worker_agent = PPOAgent(**agent_kwargs)
+
+
+def _train_task(tasks: List[GroupTask]) -> List[Tuple[GroupKey, int, float, Optional[str]]]:
+    results = []
+    for figi, timeframe, observations, rewards, normalizer, n_envs, subproc in tasks:
+        started = time.perf_counter()
+        error = None
+        try:
+            _worker_agent._fit(figi, timeframe, observations, rewards, normalizer, n_envs=n_envs, subproc=subproc)
+        except Exception as e:
+            # Ошибка одной группы не должна останавливать остальные группы задачи
+            error = f"{type(e).__name__}: {e}"
+        results.append(((figi, timeframe), len(observations), time.perf_counter() - started, error))
+    return results
+
+
+def _make_pool(workers: int, agent_kwargs: dict, torch_threads: int) -> ProcessPoolExecutor:
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                               initializer=_init_worker, initargs=(agent_kwargs, torch_threads))
+
+
+def _task_results(groups: Dict[GroupKey, GroupTask], keys: List[GroupKey],
+                  future: Future) -> List[Tuple[GroupKey, int, float, Optional[str]]]:
+    try:
+        return future.result()
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+        return [(key, len(groups[key][2]), 0.0, error) for key in keys]
+
+
+def train_parallel(groups: Dict[GroupKey, GroupTask], agent_kwargs: dict,
+                   workers: int) -> Iterator[Tuple[GroupKey, int, float, Optional[str]]]:
+    """
+    Обучает группы в пуле из workers процессов (spawn); каждый процесс держит
+    свой PPOAgent на общем каталоге моделей и получает cpu_count // workers потоков torch.
+    Отдаёт (ключ, примеров, секунд, ошибка или None) по мере завершения задач.
+    Если процесс пула убит (например, по OOM), пул ломается и роняет все незавершённые
+    задачи. Они перезапускаются каждая в своём пуле: задача, убившая процесс, падает
+    снова и отдаётся с ошибкой, остальные группы дообучаются.
+    """
+    # Стоимость группы — число шагов обучения, оно равно числу наблюдений
+    costs = {key: len(task[2]) for key, task in groups.items()}
+    tasks = pack_groups(costs, workers)
+    if not tasks:
+        return
+    torch_threads = max(1, (os.cpu_count() or 1) // workers)
+    broken: List[List[GroupKey]] = []
+    with _make_pool(min(workers, len(tasks)), agent_kwargs, torch_threads) as pool:
+        futures = {pool.submit(_train_task, [groups[key] for key in keys]): keys for keys in tasks}
+        for future in as_completed(futures):
+            if isinstance(future.exception(), BrokenProcessPool):
+                broken.append(futures[future])
+                continue
+            yield from _task_results(groups, futures[future], future)
+
+    for start in range(0, len(broken), workers):
+        pools = [_make_pool(1, agent_kwargs, torch_threads) for _ in broken[start:start + workers]]
+        try:
+            futures = {pool.submit(_train_task, [groups[key] for key in keys]): keys
+                       for pool, keys in zip(pools, broken[start:start + workers])}
+            for future in as_completed(futures):
+                yield from _task_results(groups, futures[future], future)
+        finally:
+            for pool in pools:
+                pool.shutdown()
@@ -0,0 +1,151 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Tuple
+
+import pandas as pd
+
+_MISSING = object()
+
+
+def candle_bounds(now: float, span_seconds: float) -> Tuple[int, float]:
+    """
+    Граница последней закрытой свечи и момент закрытия следующей (unix-время).
+    Свечи выровнены по эпохе, как и в data_loader.
+    """
+    last_closed = int(now // span_seconds * span_seconds)
+    return last_closed, last_closed + span_seconds
+
+
+def closed_candles(df: pd.DataFrame, last_closed: int) -> pd.DataFrame:
+    """
+    Только свечи, открытые до границы last_closed: незакрытая свеча отбрасывается,
+    и сигнал зависит лишь от ключа кэша, а не от момента запроса.
+    """
+    if "time" not in df.columns:
+        raise ValueError("Нет времени свечей: нельзя отделить незакрытую свечу")
+    closed = df[df["time"] < pd.Timestamp(last_closed, unit="s")]
+    if closed.empty:
+        raise ValueError("Нет закрытых свечей для предсказания")
+    return closed
+
+
+class PredictionCache:
+    """
+    Кэш результатов предсказаний для asyncio.
+    Ключ содержит границу последней закрытой свечи и версию модели, поэтому
+    сигнал пересчитывается только после закрытия свечи или дообучения модели.
+    Запись живёт до заданного expires_at; одновременные промахи по одному
+    ключу ждут одно вычисление (singleflight).
+    """
+
+    def __init__(self, max_entries: int = 10_000, clock: Callable[[], float] = time.time):
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0
+
+    def get(self, key: Hashable, default=None):
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if expires_at <= self.clock():
+            del self._entries[key]
+            return default
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value: Any, expires_at: float):
+        self._entries[key] = (expires_at, value)
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.max_entries:
+            now = self.clock()
+            for stale in [k for k, (exp, _) in self._entries.items() if exp <= now]:
+                del self._entries[stale]
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def get_or_compute(self, key: Hashable, expires_at: float, compute: Callable[[], Awaitable[Any]]):
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            self.hits += 1
+            return value
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            # Вычисление идёт отдельной задачей: отмена запроса-инициатора
+            # (клиент отключился) не обрывает ожидание остальных
+            task = asyncio.ensure_future(compute())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._on_done(key, expires_at, t))
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    async def get_or_compute_many(self, requests: Dict[Hashable, float],
+                                  compute: Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]]
+                                  ) -> Dict[Hashable, Any]:
+        """
+        get_or_compute для нескольких ключей {key: expires_at}: промахи, которые
+        ещё никто не считает, вычисляются одним вызовом compute(keys), который
+        возвращает {key: значение или Exception}.
+        :return: {key: значение или Exception}; ошибки не кэшируются
+        """
+        result: Dict[Hashable, Any] = {}
+        waiting: Dict[Hashable, asyncio.Future] = {}
+        missing: List[Hashable] = []
+        for key in requests:
+            value = self.get(key, _MISSING)
+            if value is not _MISSING:
+                self.hits += 1
+                result[key] = value
+            elif key in self._inflight:
+                self.shared += 1
+                waiting[key] = self._inflight[key]
+            else:
+                self.misses += 1
+                missing.append(key)
+
+        if missing:
+            batch = asyncio.ensure_future(compute(missing))
+            for key in missing:
+                task = asyncio.ensure_future(self._pick(batch, key))
+                self._inflight[key] = task
+                task.add_done_callback(lambda t, key=key: self._on_done(key, requests[key], t))
+                waiting[key] = task
+
+        for key, task in waiting.items():
+            try:
+                result[key] = await asyncio.shield(task)
+            except Exception as e:
+                result[key] = e
+        return result
+
+    @staticmethod
+    async def _pick(batch: asyncio.Future, key: Hashable):
+        value = (await batch)[key]
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+    def _on_done(self, key: Hashable, expires_at: float, task: asyncio.Future):
+        self._inflight.pop(key, None)
+        if task.cancelled():
+            return
+        # Ошибки не кэшируются: следующий запрос попробует снова
+        if task.exception() is None:
+            self.put(key, task.result(), expires_at)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "shared": self.shared,
+        }
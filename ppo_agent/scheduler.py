@@ -0,0 +1,297 @@
+import os
+import queue
+import shutil
+import threading
+import multiprocessing
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Dict, Optional, Tuple, Union
+
+import pandas as pd
+
+from ppo_agent.ingest import read_group, split_csv_groups
+from ppo_agent.status import save_group_status, save_training_status
+
+GroupKey = Tuple[str, str]
+
+# Агент внутри процесса-воркера создаётся один раз при старте пула
+_worker_agent = None
+
+
+def _init_worker():
+    global _worker_agent
+    import torch
+    from ppo_agent.agent import PPOAgent
+
+    # Каждый воркер занимает одно ядро, иначе torch в N процессах перегружает машину
+    torch.set_num_threads(1)
+    _worker_agent = PPOAgent()
+
+
+def _train_group(asset: str, timeframe: str, features: Union[pd.DataFrame, Path]) -> int:
+    # Группы из CSV передаются путём к parquet-файлу и читаются уже в воркере
+    if not isinstance(features, pd.DataFrame):
+        features = read_group(features)
+    _worker_agent.train(asset, timeframe, features)
+    return len(features)
+
+
+def _group_name(key: GroupKey) -> str:
+    return f"{key[0]}/{key[1]}"
+
+
+class TrainingJob:
+    def __init__(self, job_id: str, filename: str, groups: Optional[Dict[GroupKey, Union[pd.DataFrame, Path]]] = None,
+                 csv_path: Optional[Path] = None, work_dir: Optional[Path] = None):
+        self.job_id = job_id
+        self.filename = filename
+        self.groups = groups
+        self.group_status: Dict[GroupKey, str] = {key: "queued" for key in groups or {}}
+        self.futures: Dict[GroupKey, Future] = {}
+        self.status = "queued"
+        self.cancelled = False
+        self.error: Optional[str] = None
+        # Для загрузок CSV: исходный файл и каталог с разобранными группами
+        self.csv_path = csv_path
+        self.work_dir = work_dir
+
+    def progress(self) -> Dict[str, str]:
+        result = {}
+        for key, status in self.group_status.items():
+            future = self.futures.get(key)
+            if status == "queued" and future is not None and future.running():
+                status = "running"
+            result[_group_name(key)] = status
+        return result
+
+    def summary(self) -> Dict[str, int]:
+        counts = {"total": len(self.group_status), "finished": 0, "failed": 0, "cancelled": 0}
+        for status in self.group_status.values():
+            if status == "finished":
+                counts["finished"] += 1
+            elif status == "cancelled":
+                counts["cancelled"] += 1
+            elif status.startswith("failed"):
+                counts["failed"] += 1
+        return counts
+
+
+class TrainingExecutor:
+    """
+    Планировщик обучения: фиксированный пул процессов и очередь заданий.
+    Каждое задание (загруженный CSV) разбивается на задачи по (asset, timeframe);
+    одновременно выполняется не больше max_concurrent_jobs заданий, а число процессов
+    не превышает max_workers независимо от количества загрузок.
+    Если пул сломался (процесс убит, например по OOM), его задачи завершаются
+    ошибкой, а пул пересоздаётся при следующей постановке задачи.
+    """
+
+    def __init__(self, max_workers: Optional[int] = None, max_concurrent_jobs: int = 2):
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.closed = False
+        self.pool = self._make_pool()
+        self.jobs: Dict[str, TrainingJob] = {}
+        # RLock: Future.cancel() вызывает done-колбэки синхронно, под уже взятой блокировкой
+        self.lock = threading.RLock()
+        self.job_slots = threading.Semaphore(max_concurrent_jobs)
+        self.queue: "queue.Queue[Optional[str]]" = queue.Queue()
+        self.dispatcher = threading.Thread(target=self._dispatch_loop, name="training-dispatcher", daemon=True)
+        self.dispatcher.start()
+
+    def _make_pool(self) -> Executor:
+        return ProcessPoolExecutor(
+            max_workers=self.max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+        )
+
+    def _submit(self, fn, *args) -> Future:
+        """
+        Постановка задачи в пул; сломанный пул пересоздаётся один раз.
+        Если и новый пул не принял задачу, возвращается Future с ошибкой.
+        """
+        for _ in range(2):
+            with self.lock:
+                pool = self.pool
+            try:
+                return pool.submit(fn, *args)
+            except BrokenProcessPool as e:
+                error = e
+                with self.lock:
+                    if self.closed:
+                        break
+                    if self.pool is pool:
+                        print("⚠️ Пул обучения сломан, пересоздаём")
+                        pool.shutdown(wait=False, cancel_futures=True)
+                        self.pool = self._make_pool()
+            except RuntimeError as e:
+                # Пул уже остановлен shutdown()
+                error = e
+                break
+        future = Future()
+        future.set_exception(error)
+        return future
+
+    def submit(self, job_id: str, filename: str, groups: Dict[GroupKey, pd.DataFrame]) -> TrainingJob:
+        return self._enqueue(TrainingJob(job_id, filename, groups))
+
+    def submit_csv(self, job_id: str, filename: str, csv_path: Path) -> TrainingJob:
+        """
+        Задание по CSV на диске: файл разбирается на группы в процессе пула,
+        затем каждая группа обучается отдельной задачей.
+        """
+        csv_path = Path(csv_path)
+        work_dir = csv_path.parent / f"{job_id}_groups"
+        return self._enqueue(TrainingJob(job_id, filename, csv_path=csv_path, work_dir=work_dir))
+
+    def _enqueue(self, job: TrainingJob) -> TrainingJob:
+        with self.lock:
+            self.jobs[job.job_id] = job
+        self._save_status(job)
+        self.queue.put(job.job_id)
+        return job
+
+    def cancel(self, job_id: str) -> bool:
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None or job.status in ("finished", "cancelled") or job.status.startswith("failed"):
+                return False
+            job.cancelled = True
+            # Уже запущенные группы дорабатывают, ожидающие снимаются
+            for key, future in job.futures.items():
+                if future.cancel():
+                    job.group_status[key] = "cancelled"
+            if job.status == "queued":
+                for key in job.group_status:
+                    job.group_status[key] = "cancelled"
+                job.status = "cancelled"
+                job.groups = None
+        self._save_status(job)
+        return True
+
+    def progress(self, job_id: str) -> Optional[Dict]:
+        with self.lock:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            return {
+                "status": job.status,
+                "filename": job.filename,
+                "summary": job.summary(),
+                "groups": job.progress(),
+            }
+
+    def shutdown(self, wait: bool = False):
+        with self.lock:
+            self.closed = True
+            pool = self.pool
+        self.queue.put(None)
+        pool.shutdown(wait=wait, cancel_futures=True)
+
+    def _save_status(self, job: TrainingJob):
+        save_training_status(job.job_id, job.status, job.filename, progress=job.summary())
+
+    def _dispatch_loop(self):
+        while True:
+            job_id = self.queue.get()
+            if job_id is None:
+                return
+            self.job_slots.acquire()
+            with self.lock:
+                job = self.jobs[job_id]
+                if job.cancelled:
+                    self._cleanup(job)
+                    self.job_slots.release()
+                    continue
+                job.status = "splitting" if job.csv_path is not None else "started"
+            self._save_status(job)
+
+            # Ошибка одного задания не должна останавливать диспетчер и занимать слот
+            try:
+                if job.csv_path is None:
+                    self._start_groups(job, job.groups)
+                else:
+                    future = self._submit(split_csv_groups, job.csv_path, job.work_dir)
+                    future.add_done_callback(lambda f, job=job: self._on_split_done(job, f))
+            except Exception as e:
+                with self.lock:
+                    job.error = f"{type(e).__name__}: {e}"
+                self._finish_job(job)
+
+    def _on_split_done(self, job: TrainingJob, future: Future):
+        if future.cancelled() or future.exception() is not None:
+            with self.lock:
+                job.error = "cancelled" if future.cancelled() else str(future.exception())
+            self._finish_job(job)
+            return
+        self._start_groups(job, future.result())
+
+    def _start_groups(self, job: TrainingJob, groups: Dict[GroupKey, Union[pd.DataFrame, Path]]):
+        with self.lock:
+            job.groups = None
+            if job.cancelled:
+                groups = {}
+            job.status = "started"
+            for key in groups:
+                job.group_status.setdefault(key, "queued")
+            for key, features in groups.items():
+                job.futures[key] = self._submit(_train_group, key[0], key[1], features)
+        self._save_status(job)
+        for key in groups:
+            save_group_status(job.job_id, key[0], key[1], "queued")
+
+        if not groups:
+            self._finish_job(job)
+        for key, future in list(job.futures.items()):
+            future.add_done_callback(lambda f, job=job, key=key: self._on_group_done(job, key, f))
+
+    def _on_group_done(self, job: TrainingJob, key: GroupKey, future: Future):
+        with self.lock:
+            if future.cancelled():
+                job.group_status[key] = "cancelled"
+            elif future.exception() is not None:
+                job.group_status[key] = f"failed: {future.exception()}"
+            else:
+                job.group_status[key] = "finished"
+            group_status = job.group_status[key]
+            done = all(f.done() for f in job.futures.values())
+
+        save_group_status(job.job_id, key[0], key[1], group_status)
+
+        if done:
+            self._finish_job(job)
+        else:
+            self._save_status(job)
+
+    def _finish_job(self, job: TrainingJob):
+        with self.lock:
+            if job.status not in ("started", "splitting"):
+                return
+            summary = job.summary()
+            if job.cancelled:
+                job.status = "cancelled"
+            elif job.error:
+                job.status = f"failed: {job.error}"
+            elif summary["failed"]:
+                job.status = f"failed: {summary['failed']} of {summary['total']} groups"
+            else:
+                job.status = "finished"
+        self._save_status(job)
+        self._cleanup(job)
+        self.job_slots.release()
+
+    @staticmethod
+    def _cleanup(job: TrainingJob):
+        if job.work_dir is not None:
+            shutil.rmtree(job.work_dir, ignore_errors=True)
+        if job.csv_path is not None:
+            job.csv_path.unlink(missing_ok=True)
+
+
+def split_groups(df: pd.DataFrame) -> Dict[GroupKey, pd.DataFrame]:
+    """Разбивает загруженный CSV на независимые группы (asset, timeframe)"""
+    return {
+        (asset, timeframe): group.drop(columns=["asset", "timeframe"])
+        for (asset, timeframe), group in df.groupby(["asset", "timeframe"])
+    }
@@ -0,0 +1,291 @@
+import os
+from pathlib import Path
+from threading import Lock
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import torch
+import torch.nn as nn
+from torch.distributions import Categorical
+
+from ppo_agent.env import N_ACTIONS
+from ppo_agent.model import PPOModel
+from ppo_agent.timeframes import Timeframe
+
+DEFAULT_TIMEFRAMES = [tf.value for tf in Timeframe]
+
+# Ряд для обучения общей политики: (figi, timeframe, наблюдения (time, признаки), награды (time,))
+Series = Tuple[str, str, np.ndarray, np.ndarray]
+
+
+class SharedPPOModel(PPOModel):
+    """
+    PPOModel, общая для всех инструментов: ко входу общей части добавляются
+    обучаемые эмбеддинги актива и таймфрейма. Голова политики выдаёт логиты
+    N_ACTIONS действий торговой среды.
+    """
+
+    def __init__(self, input_dim: int, n_assets: int, n_timeframes: int,
+                 asset_dim: int = 16, timeframe_dim: int = 4, hidden_dim: int = 128):
+        super().__init__(input_dim + asset_dim + timeframe_dim, hidden_dim, output_dim=N_ACTIONS)
+        self.feature_dim = input_dim
+        self.asset_embedding = nn.Embedding(n_assets, asset_dim)
+        self.timeframe_embedding = nn.Embedding(n_timeframes, timeframe_dim)
+
+    def embed(self, x: torch.Tensor, asset_ids: torch.Tensor, timeframe_ids: torch.Tensor) -> torch.Tensor:
+        return torch.cat([x, self.asset_embedding(asset_ids), self.timeframe_embedding(timeframe_ids)], dim=-1)
+
+    def forward(self, x: torch.Tensor, asset_ids: torch.Tensor,
+                timeframe_ids: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor, torch.Tensor]:
+        return super().forward(self.embed(x, asset_ids, timeframe_ids))
+
+    def logits_and_value(self, x: torch.Tensor, asset_ids: torch.Tensor,
+                         timeframe_ids: torch.Tensor) -> Tuple[torch.Tensor, torch.Tensor]:
+        base = self.shared(self.embed(x, asset_ids, timeframe_ids))
+        return self.policy_head(base), self.value_head(base).squeeze(-1)
+
+
+class SharedPolicy:
+    """
+    Одна сеть на все ряды {figi}_{timeframe}: словарь активов растёт по мере
+    обучения, инференс идёт одним батчем по любым активам и таймфреймам.
+    Обучение — PPO (clip) на роллаутах торговой среды, в которых слоты
+    эпизодов берут ряды пропорционально их длине. Состояние оптимизатора
+    и счётчик шагов сохраняются между вызовами learn().
+    """
+
+    def __init__(self, columns: Sequence[str], timeframes: Sequence[str] = DEFAULT_TIMEFRAMES,
+                 asset_capacity: int = 256, asset_dim: int = 16, timeframe_dim: int = 4,
+                 hidden_dim: int = 128, learning_rate: float = 3e-4, seed: Optional[int] = None):
+        self.columns = list(columns)
+        self.timeframes = list(timeframes)
+        self.hparams = {"asset_dim": asset_dim, "timeframe_dim": timeframe_dim, "hidden_dim": hidden_dim,
+                        "learning_rate": learning_rate}
+        if seed is not None:
+            torch.manual_seed(seed)
+        self.model = SharedPPOModel(len(self.columns), asset_capacity, len(self.timeframes),
+                                    asset_dim=asset_dim, timeframe_dim=timeframe_dim, hidden_dim=hidden_dim)
+        self.optimizer = torch.optim.Adam(self.model.parameters(), lr=learning_rate, eps=1e-5)
+        self.rng = np.random.default_rng(seed)
+        self.assets: Dict[str, int] = {}
+        self.series: set = set()
+        self.num_timesteps = 0
+        self.lock = Lock()
+
+    # --- Словари активов и таймфреймов ---
+
+    def asset_id(self, figi: str, create: bool = False) -> int:
+        index = self.assets.get(figi)
+        if index is None:
+            if not create:
+                raise KeyError(f"Актив {figi} не обучался в общей политике")
+            index = self.assets[figi] = len(self.assets)
+            if index >= self.model.asset_embedding.num_embeddings:
+                self._grow_assets(2 * self.model.asset_embedding.num_embeddings)
+        return index
+
+    def timeframe_id(self, timeframe: str) -> int:
+        try:
+            return self.timeframes.index(timeframe)
+        except ValueError:
+            raise KeyError(f"Таймфрейм {timeframe} не поддерживается общей политикой") from None
+
+    def _grow_assets(self, capacity: int):
+        """Расширяет таблицу эмбеддингов активов, сохраняя веса и моменты Adam"""
+        old = self.model.asset_embedding
+        new = nn.Embedding(capacity, old.embedding_dim)
+        with torch.no_grad():
+            new.weight[:old.num_embeddings] = old.weight
+        state = self.optimizer.state.pop(old.weight, None)
+        self.model.asset_embedding = new
+        for group in self.optimizer.param_groups:
+            group["params"] = [new.weight if p is old.weight else p for p in group["params"]]
+        if state:
+            for name in ("exp_avg", "exp_avg_sq"):
+                padded = torch.zeros_like(new.weight)
+                padded[:old.num_embeddings] = state[name]
+                state[name] = padded
+            self.optimizer.state[new.weight] = state
+
+    def has_series(self, key: str) -> bool:
+        return key in self.series
+
+    # --- Инференс ---
+
+    def _tensors(self, figis: Sequence[str], timeframes: Sequence[str], observations: np.ndarray):
+        x = torch.as_tensor(np.asarray(observations, dtype=np.float32).reshape(len(figis), -1))
+        assets = torch.as_tensor([self.asset_id(f) for f in figis], dtype=torch.long)
+        tfs = torch.as_tensor([self.timeframe_id(tf) for tf in timeframes], dtype=torch.long)
+        return x, assets, tfs
+
+    def predict(self, figis: Sequence[str], timeframes: Sequence[str],
+                observations: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Один прямой проход по батчу рядов разных активов.
+        Сигнал — детерминированное действие, приведённое к [-1, 1], уверенность — его вероятность.
+        """
+        x, assets, tfs = self._tensors(figis, timeframes, observations)
+        with torch.inference_mode():
+            logits, _ = self.model.logits_and_value(x, assets, tfs)
+            probs = torch.softmax(logits, dim=-1)
+            confidences, actions = probs.max(dim=-1)
+        signals = 2.0 * actions.numpy().astype(np.float64) / max(N_ACTIONS - 1, 1) - 1.0
+        return signals, confidences.numpy().astype(np.float64)
+
+    # --- Обучение ---
+
+    def learn(self, series: List[Series], total_timesteps: int, n_envs: int = 8, episode_length: int = 256,
+              n_steps: int = 128, n_epochs: int = 4, batch_size: int = 256, gamma: float = 0.99,
+              gae_lambda: float = 0.95, clip_range: float = 0.2, ent_coef: float = 0.0,
+              vf_coef: float = 0.5, max_grad_norm: float = 0.5) -> int:
+        """
+        Совместное обучение на нескольких рядах. Возвращает число собранных шагов среды.
+        """
+        series = [s for s in series if len(s[2]) >= 2]
+        if not series:
+            raise ValueError("Нет рядов для обучения общей политики")
+        for figi, timeframe, observations, rewards in series:
+            if observations.shape[1] != len(self.columns):
+                raise ValueError(f"{figi} {timeframe}: ожидается {len(self.columns)} признаков, "
+                                 f"получено {observations.shape[1]}")
+            if len(observations) != len(rewards):
+                raise ValueError(f"{figi} {timeframe}: длины признаков и наград не совпадают")
+
+        with self.lock:
+            obs_all = torch.as_tensor(np.concatenate([s[2] for s in series]).astype(np.float32))
+            rew_all = np.concatenate([np.asarray(s[3], dtype=np.float32).reshape(-1) for s in series])
+            lengths = np.array([len(s[2]) for s in series])
+            offsets = np.concatenate([[0], np.cumsum(lengths)[:-1]])
+            limits = np.minimum(episode_length, lengths - 1)
+            weights = lengths / lengths.sum()
+            row_assets = torch.as_tensor(np.repeat([self.asset_id(s[0], create=True) for s in series], lengths))
+            row_tfs = torch.as_tensor(np.repeat([self.timeframe_id(s[1]) for s in series], lengths))
+
+            positions = np.zeros(n_envs, dtype=np.int64)
+            steps = np.zeros(n_envs, dtype=np.int64)
+            limit = np.zeros(n_envs, dtype=np.int64)
+
+            def reset(idx: np.ndarray):
+                chosen = self.rng.choice(len(series), size=len(idx), p=weights)
+                positions[idx] = offsets[chosen] + self.rng.integers(0, lengths[chosen] - limits[chosen])
+                steps[idx] = 0
+                limit[idx] = limits[chosen]
+
+            def evaluate(rows: np.ndarray):
+                rows = torch.as_tensor(rows)
+                return self.model.logits_and_value(obs_all[rows], row_assets[rows], row_tfs[rows])
+
+            reset(np.arange(n_envs))
+            collected = 0
+            while collected < total_timesteps:
+                rows_buf = np.zeros((n_steps, n_envs), dtype=np.int64)
+                actions_buf = torch.zeros((n_steps, n_envs), dtype=torch.long)
+                logp_buf = torch.zeros((n_steps, n_envs))
+                values_buf = torch.zeros((n_steps, n_envs))
+                rewards_buf = np.zeros((n_steps, n_envs), dtype=np.float32)
+                dones_buf = np.zeros((n_steps, n_envs), dtype=np.float32)
+
+                self.model.eval()
+                for t in range(n_steps):
+                    with torch.no_grad():
+                        logits, values = evaluate(positions)
+                        distribution = Categorical(logits=logits)
+                        actions = distribution.sample()
+                    rows_buf[t] = positions
+                    actions_buf[t] = actions
+                    logp_buf[t] = distribution.log_prob(actions)
+                    values_buf[t] = values
+
+                    step_rewards = (actions.numpy() - 1) * rew_all[positions]
+                    positions += 1
+                    steps += 1
+                    dones = steps >= limit
+                    if dones.any():
+                        done_idx = np.flatnonzero(dones)
+                        # Конец эпизода — ограничение по времени: хвост оценивается критиком
+                        with torch.no_grad():
+                            _, tail = evaluate(positions[done_idx])
+                        step_rewards[done_idx] += gamma * tail.numpy()
+                        reset(done_idx)
+                    rewards_buf[t] = step_rewards
+                    dones_buf[t] = dones
+
+                with torch.no_grad():
+                    _, next_values = evaluate(positions)
+                advantages = torch.zeros((n_steps, n_envs))
+                last = torch.zeros(n_envs)
+                rewards_t, dones_t = torch.as_tensor(rewards_buf), torch.as_tensor(dones_buf)
+                for t in reversed(range(n_steps)):
+                    following = next_values if t == n_steps - 1 else values_buf[t + 1]
+                    not_done = 1.0 - dones_t[t]
+                    delta = rewards_t[t] + gamma * following * not_done - values_buf[t]
+                    last = delta + gamma * gae_lambda * not_done * last
+                    advantages[t] = last
+                returns = advantages + values_buf
+
+                self._update(rows_buf.reshape(-1), actions_buf.reshape(-1), logp_buf.reshape(-1),
+                             advantages.reshape(-1), returns.reshape(-1), evaluate,
+                             n_epochs, batch_size, clip_range, ent_coef, vf_coef, max_grad_norm)
+                collected += n_steps * n_envs
+
+            self.num_timesteps += collected
+            self.series.update(f"{s[0]}_{s[1]}" for s in series)
+            return collected
+
+    def _update(self, rows, actions, old_logp, advantages, returns, evaluate,
+                n_epochs, batch_size, clip_range, ent_coef, vf_coef, max_grad_norm):
+        self.model.train()
+        n = len(rows)
+        for _ in range(n_epochs):
+            for batch in np.array_split(self.rng.permutation(n), max(1, n // batch_size)):
+                logits, values = evaluate(rows[batch])
+                distribution = Categorical(logits=logits)
+                logp = distribution.log_prob(actions[batch])
+                adv = advantages[batch]
+                adv = (adv - adv.mean()) / (adv.std() + 1e-8) if len(batch) > 1 else adv
+
+                ratio = torch.exp(logp - old_logp[batch])
+                policy_loss = -torch.min(adv * ratio, adv * torch.clamp(ratio, 1 - clip_range, 1 + clip_range)).mean()
+                value_loss = ((returns[batch] - values) ** 2).mean()
+                loss = policy_loss + vf_coef * value_loss - ent_coef * distribution.entropy().mean()
+
+                self.optimizer.zero_grad()
+                loss.backward()
+                nn.utils.clip_grad_norm_(self.model.parameters(), max_grad_norm)
+                self.optimizer.step()
+        self.model.eval()
+
+    # --- Сохранение ---
+
+    def state_dict(self) -> dict:
+        return {
+            "columns": self.columns,
+            "timeframes": self.timeframes,
+            "hparams": self.hparams,
+            "assets": self.assets,
+            "series": sorted(self.series),
+            "num_timesteps": self.num_timesteps,
+            "asset_capacity": self.model.asset_embedding.num_embeddings,
+            "model": self.model.state_dict(),
+            "optimizer": self.optimizer.state_dict(),
+        }
+
+    def save(self, path: Path) -> None:
+        """Атомарная запись: файл могут читать другие процессы"""
+        path = Path(path)
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        with self.lock:
+            torch.save(self.state_dict(), tmp_path)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "SharedPolicy":
+        data = torch.load(path, map_location="cpu", weights_only=False)
+        policy = cls(data["columns"], data["timeframes"], asset_capacity=data["asset_capacity"], **data["hparams"])
+        policy.model.load_state_dict(data["model"])
+        policy.optimizer.load_state_dict(data["optimizer"])
+        policy.assets = dict(data["assets"])
+        policy.series = set(data["series"])
+        policy.num_timesteps = data["num_timesteps"]
+        policy.model.eval()
+        return policy
@@ -1,30 +1,190 @@
 from pathlib import Path
+from typing import Dict, List, Optional
 import json
-from filelock import FileLock
+import sqlite3
+import threading
+import time
 
+from ppo_agent.metrics import timed
 
-def save_training_status(job_id: str, status: str, filename: str, filepath: Path = Path("training_status.json")):
-    lock = FileLock(str(filepath) + ".lock")
-    with lock:
-        if filepath.exists():
-            with open(filepath, "r") as f:
-                data = json.load(f)
-        else:
-            data = {}
+DEFAULT_DB_PATH = Path("training_status.db")
 
-        data[job_id] = {
-            "status": status,
-            "filename": filename
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    state TEXT NOT NULL,
+    filename TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    groups_total INTEGER NOT NULL DEFAULT 0,
+    groups_finished INTEGER NOT NULL DEFAULT 0,
+    groups_failed INTEGER NOT NULL DEFAULT 0,
+    groups_cancelled INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs(state, updated_at);
+CREATE INDEX IF NOT EXISTS idx_jobs_updated ON jobs(updated_at);
+CREATE TABLE IF NOT EXISTS job_groups (
+    job_id TEXT NOT NULL,
+    asset TEXT NOT NULL,
+    timeframe TEXT NOT NULL,
+    status TEXT NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (job_id, asset, timeframe)
+);
+"""
+
+_JOB_COLUMNS = ["job_id", "status", "state", "filename", "created_at", "updated_at",
+                "groups_total", "groups_finished", "groups_failed", "groups_cancelled"]
+
+
+def _state(status: str) -> str:
+    # "failed: <причина>" -> "failed": по короткому состоянию строится индекс и фильтр
+    return status.split(":", 1)[0].strip()
+
+
+class JobStore:
+    """
+    Хранилище статусов обучения на SQLite в режиме WAL.
+    Запись статуса — один UPSERT по первичному ключу, выборки идут по индексам
+    job_id и состояния, список заданий отдаётся постранично.
+    """
+
+    def __init__(self, db_path: Path = DEFAULT_DB_PATH):
+        self.db_path = Path(db_path)
+        self._local = threading.local()
+        conn = self._conn()
+        conn.executescript(_SCHEMA)
+        self._migrate_legacy_json()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.db_path), timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _migrate_legacy_json(self):
+        """Однократный перенос старого training_status.json"""
+        legacy_path = self.db_path.with_suffix(".json")
+        if not legacy_path.exists():
+            return
+        conn = self._conn()
+        if conn.execute("SELECT 1 FROM jobs LIMIT 1").fetchone():
+            return
+        with open(legacy_path, "r") as f:
+            data = json.load(f)
+        now = time.time()
+        conn.execute("BEGIN")
+        for job_id, entry in data.items():
+            conn.execute(
+                "INSERT OR IGNORE INTO jobs (job_id, status, state, filename, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (job_id, entry["status"], _state(entry["status"]), entry.get("filename"), now, now),
+            )
+        conn.execute("COMMIT")
+
+    @timed("status_save")
+    def save(self, job_id: str, status: str, filename: Optional[str] = None, progress: Optional[dict] = None):
+        now = time.time()
+        progress = progress or {}
+        self._conn().execute(
+            """
+            INSERT INTO jobs (job_id, status, state, filename, created_at, updated_at,
+                              groups_total, groups_finished, groups_failed, groups_cancelled)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(job_id) DO UPDATE SET
+                status = excluded.status,
+                state = excluded.state,
+                filename = COALESCE(excluded.filename, jobs.filename),
+                updated_at = excluded.updated_at,
+                groups_total = MAX(excluded.groups_total, jobs.groups_total),
+                groups_finished = excluded.groups_finished,
+                groups_failed = excluded.groups_failed,
+                groups_cancelled = excluded.groups_cancelled
+            """,
+            (job_id, status, _state(status), filename, now, now,
+             progress.get("total", 0), progress.get("finished", 0),
+             progress.get("failed", 0), progress.get("cancelled", 0)),
+        )
+
+    @timed("status_save")
+    def save_group(self, job_id: str, asset: str, timeframe: str, status: str):
+        self._conn().execute(
+            "INSERT INTO job_groups (job_id, asset, timeframe, status, updated_at) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(job_id, asset, timeframe) DO UPDATE SET status = excluded.status, updated_at = excluded.updated_at",
+            (job_id, asset, timeframe, status, time.time()),
+        )
+
+    @staticmethod
+    def _row_to_dict(row: sqlite3.Row) -> dict:
+        data = {col: row[col] for col in _JOB_COLUMNS if col != "job_id"}
+        data["progress"] = {
+            "total": data.pop("groups_total"),
+            "finished": data.pop("groups_finished"),
+            "failed": data.pop("groups_failed"),
+            "cancelled": data.pop("groups_cancelled"),
         }
+        return data
+
+    @timed("status_query")
+    def get(self, job_id: str, with_groups: bool = True) -> Optional[dict]:
+        conn = self._conn()
+        row = conn.execute(f"SELECT {', '.join(_JOB_COLUMNS)} FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+        job = self._row_to_dict(row)
+        if with_groups:
+            job["groups"] = {
+                f"{g['asset']}/{g['timeframe']}": g["status"]
+                for g in conn.execute("SELECT asset, timeframe, status FROM job_groups WHERE job_id = ?", (job_id,))
+            }
+        return job
+
+    @timed("status_query")
+    def list(self, state: Optional[str] = None, limit: int = 100, offset: int = 0) -> Dict[str, dict]:
+        """Задания от новых к старым, с необязательным фильтром по состоянию"""
+        query = f"SELECT {', '.join(_JOB_COLUMNS)} FROM jobs"
+        params: List = []
+        if state:
+            query += " WHERE state = ?"
+            params.append(state)
+        query += " ORDER BY updated_at DESC LIMIT ? OFFSET ?"
+        params += [limit, offset]
+        return {row["job_id"]: self._row_to_dict(row) for row in self._conn().execute(query, params)}
+
+    @timed("status_query")
+    def count(self, state: Optional[str] = None) -> int:
+        if state:
+            return self._conn().execute("SELECT COUNT(*) FROM jobs WHERE state = ?", (state,)).fetchone()[0]
+        return self._conn().execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+
+
+_stores: Dict[Path, JobStore] = {}
+_stores_lock = threading.Lock()
+
+
+def get_job_store(filepath: Path = DEFAULT_DB_PATH) -> JobStore:
+    filepath = Path(filepath)
+    with _stores_lock:
+        store = _stores.get(filepath)
+        if store is None:
+            store = _stores[filepath] = JobStore(filepath)
+        return store
+
+
+def save_training_status(job_id: str, status: str, filename: str, filepath: Path = DEFAULT_DB_PATH,
+                         progress: Optional[dict] = None):
+    get_job_store(filepath).save(job_id, status, filename, progress)
+
 
-        with open(filepath, "w") as f:
-            json.dump(data, f, indent=4)
+def save_group_status(job_id: str, asset: str, timeframe: str, status: str, filepath: Path = DEFAULT_DB_PATH):
+    get_job_store(filepath).save_group(job_id, asset, timeframe, status)
 
 
-def load_training_status(filepath: Path = Path("training_status.json")) -> dict:
-    lock = FileLock(str(filepath) + ".lock")
-    with lock:
-        if filepath.exists():
-            with open(filepath, "r") as f:
-                return json.load(f)
-        return {}
+def load_training_status(filepath: Path = DEFAULT_DB_PATH, state: Optional[str] = None,
+                         limit: int = 100, offset: int = 0) -> dict:
+    return get_job_store(filepath).list(state, limit, offset)
@@ -1,13 +1,14 @@
 import time
 from datetime import datetime
 from pathlib import Path
+from typing import Any, Dict, List
 
 from ppo_agent.agent import PPOAgent
-from ppo_agent.indicators import compute_all_indicators
-from ppo_agent.features import extract_features
+from ppo_agent.indicators import compute_panel_indicators, stack_panel, unstack_panel
 from ppo_agent.enums import SUPPORTED_TIMEFRAMES, INTERVAL_TO_TIMESPAN
 from ppo_agent.utils import TrainingJournal
 from ppo_agent.asset_registry import get_broker_and_figi
+from ppo_agent.candle_store import CandleStore
 from brokers.broker import get_broker
 
 
@@ -15,8 +16,41 @@ class PPOTrainingLoop:
     def __init__(self, agent: PPOAgent):
         self.agent = agent
         self.journal_root = Path("ppo_agent/training_journal")
+        self.candle_store = CandleStore()
 
     def run(self):
+        # Сначала собираем свечи по всем активам и таймфреймам, затем считаем
+        # индикаторы для всех рядов одним векторным проходом по панели
+        batch = self._collect_candles()
+        if not batch:
+            return
+
+        # Считаются только индикаторы, которые хоть одна модель пакета использует как признаки
+        columns = set().union(*(self.agent.model_columns(item["figi"], item["timeframe"]) for item in batch))
+        panel = stack_panel([item["candles"] for item in batch])
+        indicator_frames = unstack_panel(panel, compute_panel_indicators(panel, columns=columns))
+
+        for item, features_df in zip(batch, indicator_frames):
+            asset_name, figi, timeframe = item["asset_name"], item["figi"], item["timeframe"]
+            try:
+                if features_df.empty:
+                    print(f"⚠️ Не удалось рассчитать признаки для {asset_name} ({figi}) — {timeframe}")
+                    continue
+
+                # Обучение; нормализация признаков — по сохранённым статистикам ряда
+                self.agent.train(figi, timeframe, features_df)
+
+                # Запись в журнал
+                item["journal"].record_training(figi, timeframe, item["from_time"], item["to_time"])
+
+                print(f"✅ Дообучен PPO на {asset_name} ({figi}) — {timeframe}")
+                time.sleep(0.5)
+
+            except Exception as e:
+                print(f"❌ Ошибка в обучении {asset_name} ({figi}) — {timeframe}: {e}")
+
+    def _collect_candles(self) -> List[Dict[str, Any]]:
+        batch = []
         for asset_name in self.agent.assets:
             broker_name, figi = get_broker_and_figi(asset_name)
             if not broker_name or not figi:
@@ -46,35 +80,22 @@ class PPOTrainingLoop:
                         print(f"⏭️ Уже обучено на {asset_name} ({figi}) — {timeframe}")
                         continue
 
-                    candles_df = broker.get_market_data_history(
-                        figi=figi,
-                        from_=from_time,
-                        to_=to_time,
-                        interval=interval
-                    )
+                    candles_df = self.candle_store.sync(broker, figi, timeframe, from_time, to_time)
 
                     if candles_df.empty or len(candles_df) < 52:
                         print(f"⚠️ Недостаточно данных для {asset_name} ({figi}) — {timeframe}")
                         continue
 
-                    features_df = compute_all_indicators(candles_df)
-                    if features_df.empty:
-                        print(f"⚠️ Не удалось рассчитать признаки для {asset_name} ({figi}) — {timeframe}")
-                        continue
-
-                    features_df = extract_features(features_df)
-                    features_df["figi"] = figi
-                    features_df["timeframe"] = timeframe
-                    features_df["timestamp"] = datetime.utcnow()
-
-                    # Обучение
-                    self.agent.train_on_dataframe(features_df)
-
-                    # Запись в журнал
-                    journal.record_training(figi, timeframe, from_time, to_time)
-
-                    print(f"✅ Дообучен PPO на {asset_name} ({figi}) — {timeframe}")
-                    time.sleep(0.5)
+                    batch.append({
+                        "asset_name": asset_name,
+                        "figi": figi,
+                        "timeframe": timeframe,
+                        "journal": journal,
+                        "from_time": from_time,
+                        "to_time": to_time,
+                        "candles": candles_df,
+                    })
 
                 except Exception as e:
-                    print(f"❌ Ошибка в обучении {asset_name} ({figi}) — {timeframe}: {e}")
\ No newline at end of file
+                    print(f"❌ Ошибка загрузки {asset_name} ({figi}) — {timeframe}: {e}")
+        return batch
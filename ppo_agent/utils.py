@@ -1,60 +1,181 @@
 from pathlib import Path
-from datetime import datetime
-from typing import Any, Dict
+from datetime import datetime, timezone
+from bisect import bisect_left, bisect_right
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
 import json
+import os
 from filelock import FileLock
 
+from ppo_agent.metrics import timed
+
+
+def _to_naive_utc(value: datetime) -> datetime:
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+class IntervalIndex:
+    """
+    Отсортированный набор непересекающихся интервалов [from, to].
+    Пересекающиеся и смежные интервалы сливаются при добавлении,
+    проверка покрытия — бинарный поиск за O(log n).
+    """
+
+    def __init__(self):
+        self.starts: List[datetime] = []
+        self.ends: List[datetime] = []
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def add(self, start: datetime, end: datetime):
+        if end < start:
+            start, end = end, start
+        lo = bisect_left(self.ends, start)
+        hi = bisect_right(self.starts, end)
+        if lo < hi:
+            start = min(start, self.starts[lo])
+            end = max(end, self.ends[hi - 1])
+        self.starts[lo:hi] = [start]
+        self.ends[lo:hi] = [end]
+
+    def covers(self, start: datetime, end: datetime) -> bool:
+        i = bisect_right(self.starts, start) - 1
+        return i >= 0 and self.ends[i] >= end
+
+    def intervals(self) -> List[Tuple[datetime, datetime]]:
+        return list(zip(self.starts, self.ends))
+
+
+class _JournalState:
+    def __init__(self, path: Path):
+        self.path = path
+        self.index = IntervalIndex()
+        self.lock = Lock()
+        self.offset = 0
+        self.inode: Optional[int] = None
+        self.records = 0
+
 
 class TrainingJournal:
-    def __init__(self, root_dir: str = "training_journal"):
+    """
+    Журнал интервалов обучения по (figi, timeframe).
+    Интервалы хранятся в памяти в IntervalIndex, на диске — append-only лог
+    {figi}_{timeframe}.jsonl, который периодически компактируется до слитых интервалов.
+    Записи других процессов подхватываются дочитыванием хвоста лога.
+    """
+
+    def __init__(self, root_dir: str = "training_journal", compact_min_records: int = 64, compact_factor: int = 2):
         self.root = Path(root_dir)
         self.root.mkdir(parents=True, exist_ok=True)
+        self.compact_min_records = compact_min_records
+        self.compact_factor = compact_factor
+        self._states: Dict[Tuple[str, str], _JournalState] = {}
+        self._states_lock = Lock()
 
     def _get_path(self, figi: str, timeframe: str) -> Path:
         dir_path = self.root / figi
         dir_path.mkdir(parents=True, exist_ok=True)
-        return dir_path / f"{figi}_{timeframe}.json"
+        return dir_path / f"{figi}_{timeframe}.jsonl"
 
     def _get_lock(self, path: Path) -> FileLock:
         return FileLock(str(path) + ".lock")
 
-    def _load(self, path: Path) -> list:
-        if path.exists():
-            with self._get_lock(path), open(path, "r", encoding="utf-8") as f:
-                return json.load(f)
-        return []
+    def _get_state(self, figi: str, timeframe: str) -> _JournalState:
+        key = (figi, timeframe)
+        with self._states_lock:
+            state = self._states.get(key)
+            if state is None:
+                state = self._states[key] = _JournalState(self._get_path(figi, timeframe))
+                self._migrate_legacy(state.path)
+        return state
+
+    def _migrate_legacy(self, path: Path):
+        """Переносит старый журнал-список {figi}_{timeframe}.json в формат лога"""
+        legacy_path = path.with_suffix(".json")
+        if path.exists() or not legacy_path.exists():
+            return
+        with self._get_lock(legacy_path), open(legacy_path, "r", encoding="utf-8") as f:
+            entries = json.load(f)
+        index = IntervalIndex()
+        for entry in entries:
+            index.add(datetime.fromisoformat(entry["from"]), datetime.fromisoformat(entry["to"]))
+        self._write_compacted(path, index)
+
+    def _write_compacted(self, path: Path, index: IntervalIndex):
+        tmp_path = path.with_suffix(".jsonl.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for start, end in index.intervals():
+                f.write(json.dumps({"from": start.isoformat(), "to": end.isoformat()}) + "\n")
+        os.replace(tmp_path, path)
 
-    def _save(self, path: Path, data: list):
-        with self._get_lock(path), open(path, "w", encoding="utf-8") as f:
-            json.dump(data, f, indent=2, ensure_ascii=False)
+    def _refresh(self, state: _JournalState):
+        """Дочитывает новые записи лога; после компактификации другим процессом перечитывает лог целиком"""
+        try:
+            stat = state.path.stat()
+        except FileNotFoundError:
+            return
+        if stat.st_ino != state.inode or stat.st_size < state.offset:
+            state.index = IntervalIndex()
+            state.offset = 0
+            state.records = 0
+            state.inode = stat.st_ino
+        if stat.st_size == state.offset:
+            return
 
+        with open(state.path, "rb") as f:
+            f.seek(state.offset)
+            chunk = f.read()
+        # Незавершённую последнюю строку оставляем до следующего чтения
+        complete = chunk[:chunk.rfind(b"\n") + 1]
+        for line in complete.splitlines():
+            if line.strip():
+                entry = json.loads(line)
+                state.index.add(datetime.fromisoformat(entry["from"]), datetime.fromisoformat(entry["to"]))
+                state.records += 1
+        state.offset += len(complete)
+
+    @timed("journal_was_trained")
     def was_trained(self, figi: str, timeframe: str, from_: datetime, to_: datetime) -> bool:
-        path = self._get_path(figi, timeframe)
-        entries = self._load(path)
-        for entry in entries:
-            trained_from = datetime.fromisoformat(entry["from"])
-            trained_to = datetime.fromisoformat(entry["to"])
-            if trained_from <= from_ and trained_to >= to_:
-                return True
-        return False
+        state = self._get_state(figi, timeframe)
+        with state.lock:
+            self._refresh(state)
+            return state.index.covers(_to_naive_utc(from_), _to_naive_utc(to_))
 
+    @timed("journal_record_training")
     def record_training(self, figi: str, timeframe: str, from_: datetime, to_: datetime):
-        path = self._get_path(figi, timeframe)
-        entries = self._load(path)
-        entries.append({
-            "from": from_.isoformat(),
-            "to": to_.isoformat()
-        })
-        self._save(path, entries)
+        state = self._get_state(figi, timeframe)
+        line = json.dumps({"from": _to_naive_utc(from_).isoformat(), "to": _to_naive_utc(to_).isoformat()}) + "\n"
+        with state.lock, self._get_lock(state.path):
+            with open(state.path, "a", encoding="utf-8") as f:
+                f.write(line)
+            self._refresh(state)
+
+            if state.records > self.compact_min_records + self.compact_factor * len(state.index):
+                self._write_compacted(state.path, state.index)
+                stat = state.path.stat()
+                state.inode, state.offset, state.records = stat.st_ino, stat.st_size, len(state.index)
+
+    def last_trained(self, figi: str, timeframe: str) -> Optional[datetime]:
+        """Конец последнего обученного интервала — отметка, до которой ряд уже выучен"""
+        state = self._get_state(figi, timeframe)
+        with state.lock:
+            self._refresh(state)
+            return state.index.ends[-1] if len(state.index) else None
+
+    def get_intervals(self, figi: str, timeframe: str) -> List[Dict[str, Any]]:
+        state = self._get_state(figi, timeframe)
+        with state.lock:
+            self._refresh(state)
+            return [{"from": start.isoformat(), "to": end.isoformat()} for start, end in state.index.intervals()]
 
     def get_all_intervals(self, figi: str) -> Dict[str, list]:
         figi_dir = self.root / figi
         if not figi_dir.exists():
             return {}
 
-        result = {}
-        for file in figi_dir.glob(f"{figi}_*.json"):
-            timeframe = file.stem.replace(f"{figi}_", "")
-            entries = self._load(file)
-            result[timeframe] = entries
-        return result
+        timeframes = {file.stem.replace(f"{figi}_", "") for file in figi_dir.glob(f"{figi}_*.json")}
+        timeframes |= {file.stem.replace(f"{figi}_", "") for file in figi_dir.glob(f"{figi}_*.jsonl")}
+        return {timeframe: self.get_intervals(figi, timeframe) for timeframe in sorted(timeframes)}
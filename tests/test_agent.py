@@ -1,7 +1,36 @@
+import multiprocessing
+import tempfile
 import unittest
+from datetime import timedelta
+from pathlib import Path
+from unittest import mock
+
+import numpy as np
 import pandas as pd
 from ppo_agent.agent import PPOAgent
-from ppo_agent.features import compute_features
+from ppo_agent.env import compute_rewards
+from ppo_agent.features import compute_features, get_feature_names
+from ppo_agent.indicators import compute_all_indicators
+from ppo_agent.shared_policy import SharedPolicy
+
+
+def _candles(periods: int, seed: int = 0) -> pd.DataFrame:
+    close = 100 + np.cumsum(np.random.default_rng(seed).normal(size=periods))
+    return compute_all_indicators(pd.DataFrame({
+        "time": pd.date_range("2025-01-01", periods=periods, freq="min"),
+        "open": close, "high": close + 1, "low": close - 1, "close": close, "volume": 1000.0,
+    }))
+
+
+def _train_shared(model_dir: str, figi: str, barrier):
+    import torch
+    torch.set_num_threads(1)
+    agent = PPOAgent(model_dir=model_dir, journal_dir=f"{model_dir}/journal", n_envs=2, episode_length=32,
+                     shared_policy=True)
+    df = _candles(150)
+    barrier.wait()
+    agent.train(figi, "1m", df)
+
 
 class TestPPOAgent(unittest.TestCase):
     def setUp(self):
@@ -40,5 +69,130 @@ class TestPPOAgent(unittest.TestCase):
         except Exception as e:
             self.fail(f"Training failed with exception: {e}")
 
+    def test_predict_batch_errors_per_timeframe(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            agent = PPOAgent(model_dir=tmp, journal_dir=f"{tmp}/journal", n_envs=2, episode_length=32,
+                             shared_policy=False)
+            df = _candles(150)
+            agent.train("TEST", "1m", df)
+            # Неизвестный таймфрейм и битые свечи не должны ронять предсказание по остальным
+            result = agent.predict_batch("TEST", {"1m": df, "5m": df})
+            self.assertIsInstance(result["5m"], KeyError)
+            self.assertEqual(len(result["1m"]), 2)
+            result = agent.predict_many({("TEST", "1m"): df.iloc[:0], ("TEST", "1h"): df})
+            self.assertIsInstance(result[("TEST", "1m")], Exception)
+            self.assertIsInstance(result[("TEST", "1h")], KeyError)
+            with self.assertRaises(KeyError):
+                agent.predict("TEST", "5m", df)
+
+    def test_model_columns(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            agent = PPOAgent(model_dir=tmp, journal_dir=f"{tmp}/journal", n_envs=2, episode_length=32,
+                             shared_policy=False)
+            self.assertEqual(agent.model_columns("TEST", "1m"), get_feature_names())
+            agent.train("TEST", "1m", _candles(150))
+            # Обученная модель: ровно колонки её нормализатора, индикаторов вне признаков нет
+            columns = agent.model_columns("TEST", "1m")
+            self.assertEqual(columns, agent.get_normalizer("TEST_1m").columns)
+            self.assertIn("rsi", columns)
+            self.assertNotIn("ema14", columns)
+
+    def test_fine_tune_only_new_candles(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            agent = PPOAgent(model_dir=tmp, journal_dir=f"{tmp}/journal", n_envs=2, episode_length=32)
+            close = 100 + np.cumsum(np.random.default_rng(0).normal(size=300))
+            df = compute_all_indicators(pd.DataFrame({
+                "time": pd.date_range("2025-01-01", periods=300, freq="min"),
+                "open": close, "high": close + 1, "low": close - 1, "close": close, "volume": 1000.0,
+            }))
+            agent.train("TEST", "1m", df.iloc[:150])
+
+            # Последняя свеча окна ещё не закрыта, у последней закрытой нет награды
+            window = df.iloc[100:200].reset_index(drop=True)
+            now = window["time"].iloc[-1].to_pydatetime() + timedelta(seconds=30)
+            self.assertEqual(agent.fine_tune("TEST", "1m", window, now=now), 98)
+            self.assertEqual(agent.fine_tune("TEST", "1m", window, now=now), 0)
+
+            model = agent.models.get("TEST_1m")
+            steps, n_steps = model.num_timesteps, model.n_steps
+            window = df.iloc[103:203].reset_index(drop=True)
+            self.assertEqual(agent.fine_tune("TEST", "1m", window, now=now + timedelta(minutes=3)), 3)
+            model = agent.models.get("TEST_1m")
+            self.assertLess(model.num_timesteps - steps, 16)
+            self.assertEqual(model.n_steps, n_steps)
+            # Отметка — закрытие последней выученной свечи
+            self.assertEqual(agent.journal.last_trained("TEST", "1m"), window["time"].iloc[-2])
+
+    def test_fine_tune_window_past_mark(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            agent = PPOAgent(model_dir=tmp, journal_dir=f"{tmp}/journal", n_envs=2, episode_length=32)
+            df = _candles(300)
+            first = df.iloc[:100]
+            agent.fine_tune("TEST", "1m", first, now=first["time"].iloc[-1].to_pydatetime() + timedelta(minutes=1))
+            self.assertEqual(agent.journal.last_trained("TEST", "1m"), df["time"].iloc[99])
+
+            # Окно начинается через сотню свечей после отметки журнала
+            window = df.iloc[200:].reset_index(drop=True)
+            now = window["time"].iloc[-1].to_pydatetime() + timedelta(minutes=1)
+            self.assertEqual(agent.fine_tune("TEST", "1m", window, now=now), len(window) - 1)
+            times = df["time"]
+            self.assertFalse(agent.journal.was_trained("TEST", "1m", times.iloc[100], times.iloc[199]))
+            self.assertFalse(agent.journal.was_trained("TEST", "1m", times.iloc[150], times.iloc[150]))
+            self.assertTrue(agent.journal.was_trained("TEST", "1m", times.iloc[200], times.iloc[-2]))
+
+    def test_fine_tune_contiguous_single_interval(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            agent = PPOAgent(model_dir=tmp, journal_dir=f"{tmp}/journal", n_envs=2, episode_length=32)
+            df = _candles(200)
+            # Каждый проход добавляет одну свечу: журнал остаётся одним интервалом
+            for end in range(100, 110):
+                window = df.iloc[end - 60:end]
+                now = window["time"].iloc[-1].to_pydatetime() + timedelta(minutes=1)
+                self.assertGreater(agent.fine_tune("TEST", "1m", window, now=now), 0)
+            self.assertEqual(len(agent.journal.get_intervals("TEST", "1m")), 1)
+            self.assertTrue(agent.journal.was_trained("TEST", "1m", df["time"].iloc[40], df["time"].iloc[108]))
+
+    def test_shared_policy_two_processes(self):
+        # Два процесса одновременно обучают общую политику: шаги обоих должны сохраниться
+        ctx = multiprocessing.get_context("spawn")
+        with tempfile.TemporaryDirectory() as tmp:
+            barrier = ctx.Barrier(2)
+            processes = [ctx.Process(target=_train_shared, args=(tmp, figi, barrier)) for figi in ("A", "B")]
+            for process in processes:
+                process.start()
+            for process in processes:
+                process.join(120)
+                self.assertEqual(process.exitcode, 0)
+
+            policy = SharedPolicy.load(f"{tmp}/shared_policy.pt")
+            self.assertEqual(policy.series, {"A_1m", "B_1m"})
+
+    def test_train_from_dataframe_two_workers(self):
+        frames = []
+        for figi in ("A", "B"):
+            df = _candles(200).assign(figi=figi, timeframe="1m")
+            df["timestamp"] = df["time"]
+            df["reward"] = compute_rewards(df)
+            frames.append(df)
+        with tempfile.TemporaryDirectory() as tmp:
+            agent = PPOAgent(model_dir=tmp, journal_dir=f"{tmp}/journal", n_envs=2, episode_length=32,
+                             shared_policy=False)
+            agent.train_from_dataframe(pd.concat([df.iloc[:100] for df in frames]), workers=1)
+            steps = agent.models.get("A_1m").num_timesteps
+
+            with mock.patch.object(agent.journal, "record_training",
+                                   wraps=agent.journal.record_training) as record:
+                agent.train_from_dataframe(pd.concat([df.iloc[100:] for df in frames]), workers=2)
+            self.assertEqual(record.call_count, 2)
+            for figi in ("A", "B"):
+                # По строке на каждый прогон: воркеры журнал не пишут
+                lines = (Path(tmp) / "journal" / figi / f"{figi}_1m.jsonl").read_text().splitlines()
+                self.assertEqual(len(lines), 2)
+                self.assertTrue(agent.journal.was_trained(figi, "1m", frames[0]["time"].iloc[100],
+                                                          frames[0]["time"].iloc[-1]))
+            # Модель из кэша выгружена и перечитана с диска после обучения в воркере
+            self.assertGreater(agent.models.get("A_1m").num_timesteps, steps)
+
+
 if __name__ == '__main__':
     unittest.main()
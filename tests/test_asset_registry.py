@@ -0,0 +1,155 @@
+import json
+import os
+import tempfile
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from ppo_agent.asset_registry import AssetRegistry, AssetRegistryError, FIGIValidationError
+
+
+class TestAssetRegistry(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.path = Path(self.tmp.name) / "asset_registry.json"
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _registry(self, **kwargs):
+        registry = AssetRegistry(self.path, flush_interval=0, **kwargs)
+        self.addCleanup(registry.close)
+        return registry
+
+    def test_indexes_and_reload_from_journal(self):
+        registry = self._registry()
+        registry.register_many([
+            ("BBG000B9XRY4", "tinkoff", {"ticker": "AAPL"}),
+            {"figi": "BBG000BPH459", "broker": "tinkoff"},
+            ("BBG000BVPV84", "okx"),
+        ])
+        registry.set_status("BBG000BVPV84", "inactive")
+        registry.register_figi("BBG000BPH459", "okx")
+
+        self.assertEqual(registry.get_by_broker("tinkoff"), ["BBG000B9XRY4"])
+        self.assertEqual(registry.get_by_status("inactive"), ["BBG000BVPV84"])
+        self.assertEqual(registry.find_figi("AAPL"), "BBG000B9XRY4")
+        registry.flush()
+
+        reloaded = self._registry()
+        self.assertEqual(reloaded.get_by_broker("okx"), ["BBG000BPH459", "BBG000BVPV84"])
+        self.assertEqual(len(reloaded.get("BBG000BPH459")["update_history"]), 1)
+
+    def test_bulk_validation_is_atomic(self):
+        registry = self._registry()
+        with self.assertRaises(FIGIValidationError):
+            registry.register_many([("BBG000B9XRY4", "tinkoff"), ("bad", "tinkoff")])
+        self.assertIsNone(registry.get("BBG000B9XRY4"))
+
+    def test_snapshot_retention(self):
+        registry = self._registry(snapshot_every=2, keep_snapshots=2)
+        figis = ["BBG000B9XRY4", "BBG000BPH459", "BBG000BVPV84", "BBG000BCSST7"]
+        for figi in figis * 3:
+            registry.register_figi(figi, "tinkoff")
+            registry.flush()
+
+        backups = list(self.path.parent.glob("asset_registry.json.bak2*"))
+        self.assertEqual(len(backups), 2)
+        self.assertEqual(len(self._registry().get_by_broker("tinkoff")), 4)
+
+    def test_journal_logs_deltas(self):
+        registry = self._registry()
+        registry.register_figi("BBG000B9XRY4", "tinkoff", {"ticker": "AAPL"})
+        registry.set_status("BBG000B9XRY4", "inactive")
+        registry.register_figi("BBG000B9XRY4", "okx", {"lot": 1})
+        registry.flush()
+
+        with open(registry.journal_path) as f:
+            ops = [json.loads(line) for line in f]
+        self.assertEqual([op["op"] for op in ops], ["upsert", "update", "update"])
+        self.assertTrue(all("update_history" not in op.get("set", {}) for op in ops))
+        self.assertEqual(ops[0]["asset"]["update_history"], [])
+
+        reloaded = self._registry().get("BBG000B9XRY4")
+        self.assertEqual(reloaded, registry.get("BBG000B9XRY4"))
+        self.assertEqual(len(reloaded["update_history"]), 2)
+        self.assertEqual(reloaded["additional_info"], {"ticker": "AAPL", "lot": 1})
+        self.assertEqual(reloaded["status"], "inactive")
+
+    def test_crash_during_snapshot_keeps_primary(self):
+        registry = self._registry()
+        registry.register_figi("BBG000B9XRY4", "tinkoff")
+        registry.flush()
+        registry._save_registry(registry.registry)
+
+        registry.register_figi("BBG000BPH459", "tinkoff")
+        real_replace = os.replace
+
+        def crash(src, dst):
+            if Path(dst) == self.path:
+                raise OSError("crash before replace")
+            real_replace(src, dst)
+
+        with mock.patch("ppo_agent.asset_registry.os.replace", crash):
+            with self.assertRaises(AssetRegistryError):
+                registry._save_registry(registry.registry)
+        self.assertTrue(self.path.exists())
+        registry.flush()
+
+        reloaded = self._registry()
+        self.assertEqual(reloaded.get_by_broker("tinkoff"), ["BBG000B9XRY4", "BBG000BPH459"])
+
+    def test_journal_replay_after_snapshot_is_idempotent(self):
+        registry = self._registry()
+        registry.register_figi("BBG000B9XRY4", "tinkoff")
+        registry.flush()
+        registry._save_registry(registry.registry)
+        registry.register_figi("BBG000B9XRY4", "okx")
+        registry.set_status("BBG000B9XRY4", "inactive")
+        registry.flush()
+        journal = registry.journal_path.read_text()
+
+        # Сбой между os.replace снимка и удалением журнала: журнал повторяется поверх снимка
+        registry._save_registry(registry.registry)
+        registry.journal_path.write_text(journal)
+        reloaded = self._registry()
+        self.assertEqual(reloaded.get("BBG000B9XRY4"), registry.get("BBG000B9XRY4"))
+        self.assertEqual(len(reloaded.get("BBG000B9XRY4")["update_history"]), 2)
+
+        # Новые операции после перезапуска продолжают нумерацию и не пропускаются
+        reloaded.register_figi("BBG000B9XRY4", "tinkoff")
+        reloaded.flush()
+        self.assertEqual(len(self._registry().get("BBG000B9XRY4")["update_history"]), 3)
+
+    def test_failed_flush_keeps_pending(self):
+        registry = self._registry()
+        registry.register_figi("BBG000B9XRY4", "tinkoff")
+        registry.flush()
+        registry.register_figi("BBG000BPH459", "tinkoff")
+        registry.set_status("BBG000BPH459", "inactive")
+
+        real_open = open
+
+        def failing_open(path, mode="r", *args, **kwargs):
+            f = real_open(path, mode, *args, **kwargs)
+            if mode == "a":
+                # Запись обрывается на середине строки
+                f.write('{"op": "upd')
+                f.close()
+                raise OSError("disk full")
+            return f
+
+        with mock.patch("builtins.open", failing_open):
+            with self.assertRaises(AssetRegistryError):
+                registry.flush()
+        registry.flush()
+
+        reloaded = self._registry()
+        self.assertEqual(reloaded.get("BBG000BPH459"), registry.get("BBG000BPH459"))
+        self.assertEqual(len(reloaded.get("BBG000BPH459")["update_history"]), 1)
+        with open(registry.journal_path) as f:
+            self.assertEqual(len(f.readlines()), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
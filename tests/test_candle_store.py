@@ -0,0 +1,70 @@
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+from ppo_agent.candle_store import CandleStore
+
+
+class FakeBroker:
+    """Брокер, отдающий минутные свечи за любой интервал и считающий запросы"""
+
+    def __init__(self):
+        self.calls = []
+
+    def get_market_data_history(self, figi, from_, to_, interval):
+        self.calls.append((from_, to_))
+        times = pd.date_range(pd.Timestamp(from_).ceil("min"), pd.Timestamp(to_), freq="min", inclusive="left")
+        price = np.arange(len(times), dtype=float) + 100
+        return pd.DataFrame({
+            "time": times,
+            "open": price,
+            "high": price + 1,
+            "low": price - 1,
+            "close": price,
+            "volume": np.full(len(times), 10.0),
+        }).set_index("time")
+
+
+class TestCandleStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = CandleStore(self.tmp.name)
+        self.broker = FakeBroker()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_sync_fetches_only_missing_tail(self):
+        to_time = datetime(2025, 1, 1, 12, 0, 30)
+        from_time = to_time - timedelta(minutes=100)
+        first = self.store.sync(self.broker, "TEST", "1m", from_time, to_time)
+        self.assertEqual(len(first), 100)
+
+        self.broker.calls.clear()
+        later = to_time + timedelta(minutes=2)
+        second = self.store.sync(self.broker, "TEST", "1m", later - timedelta(minutes=100), later)
+        self.assertEqual(len(second), 100)
+        # Закрытый хвост в 2 свечи + текущая незакрытая свеча
+        fetched_from, fetched_to = self.broker.calls[0]
+        self.assertEqual(fetched_to - fetched_from, timedelta(minutes=2))
+        self.assertTrue(second.index.is_monotonic_increasing)
+
+    def test_sync_fills_gap(self):
+        to_time = datetime(2025, 1, 1, 12, 0)
+        self.store.sync(self.broker, "TEST", "1m", to_time - timedelta(minutes=10), to_time)
+        self.store.sync(self.broker, "TEST", "1m", to_time + timedelta(minutes=20), to_time + timedelta(minutes=30))
+        self.assertEqual(
+            len(self.store.missing_ranges("TEST", "1m", to_time - timedelta(minutes=10), to_time + timedelta(minutes=30))),
+            1,
+        )
+
+        df = self.store.sync(self.broker, "TEST", "1m", to_time - timedelta(minutes=10), to_time + timedelta(minutes=30))
+        self.assertEqual(len(df), 40)
+        self.assertFalse(df.index.duplicated().any())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from ppo_agent.env import CandleTradingEnv, CandleTradingVecEnv, compute_rewards, make_trading_env
+
+
+def make_data(n: int = 6):
+    features = np.arange(n * 2, dtype=np.float32).reshape(n, 2)
+    rewards = np.array([0.1, -0.2, 0.3, -0.4, 0.5, 0.0][:n], dtype=np.float32)
+    return features, rewards
+
+
+class TestComputeRewards(unittest.TestCase):
+    def test_next_candle_return(self):
+        df = pd.DataFrame({"close": [100.0, 110.0, 99.0, 99.0]})
+        np.testing.assert_allclose(compute_rewards(df), [0.1, -0.1, 0.0, 0.0], rtol=1e-6)
+        self.assertEqual(compute_rewards(df).dtype, np.float32)
+
+
+class TestCandleTradingVecEnv(unittest.TestCase):
+    def test_step_rewards_by_hand(self):
+        features, rewards = make_data()
+        # Эпизод на всю длину данных всегда начинается с первой строки
+        env = CandleTradingVecEnv(features, rewards, n_envs=1)
+        obs = env.reset()
+        np.testing.assert_array_equal(obs, features[[0]])
+
+        # шорт, лонг, вне позиции, лонг, шорт: награда = (action - 1) * reward[t]
+        expected = [-0.1, -0.2, 0.0, -0.4, -0.5]
+        returns = 0.0
+        for t, (action, reward) in enumerate(zip([0, 2, 1, 2, 0], expected)):
+            obs, step_rewards, dones, infos = env.step(np.array([action]))
+            self.assertAlmostEqual(float(step_rewards[0]), reward, places=6)
+            returns += reward
+            if t < 4:
+                np.testing.assert_array_equal(obs, features[[t + 1]])
+                self.assertFalse(dones[0])
+        self.assertTrue(dones[0])
+        self.assertTrue(infos[0]["TimeLimit.truncated"])
+        np.testing.assert_array_equal(infos[0]["terminal_observation"], features[5])
+        self.assertAlmostEqual(infos[0]["episode"]["r"], returns, places=5)
+        self.assertEqual(infos[0]["episode"]["l"], 5)
+        # Автосброс: новый эпизод снова с первой строки
+        np.testing.assert_array_equal(obs, features[[0]])
+
+    def test_truncation_and_auto_reset(self):
+        features, rewards = make_data()
+        env = CandleTradingVecEnv(features, rewards, n_envs=4, episode_length=2, seed=0)
+        obs = env.reset()
+        starts = env.positions.copy()
+        self.assertTrue(np.all(starts <= len(features) - 1 - 2))
+        np.testing.assert_array_equal(obs, features[starts])
+
+        _, _, dones, _ = env.step(np.ones(4, dtype=np.int64))
+        self.assertFalse(dones.any())
+        _, _, dones, infos = env.step(np.ones(4, dtype=np.int64))
+        self.assertTrue(dones.all())
+        for i in range(4):
+            np.testing.assert_array_equal(infos[i]["terminal_observation"], features[starts[i] + 2])
+        self.assertTrue(np.all(env.steps == 0))
+
+    def test_episode_length_capped_by_data(self):
+        features, rewards = make_data()
+        env = CandleTradingVecEnv(features, rewards, episode_length=100)
+        self.assertEqual(env.episode_length, len(features) - 1)
+
+    def test_validation(self):
+        features, rewards = make_data()
+        with self.assertRaises(ValueError):
+            CandleTradingVecEnv(features[:, 0], rewards)
+        with self.assertRaises(ValueError):
+            CandleTradingVecEnv(features, rewards[:-1])
+        with self.assertRaises(ValueError):
+            CandleTradingVecEnv(features[:1], rewards[:1])
+        with self.assertRaises(ValueError):
+            CandleTradingEnv(features, rewards[:-1])
+
+
+class TestMakeTradingEnv(unittest.TestCase):
+    def test_inprocess_matches_subproc(self):
+        features, rewards = make_data()
+        actions = np.array([[0, 2], [2, 1], [1, 0], [2, 2], [0, 1], [2, 0], [1, 2]])
+        envs = [make_trading_env(features, rewards, n_envs=2, subproc=subproc) for subproc in (False, True)]
+        try:
+            for env in envs:
+                self.assertEqual(env.num_envs, 2)
+            first, second = (env.reset() for env in envs)
+            np.testing.assert_array_equal(first, second)
+            for step in actions:
+                a, b = (env.step(step) for env in envs)
+                for x, y in zip(a[:3], b[:3]):
+                    np.testing.assert_allclose(x, y, rtol=1e-6)
+        finally:
+            for env in envs:
+                env.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from ppo_agent.feature_graph import FEATURE_GRAPH, INDICATOR_GRAPH, TRUE_RANGE, FeatureGraph, Node, column, ema
+from ppo_agent.features import compute_features, compute_ta_indicators
+from ppo_agent.indicators import compute_atr, compute_macd, compute_rsi, compute_sma, compute_ema
+
+
+def random_candles(size: int = 400, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, size)))
+    spread = np.abs(rng.normal(0, 0.005, size)) * close
+    return pd.DataFrame({
+        "open": close, "high": close + spread, "low": close - spread, "close": close,
+        "volume": rng.integers(1, 10_000, size).astype(float),
+    })
+
+
+class TestFeatureGraph(unittest.TestCase):
+    def setUp(self):
+        self.df = random_candles()
+
+    def test_feature_graph_matches_ta(self):
+        reference = compute_ta_indicators(self.df)
+        for name, values in FEATURE_GRAPH.compute(self.df).items():
+            np.testing.assert_allclose(values, reference[name].to_numpy(dtype=float), rtol=1e-9, atol=1e-9,
+                                       err_msg=name)
+
+    def test_indicator_graph_matches_pandas(self):
+        expected = {
+            "rsi": compute_rsi(self.df["close"]),
+            "macd": compute_macd(self.df["close"]),
+            "atr": compute_atr(self.df),
+            "sma14": compute_sma(self.df["close"], 14),
+            "ema14": compute_ema(self.df["close"], 14),
+        }
+        for name, values in INDICATOR_GRAPH.compute(self.df).items():
+            np.testing.assert_allclose(values, expected[name].to_numpy(), rtol=1e-9, atol=1e-9, err_msg=name)
+
+    def test_common_subexpressions_deduplicated(self):
+        self.assertEqual(Node("true_range", column("high"), column("low"), column("close")), TRUE_RANGE)
+        plan = FEATURE_GRAPH.plan(["atr", "adx"])
+        self.assertEqual(sum(node.op == "true_range" for node in plan), 1)
+        self.assertEqual(len(plan), len(set(plan)))
+
+    def test_only_requested_columns(self):
+        ops = {node.op for node in FEATURE_GRAPH.plan(["rsi"])}
+        self.assertNotIn("adx", ops)
+        self.assertNotIn("true_range", ops)
+
+        result = compute_features(self.df, columns=["rsi", "close"])
+        self.assertIn("rsi", result.columns)
+        self.assertNotIn("adx", result.columns)
+
+    def test_columns_conflicting_backend(self):
+        with self.assertRaises(ValueError):
+            compute_features(self.df, backend="numpy", columns=["rsi"])
+        ta_result = compute_features(self.df, backend="ta", columns=["rsi", "close"])
+        self.assertIn("rsi", ta_result.columns)
+        self.assertNotIn("adx", ta_result.columns)
+
+    def test_cache_shared_between_graphs(self):
+        graph = FeatureGraph({"ema": ema(column("close"), 12)})
+        cache = {}
+        INDICATOR_GRAPH.compute(self.df, ["macd"], cache=cache)
+        before = len(cache)
+        # EMA12 уже посчитана для MACD, новых узлов не появляется
+        result = graph.compute(self.df, cache=cache)
+        self.assertEqual(len(cache), before)
+        self.assertIs(result["ema"], cache[ema(column("close"), 12)])
+
+    def test_unknown_column(self):
+        with self.assertRaises(KeyError):
+            FEATURE_GRAPH.plan(["unknown"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,6 +1,11 @@
+import tempfile
+import threading
 import unittest
+from pathlib import Path
+
+import numpy as np
 import pandas as pd
-from ppo_agent.features import compute_features
+from ppo_agent.features import RunningNormalizer, compute_features, extract_features, select_features
 
 class TestFeatureExtraction(unittest.TestCase):
     def setUp(self):
@@ -20,6 +25,19 @@ class TestFeatureExtraction(unittest.TestCase):
         for col in expected_columns:
             self.assertIn(col, result.columns, f"Отсутствует колонка {col}")
 
+    def test_macd_extras_not_model_features(self):
+        # Сигнальная линия и гистограмма MACD не должны менять размер наблюдения моделей
+        df = self.df.assign(macd_signal=1.0, macd_hist=2.0)
+        self.assertNotIn("macd_signal", select_features(df).columns)
+        self.assertNotIn("macd_hist", select_features(df).columns)
+
+    def test_macd_extras_do_not_drop_rows(self):
+        # Прогрев сигнальной линии MACD длиннее, чем у признаков модели: строк не должно стать меньше
+        result = compute_features(self.df)
+        self.assertEqual(result.index[0], self.df.index[25])
+        self.assertEqual(len(result), len(self.df) - 25)
+        self.assertFalse(result[["macd_signal", "macd_hist"]].isnull().values.any())
+
     def test_compute_features_not_empty(self):
         result = compute_features(self.df)
         self.assertGreater(len(result), 0, "Результат должен содержать строки")
@@ -32,5 +50,53 @@ class TestFeatureExtraction(unittest.TestCase):
         result = compute_features(self.df)
         self.assertIsInstance(result, pd.DataFrame, "Результат должен быть DataFrame")
 
+class TestRunningNormalizer(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.df = pd.DataFrame({"close": rng.normal(100, 5, 1000), "volume": rng.normal(1e4, 1e3, 1000)})
+
+    def test_incremental_matches_full_pass(self):
+        normalizer = RunningNormalizer(self.df.columns)
+        for chunk in np.array_split(self.df.to_numpy(), 7):
+            normalizer.update(chunk)
+        np.testing.assert_allclose(normalizer.mean, self.df.mean().to_numpy())
+        np.testing.assert_allclose(normalizer.std, self.df.std().to_numpy())
+
+    def test_single_candle_and_roundtrip(self):
+        normalizer = RunningNormalizer(self.df.columns)
+        normalizer.update(self.df.to_numpy())
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "key.norm.json"
+            normalizer.save(path)
+            loaded = RunningNormalizer.load(path)
+
+        full = extract_features(self.df, normalizer=loaded)
+        last = extract_features(self.df.iloc[-1:], normalizer=loaded)
+        np.testing.assert_allclose(last.to_numpy(), full.iloc[-1:].to_numpy(), rtol=1e-5)
+
+    def test_concurrent_save(self):
+        normalizer = RunningNormalizer(self.df.columns)
+        normalizer.update(self.df.to_numpy())
+        errors = []
+
+        def save_many(path):
+            try:
+                for _ in range(200):
+                    normalizer.save(path)
+            except Exception as e:
+                errors.append(e)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "key.norm.json"
+            threads = [threading.Thread(target=save_many, args=(path,)) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(errors, [])
+            self.assertEqual(RunningNormalizer.load(path).count, normalizer.count)
+            self.assertEqual([p.name for p in Path(tmp).iterdir()], ["key.norm.json"])
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
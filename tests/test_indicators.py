@@ -0,0 +1,147 @@
+import tempfile
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from ppo_agent.feature_graph import INDICATOR_GRAPH
+from ppo_agent.indicators import (
+    compute_all_indicators,
+    IndicatorEngine,
+    StreamingIndicators,
+    INDICATOR_COLUMNS,
+    compute_panel_indicators,
+    stack_panel,
+    unstack_panel,
+)
+
+
+def make_candles(n: int = 300, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 1, n))
+    return pd.DataFrame({
+        "time": pd.date_range("2025-01-01", periods=n, freq="min", tz="UTC"),
+        "open": close + rng.normal(0, 0.2, n),
+        "high": close + rng.uniform(0.1, 1.0, n),
+        "low": close - rng.uniform(0.1, 1.0, n),
+        "close": close,
+        "volume": rng.uniform(100, 1000, n),
+    }).set_index("time")
+
+
+class TestStreamingIndicators(unittest.TestCase):
+    def setUp(self):
+        self.df = make_candles()
+
+    def test_matches_batch(self):
+        batch = compute_all_indicators(self.df)
+        state = StreamingIndicators()
+        rows = []
+        for high, low, close in self.df[["high", "low", "close"]].itertuples(index=False):
+            result = state.update(high, low, close)
+            if not any(np.isnan(v) for v in result.values()):
+                rows.append(result)
+        stream = pd.DataFrame(rows)
+        self.assertEqual(len(stream), len(batch))
+        for col in INDICATOR_COLUMNS:
+            np.testing.assert_allclose(stream[col], batch[col], rtol=1e-9, atol=1e-9)
+
+    def test_state_roundtrip(self):
+        state = StreamingIndicators()
+        for high, low, close in self.df[["high", "low", "close"]].iloc[:100].itertuples(index=False):
+            state.update(high, low, close)
+        restored = StreamingIndicators.from_dict(state.to_dict())
+        for high, low, close in self.df[["high", "low", "close"]].iloc[100:].itertuples(index=False):
+            self.assertEqual(state.update(high, low, close), restored.update(high, low, close))
+
+    def test_engine_incremental_update(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = IndicatorEngine(state_dir=tmp)
+            key = ("TEST", "1m")
+            engine.update(key, self.df.iloc[:200])
+            result = engine.update(key, self.df.iloc[150:])
+
+            restored = IndicatorEngine(state_dir=tmp)
+            self.assertEqual(restored.get_state(key).last_time, engine.get_state(key).last_time)
+
+        batch = compute_all_indicators(self.df)
+        for col in INDICATOR_COLUMNS:
+            np.testing.assert_allclose(result[col], batch[col], rtol=1e-9, atol=1e-9)
+
+    def test_running_sums_long_stream(self):
+        df = make_candles(5000, seed=3)
+        # Ровный участок: окно без убытков и без прибыли
+        df.iloc[2000:2030, df.columns.get_indexer(["high", "low", "close"])] = 100.0
+        state = StreamingIndicators()
+        rows = [state.update(h, l, c) for h, l, c in zip(df["high"], df["low"], df["close"])]
+        streamed = pd.DataFrame(rows)
+        batch = INDICATOR_GRAPH.compute(df, INDICATOR_COLUMNS)
+        for col in INDICATOR_COLUMNS:
+            np.testing.assert_allclose(streamed[col], batch[col], rtol=1e-9, atol=1e-9, err_msg=col)
+        self.assertTrue(np.isnan(streamed["rsi"].iloc[2029]))
+
+    def test_engine_appends_log_and_compacts(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            engine = IndicatorEngine(history=50, state_dir=tmp)
+            key = ("TEST", "1m")
+            for i in range(1, 121):
+                engine.update(key, self.df.iloc[:i])
+            log_path = engine._log_path(key)
+            with open(log_path) as f:
+                lines = f.readlines()
+            self.assertEqual(len(lines), 120 % 50)
+            self.assertTrue(engine._state_path(key).exists())
+
+            # Недописанная последняя строка журнала не мешает восстановлению
+            with open(log_path, "a") as f:
+                f.write('{"candle": [1.0')
+            restored = IndicatorEngine(history=50, state_dir=tmp)
+            self.assertEqual(restored.get_state(key).to_dict(), engine.get_state(key).to_dict())
+            self.assertEqual(list(restored.rows[key]), list(engine.rows[key]))
+
+    def test_engine_does_not_commit_open_candle(self):
+        engine = IndicatorEngine()
+        key = ("TEST", "1m")
+        closed_before = self.df.index[-1]
+        first = engine.update(key, self.df, closed_before)
+        second = engine.update(key, self.df, closed_before)
+        self.assertEqual(len(first), len(second))
+        self.assertEqual(engine.get_state(key).last_time, self.df.index[-2].value)
+        self.assertEqual(first["time"].iloc[-1], self.df.index[-1].tz_convert(None))
+
+
+class TestPanelIndicators(unittest.TestCase):
+    def test_ragged_panel_matches_batch(self):
+        frames = [make_candles(300, 0), make_candles(120, 1), make_candles(40, 2), make_candles(5, 3)]
+        panel = stack_panel(frames)
+        results = unstack_panel(panel, compute_panel_indicators(panel))
+        for df, result in zip(frames, results):
+            batch = compute_all_indicators(df)
+            self.assertEqual(len(result), len(batch))
+            for col in INDICATOR_COLUMNS + ["close"]:
+                np.testing.assert_allclose(result[col], batch[col], rtol=1e-9, atol=1e-9)
+
+    def test_panel_only_requested_columns(self):
+        frames = [make_candles(120, 0), make_candles(60, 1)]
+        panel = stack_panel(frames)
+        full = compute_panel_indicators(panel)
+        subset = compute_panel_indicators(panel, columns=["rsi", "close", "volume"])
+        self.assertEqual(set(subset), {"rsi", "valid"})
+        np.testing.assert_array_equal(subset["rsi"], full["rsi"])
+        results = unstack_panel(panel, subset)
+        for df, result in zip(frames, results):
+            batch = compute_all_indicators(df, columns=["rsi"])
+            self.assertNotIn("ema14", result.columns)
+            np.testing.assert_allclose(result["rsi"], batch["rsi"], rtol=1e-9, atol=1e-9)
+
+    def test_3d_panel(self):
+        panel = stack_panel([make_candles(100, 0), make_candles(80, 1)])
+        block = {col: np.stack([values, values]) for col, values in panel.items()}
+        flat = compute_panel_indicators(panel)
+        stacked = compute_panel_indicators(block)
+        for col in INDICATOR_COLUMNS:
+            np.testing.assert_array_equal(stacked[col][1], flat[col])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+import torch
+
+from ppo_agent.inference import NumpyRuntime, TorchRuntime, export_numpy, export_torchscript, load_runtime
+from ppo_agent.model import PPOModel
+
+
+class TestInferenceRuntime(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(0)
+        self.model = PPOModel(input_dim=12, hidden_dim=32, output_dim=2).eval()
+        self.x = np.random.default_rng(0).normal(size=(64, 12)).astype(np.float32)
+        with torch.no_grad():
+            self.expected = [t.numpy() for t in self.model(torch.from_numpy(self.x))]
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _assert_matches(self, runtime):
+        for got, expected in zip(runtime(self.x), self.expected):
+            np.testing.assert_allclose(got, expected, rtol=1e-4, atol=1e-5)
+
+    def test_fused_torch(self):
+        self._assert_matches(TorchRuntime.from_model(self.model))
+        self._assert_matches(TorchRuntime.from_model(self.model, script=True))
+
+    def test_fused_is_snapshot(self):
+        runtime = TorchRuntime.from_model(self.model)
+        # Дальнейшее обучение исходной модели не должно смешивать новую общую часть со старыми головами
+        with torch.no_grad():
+            for param in self.model.parameters():
+                param.add_(1.0)
+        self._assert_matches(runtime)
+
+    def test_exported_runtimes(self):
+        self._assert_matches(load_runtime(export_torchscript(self.model, self.dir / "model.pt")))
+        runtime = load_runtime(export_numpy(self.model, self.dir / "model.npz"))
+        self.assertIsInstance(runtime, NumpyRuntime)
+        self._assert_matches(runtime)
+
+    def test_single_row(self):
+        signal, confidence, value = NumpyRuntime.load(export_numpy(self.model, self.dir / "model.npz"))(self.x[0])
+        self.assertEqual(signal.shape, (1, 2))
+        self.assertEqual(value.shape, (1, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
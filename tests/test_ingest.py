@@ -0,0 +1,69 @@
+import io
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from ppo_agent.ingest import split_csv_groups, read_group, validate_csv_header
+
+
+class TestCsvIngest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+        rng = np.random.default_rng(0)
+        n = 5000
+        self.df = pd.DataFrame({
+            "asset": rng.choice(["BBG000B9XRY4", "BTC/USDT", "ETH-USDT"], n),
+            "timeframe": rng.choice(["1m", "1h"], n),
+            "close": rng.random(n),
+            "volume": rng.integers(0, 1000, n),
+            "timestamp": pd.date_range("2025-01-01", periods=n, freq="min").astype(str),
+        })
+        self.csv_path = self.dir / "upload.csv"
+        self.df.to_csv(self.csv_path, index=False)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_split_matches_groupby(self):
+        paths = split_csv_groups(self.csv_path, self.dir / "groups", chunksize=333)
+        expected = dict(tuple(self.df.groupby(["asset", "timeframe"])))
+        self.assertEqual(set(paths), set(expected))
+
+        for key, path in paths.items():
+            group = read_group(path)
+            self.assertNotIn("asset", group.columns)
+            np.testing.assert_allclose(group["close"], expected[key]["close"])
+            self.assertEqual(group["timestamp"].tolist(), expected[key]["timestamp"].tolist())
+
+    def test_non_numeric_after_sample(self):
+        # Выборка типов — первые 10 000 строк, нечисловое значение идёт после неё
+        df = pd.concat([self.df] * 3, ignore_index=True)
+        df["close"] = df["close"].astype(object)
+        df.loc[14_000, "close"] = "1,5"
+        bad_path = self.dir / "late_text.csv"
+        df.to_csv(bad_path, index=False)
+
+        with redirect_stdout(io.StringIO()) as out:
+            paths = split_csv_groups(bad_path, self.dir / "groups", chunksize=1000)
+        self.assertIn("1 нечисловых значений в колонке close", out.getvalue())
+
+        key = tuple(df.loc[14_000, ["asset", "timeframe"]])
+        group = read_group(paths[key])
+        self.assertEqual(group["close"].dtype, np.float64)
+        self.assertEqual(int(group["close"].isna().sum()), 1)
+        self.assertEqual(sum(len(read_group(path)) for path in paths.values()), len(df))
+
+    def test_rejects_missing_columns(self):
+        bad_path = self.dir / "bad.csv"
+        self.df.drop(columns=["timeframe"]).to_csv(bad_path, index=False)
+        with self.assertRaises(ValueError):
+            validate_csv_header(bad_path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import json
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from ppo_agent.utils import TrainingJournal, IntervalIndex
+
+
+class TestIntervalIndex(unittest.TestCase):
+    def test_merges_overlapping_intervals(self):
+        index = IntervalIndex()
+        t0 = datetime(2025, 1, 1)
+        index.add(t0, t0 + timedelta(hours=1))
+        index.add(t0 + timedelta(hours=2), t0 + timedelta(hours=3))
+        self.assertEqual(len(index), 2)
+
+        index.add(t0 + timedelta(minutes=30), t0 + timedelta(hours=2))
+        self.assertEqual(len(index), 1)
+        self.assertTrue(index.covers(t0 + timedelta(minutes=10), t0 + timedelta(hours=3)))
+        self.assertFalse(index.covers(t0 - timedelta(minutes=1), t0 + timedelta(hours=1)))
+
+
+class TestTrainingJournal(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.t0 = datetime(2025, 1, 1)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_record_and_check(self):
+        journal = TrainingJournal(self.tmp.name)
+        journal.record_training("FIGI", "1m", self.t0, self.t0 + timedelta(hours=1))
+        self.assertTrue(journal.was_trained("FIGI", "1m", self.t0, self.t0 + timedelta(minutes=30)))
+        self.assertFalse(journal.was_trained("FIGI", "1m", self.t0, self.t0 + timedelta(hours=2)))
+        self.assertFalse(journal.was_trained("FIGI", "5m", self.t0, self.t0 + timedelta(minutes=30)))
+
+    def test_last_trained(self):
+        journal = TrainingJournal(self.tmp.name)
+        self.assertIsNone(journal.last_trained("FIGI", "1m"))
+        journal.record_training("FIGI", "1m", self.t0 + timedelta(hours=2), self.t0 + timedelta(hours=3))
+        journal.record_training("FIGI", "1m", self.t0, self.t0 + timedelta(hours=1))
+        self.assertEqual(journal.last_trained("FIGI", "1m"), self.t0 + timedelta(hours=3))
+
+    def test_sees_records_from_other_instance(self):
+        reader = TrainingJournal(self.tmp.name)
+        writer = TrainingJournal(self.tmp.name)
+        self.assertFalse(reader.was_trained("FIGI", "1m", self.t0, self.t0 + timedelta(minutes=1)))
+        writer.record_training("FIGI", "1m", self.t0, self.t0 + timedelta(minutes=1))
+        self.assertTrue(reader.was_trained("FIGI", "1m", self.t0, self.t0 + timedelta(minutes=1)))
+
+    def test_log_is_compacted(self):
+        journal = TrainingJournal(self.tmp.name, compact_min_records=10)
+        for i in range(500):
+            start = self.t0 + timedelta(minutes=i)
+            journal.record_training("FIGI", "1m", start, start + timedelta(minutes=1))
+
+        path = Path(self.tmp.name) / "FIGI" / "FIGI_1m.jsonl"
+        self.assertLess(len(path.read_text().splitlines()), 20)
+        self.assertTrue(TrainingJournal(self.tmp.name).was_trained(
+            "FIGI", "1m", self.t0, self.t0 + timedelta(minutes=500)))
+
+    def test_migrates_legacy_json(self):
+        legacy = Path(self.tmp.name) / "FIGI" / "FIGI_1h.json"
+        legacy.parent.mkdir(parents=True)
+        legacy.write_text(json.dumps([{"from": self.t0.isoformat(), "to": (self.t0 + timedelta(days=1)).isoformat()}]))
+
+        journal = TrainingJournal(self.tmp.name)
+        self.assertTrue(journal.was_trained("FIGI", "1h", self.t0, self.t0 + timedelta(hours=5)))
+        self.assertEqual(list(journal.get_all_intervals("FIGI")), ["1h"])
+
+
+if __name__ == '__main__':
+    unittest.main()
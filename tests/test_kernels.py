@@ -0,0 +1,72 @@
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from ppo_agent import kernels
+from ppo_agent.features import compute_features, compute_ta_indicators
+from ppo_agent.kernels import FEATURE_COLUMNS, compute_feature_arrays
+
+
+def random_candles(size: int, seed: int = 0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, size)))
+    open_ = np.concatenate([[close[0]], close[:-1]])
+    spread = np.abs(rng.normal(0, 0.005, size)) * close
+    return pd.DataFrame({
+        "open": open_,
+        "high": np.maximum(open_, close) + spread,
+        "low": np.minimum(open_, close) - spread,
+        "close": close,
+        "volume": rng.integers(1, 10_000, size).astype(float),
+    }, index=pd.date_range("2025-01-01", periods=size, freq="min"))
+
+
+class TestKernels(unittest.TestCase):
+    def setUp(self):
+        self.df = random_candles(600)
+        self.reference = {k: v.to_numpy(dtype=float) for k, v in compute_ta_indicators(self.df).items()}
+
+    def assertMatchesReference(self, arrays):
+        for name in FEATURE_COLUMNS:
+            np.testing.assert_array_equal(np.isnan(arrays[name]), np.isnan(self.reference[name]), err_msg=name)
+            np.testing.assert_allclose(arrays[name], self.reference[name], rtol=1e-9, atol=1e-9, err_msg=name)
+
+    def test_numpy_backend_matches_ta(self):
+        self.assertMatchesReference(compute_feature_arrays(self.df["high"], self.df["low"], self.df["close"],
+                                                           backend="numpy"))
+
+    def test_fused_loop_matches_ta(self):
+        # Тот же цикл, что компилирует numba, но исполняемый интерпретатором
+        out = np.empty((len(self.df), len(FEATURE_COLUMNS)))
+        kernels._fused_loop_py(self.df["high"].to_numpy(), self.df["low"].to_numpy(),
+                               self.df["close"].to_numpy(), out)
+        self.assertMatchesReference({name: out[:, i] for i, name in enumerate(FEATURE_COLUMNS)})
+
+    @unittest.skipIf(kernels.numba is None, "numba не установлен")
+    def test_numba_backend_matches_ta(self):
+        self.assertMatchesReference(compute_feature_arrays(self.df["high"], self.df["low"], self.df["close"],
+                                                           backend="numba"))
+
+    def test_linear_scan_long_series(self):
+        rng = np.random.default_rng(1)
+        x = rng.normal(size=5000)
+        expected = np.empty_like(x)
+        y = 3.0
+        for i, v in enumerate(x):
+            y = 0.85 * y + v
+            expected[i] = y
+        np.testing.assert_allclose(kernels._linear_scan(x, 0.85, 3.0), expected, rtol=1e-10, atol=1e-12)
+
+    def test_compute_features_backends_agree(self):
+        fused = compute_features(self.df, backend="numpy")
+        reference = compute_features(self.df, backend="ta")
+        pd.testing.assert_frame_equal(fused, reference, rtol=1e-7, atol=1e-9)
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            compute_feature_arrays([1.0], [1.0], [1.0], backend="gpu")
+
+
+if __name__ == '__main__':
+    unittest.main()
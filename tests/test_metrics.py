@@ -0,0 +1,33 @@
+import unittest
+
+from ppo_agent.metrics import Registry, stats_collector
+
+
+class TestMetrics(unittest.TestCase):
+    def setUp(self):
+        self.registry = Registry()
+
+    def test_histogram_and_counter_render(self):
+        histogram = self.registry.histogram("stage_seconds", "Время этапов", ["stage"], buckets=(0.1, 1.0))
+        counter = self.registry.counter("errors", "Ошибки", ["broker", "reason"])
+        for value in (0.05, 0.5, 5.0):
+            histogram.labels("predict").observe(value)
+        counter.labels("OKXAPI", 'http_"429"').inc(2)
+
+        text = self.registry.render()
+        self.assertIn('stage_seconds_bucket{stage="predict",le="0.1"} 1', text)
+        self.assertIn('stage_seconds_bucket{stage="predict",le="1.0"} 2', text)
+        self.assertIn('stage_seconds_bucket{stage="predict",le="+Inf"} 3', text)
+        self.assertIn('stage_seconds_count{stage="predict"} 3', text)
+        self.assertIn('# TYPE errors_total counter', text)
+        self.assertIn('errors_total{broker="OKXAPI",reason="http_\\"429\\""} 2.0', text)
+
+    def test_collectors(self):
+        self.registry.register_collector(stats_collector("cache", lambda: {"hits": 3, "entries": 7}, counters=["hits"]))
+        text = self.registry.render()
+        self.assertIn("# TYPE cache_hits_total counter\ncache_hits_total 3", text)
+        self.assertIn("# TYPE cache_entries gauge\ncache_entries 7", text)
+
+
+if __name__ == '__main__':
+    unittest.main()
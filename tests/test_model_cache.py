@@ -0,0 +1,82 @@
+import os
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from ppo_agent.model_cache import ModelCache
+
+
+class TestModelCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+        for key in ["A_1m", "A_1h", "B_1m", "C_1d"]:
+            (self.dir / f"{key}.zip").write_bytes(b"")
+        self.loaded = []
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def loader(self, path: Path):
+        self.loaded.append(path.stem)
+        return {"key": path.stem}
+
+    def test_lazy_load_and_hits(self):
+        cache = ModelCache(self.dir, loader=self.loader, sizeof=lambda m: 1)
+        self.assertEqual(self.loaded, [])
+        self.assertEqual(cache.keys(), ["A_1h", "A_1m", "B_1m", "C_1d"])
+
+        self.assertEqual(cache["A_1m"]["key"], "A_1m")
+        cache["A_1m"]
+        self.assertEqual(self.loaded, ["A_1m"])
+        self.assertEqual(cache.stats()["hits"], 1)
+        self.assertEqual(cache.stats()["misses"], 1)
+        self.assertIsNone(cache.get("MISSING_1m"))
+
+    def test_lru_eviction_respects_pinned(self):
+        cache = ModelCache(self.dir, max_models=2, pinned=["C_1d"], loader=self.loader, sizeof=lambda m: 1)
+        self.assertEqual(self.loaded, ["C_1d"])
+
+        cache["A_1m"]
+        cache["B_1m"]
+        stats = cache.stats()
+        self.assertEqual(stats["loaded"], 2)
+        self.assertEqual(stats["evictions"], 1)
+
+        cache["A_1m"]
+        self.assertEqual(self.loaded, ["C_1d", "A_1m", "B_1m", "A_1m"])
+        cache["C_1d"]
+        self.assertEqual(self.loaded.count("C_1d"), 1)
+
+    def test_byte_budget(self):
+        cache = ModelCache(self.dir, max_bytes=25, loader=self.loader, sizeof=lambda m: 10)
+        for key in ["A_1m", "A_1h", "B_1m"]:
+            cache[key]
+        self.assertEqual(cache.stats()["loaded"], 2)
+        self.assertLessEqual(cache.stats()["bytes"], 25)
+
+    def test_setitem_registers_new_model(self):
+        cache = ModelCache(self.dir, loader=self.loader, sizeof=lambda m: 1)
+        cache["D_5m"] = {"key": "D_5m"}
+        self.assertIn("D_5m", cache)
+        self.assertEqual(cache["D_5m"]["key"], "D_5m")
+        self.assertNotIn("D_5m", self.loaded)
+
+    def test_watch_reloads_changed_and_new_models(self):
+        cache = ModelCache(self.dir, loader=self.loader, sizeof=lambda m: 1, watch_interval=0.01)
+        cache["A_1m"]
+        # Другой процесс перезаписал модель и добавил новую
+        path = self.dir / "A_1m.zip"
+        os.utime(path, ns=(path.stat().st_atime_ns, path.stat().st_mtime_ns + 10 ** 9))
+        (self.dir / "E_1h.zip").write_bytes(b"")
+        time.sleep(0.02)
+
+        cache["A_1m"]
+        self.assertEqual(self.loaded, ["A_1m", "A_1m"])
+        self.assertEqual(cache.stats()["reloads"], 1)
+        self.assertIn("E_1h", cache.keys())
+
+
+if __name__ == '__main__':
+    unittest.main()
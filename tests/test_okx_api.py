@@ -0,0 +1,66 @@
+import time
+import unittest
+
+from aiohttp import web
+
+from brokers.okx_api import AsyncOKXAPI, HISTORY_CANDLES_ENDPOINT, candles_to_frame
+
+
+def make_rows(n: int, start_ms: int = 1_700_000_000_000):
+    # OKX отдаёт свечи от новых к старым
+    return [
+        [str(start_ms + i * 60_000), str(100 + i), str(101 + i), str(99 + i), str(100.5 + i), "10", "0", "0", "1"]
+        for i in reversed(range(n))
+    ]
+
+
+class TestCandlesToFrame(unittest.TestCase):
+    def test_sorted_numeric_frame(self):
+        df = candles_to_frame(make_rows(5))
+        self.assertEqual(list(df.columns), ["time", "open", "high", "low", "close", "volume"])
+        self.assertTrue(df["time"].is_monotonic_increasing)
+        self.assertEqual(df["open"].tolist(), [100.0, 101.0, 102.0, 103.0, 104.0])
+
+
+class TestAsyncOKXAPI(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.requests = []
+
+        async def history_candles(request):
+            self.requests.append((request.query["instId"], request.query["bar"]))
+            return web.json_response({"code": "0", "data": make_rows(int(request.query["limit"]))})
+
+        app = web.Application()
+        app.router.add_get(HISTORY_CANDLES_ENDPOINT, history_candles)
+        self.runner = web.AppRunner(app)
+        await self.runner.setup()
+        site = web.TCPSite(self.runner, "127.0.0.1", 0)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{port}"
+
+    async def asyncTearDown(self):
+        await self.runner.cleanup()
+
+    async def test_get_many(self):
+        pairs = [(f"PAIR{i}-USDT", bar) for i in range(30) for bar in ("1m", "1H")]
+        async with AsyncOKXAPI(base_url=self.base_url, rate_limits={}) as client:
+            frames = await client.get_many(pairs, limit=50)
+
+        self.assertEqual(set(frames), set(pairs))
+        self.assertTrue(all(len(df) == 50 for df in frames.values()))
+        self.assertEqual(len(self.requests), len(pairs))
+
+    async def test_rate_limit(self):
+        limits = {HISTORY_CANDLES_ENDPOINT: (5, 0.5)}
+        async with AsyncOKXAPI(base_url=self.base_url, rate_limits=limits) as client:
+            started = time.monotonic()
+            await client.get_many([(f"PAIR{i}-USDT", "1m") for i in range(10)], limit=5)
+            elapsed = time.monotonic() - started
+
+        # 5 запросов проходят сразу, остальные 5 ждут пополнения бакета
+        self.assertGreaterEqual(elapsed, 0.4)
+
+
+if __name__ == '__main__':
+    unittest.main()
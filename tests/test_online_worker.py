@@ -0,0 +1,37 @@
+import tempfile
+import time
+import unittest
+from pathlib import Path
+
+from ppo_agent.online_worker import OnlineTrainingWorker, next_boundary, read_health
+
+
+class TestOnlineWorker(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.dir = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_next_boundary(self):
+        self.assertEqual(next_boundary(3600 * 5 + 10, "1h"), 3600 * 6)
+        self.assertEqual(next_boundary(120, "1m"), 180)
+
+    def test_schedule_and_health(self):
+        worker = OnlineTrainingWorker(self.dir, self.dir / "health.json")
+        now = time.time()
+        worker._schedule_new(["BBG000B9XRY4_1m", "BBG000B9XRY4_1h", "BBG000B9XRY4_1w"], now - 30)
+        worker._schedule_new(["BBG000B9XRY4_1m"], now)
+        self.assertEqual(len(worker.queue), 2)
+
+        worker._heartbeat()
+        health = read_health(self.dir / "health.json")
+        self.assertTrue(health["alive"])
+        self.assertEqual(health["overdue_series"], 2)
+        self.assertGreaterEqual(health["max_lag_seconds"], 30)
+        self.assertFalse(read_health(self.dir / "missing.json")["alive"])
+
+
+if __name__ == '__main__':
+    unittest.main()
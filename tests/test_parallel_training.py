@@ -0,0 +1,84 @@
+import importlib.util
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from ppo_agent.parallel_training import SUBPROC_MIN_ROWS, choose_env_mode, pack_groups, train_parallel
+
+
+class _KillWorker:
+    """Наблюдения, распаковка которых завершает процесс пула (как при OOM)"""
+
+    def __len__(self):
+        return 10
+
+    def __reduce__(self):
+        return os._exit, (1,)
+
+
+class TestPackGroups(unittest.TestCase):
+    def test_every_group_once(self):
+        costs = {f"g{i}": float(i + 1) for i in range(20)}
+        tasks = pack_groups(costs, workers=4)
+        flat = [key for task in tasks for key in task]
+        self.assertCountEqual(flat, costs)
+
+    def test_large_groups_alone_small_bucketed(self):
+        costs = {"big": 1000.0, "a": 1.0, "b": 1.0, "c": 1.0}
+        tasks = pack_groups(costs, workers=2)
+        self.assertEqual(tasks[0], ["big"])
+        self.assertEqual(len(tasks), 2)
+        self.assertCountEqual(tasks[1], ["a", "b", "c"])
+
+    def test_tasks_sorted_by_cost(self):
+        costs = {"a": 5.0, "b": 50.0, "c": 20.0, "d": 40.0}
+        tasks = pack_groups(costs, workers=1, tasks_per_worker=4)
+        task_costs = [sum(costs[k] for k in task) for task in tasks]
+        self.assertEqual(task_costs, sorted(task_costs, reverse=True))
+
+    def test_empty(self):
+        self.assertEqual(pack_groups({}, workers=4), [])
+
+
+class TestChooseEnvMode(unittest.TestCase):
+    def test_explicit_modes(self):
+        self.assertTrue(choose_env_mode(10, 4, 8, "subproc"))
+        self.assertFalse(choose_env_mode(10**7, 4, 1, "inprocess"))
+
+    def test_auto(self):
+        rows = SUBPROC_MIN_ROWS
+        self.assertTrue(choose_env_mode(rows, 4, workers=2, cpu_count=8))
+        # Ядра заняты пулом
+        self.assertFalse(choose_env_mode(rows, 4, workers=8, cpu_count=8))
+        # Короткий ряд и одна среда выгоднее в процессе
+        self.assertFalse(choose_env_mode(rows - 1, 4, workers=1, cpu_count=8))
+        self.assertFalse(choose_env_mode(rows, 1, workers=1, cpu_count=8))
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            choose_env_mode(10, 1, 1, "gpu")
+
+
+class TestTrainParallel(unittest.TestCase):
+    # Агент в процессе пула импортирует ppo_agent.enums, а с ним tinkoff
+    @unittest.skipIf(importlib.util.find_spec("tinkoff") is None, "tinkoff не установлен")
+    def test_broken_pool_reports_groups(self):
+        rewards = np.zeros(10)
+        groups = {
+            ("KILL", "1m"): ("KILL", "1m", _KillWorker(), rewards, None, 1, False),
+            ("A", "1m"): ("A", "1m", np.zeros((10, 3), dtype=np.float32), rewards, None, 1, False),
+        }
+        with tempfile.TemporaryDirectory() as tmp:
+            agent_kwargs = {"model_dir": tmp, "journal_dir": f"{tmp}/journal", "shared_policy": False}
+            results = {key: error for key, _, _, error in train_parallel(groups, agent_kwargs, workers=2)}
+        # Сломанный пул не обрывает прогон: группа, убившая процесс, падает,
+        # остальные перезапускаются и обучаются
+        self.assertCountEqual(results, groups)
+        self.assertIn("BrokenProcessPool", results[("KILL", "1m")])
+        self.assertIsNone(results[("A", "1m")])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,90 @@
+import asyncio
+import unittest
+
+import pandas as pd
+
+from ppo_agent.prediction_cache import PredictionCache, candle_bounds, closed_candles
+
+
+class TestPredictionCache(unittest.TestCase):
+    def setUp(self):
+        self.now = 1_000_000.0
+        self.cache = PredictionCache(clock=lambda: self.now)
+        self.calls = 0
+
+    async def compute(self):
+        self.calls += 1
+        await asyncio.sleep(0.01)
+        return {"signal": 1.0}
+
+    def test_candle_bounds(self):
+        self.assertEqual(candle_bounds(3600 * 5 + 10, 3600), (3600 * 5, 3600 * 6))
+
+    def test_closed_candles_drop_open_candle(self):
+        last_closed, _ = candle_bounds(3600 * 5 + 10, 3600)
+        df = pd.DataFrame({
+            "time": pd.to_datetime([3600 * 3, 3600 * 4, 3600 * 5], unit="s"),
+            "close": [1.0, 2.0, 3.0],
+        })
+        self.assertEqual(closed_candles(df, last_closed)["close"].tolist(), [1.0, 2.0])
+        with self.assertRaises(ValueError):
+            closed_candles(df, 3600 * 3)
+
+    def test_singleflight_and_expiry(self):
+        async def scenario():
+            results = await asyncio.gather(*(self.cache.get_or_compute("k", self.now + 60, self.compute)
+                                             for _ in range(20)))
+            self.assertEqual(self.calls, 1)
+            self.assertTrue(all(r == {"signal": 1.0} for r in results))
+
+            await self.cache.get_or_compute("k", self.now + 60, self.compute)
+            self.assertEqual(self.calls, 1)
+
+            self.now += 60
+            await self.cache.get_or_compute("k", self.now + 60, self.compute)
+            self.assertEqual(self.calls, 2)
+
+        asyncio.run(scenario())
+        self.assertEqual(self.cache.stats()["shared"], 19)
+
+    def test_many_batches_misses_and_shares_inflight(self):
+        batches = []
+
+        async def compute_many(keys):
+            batches.append(list(keys))
+            await asyncio.sleep(0.01)
+            return {key: RuntimeError("no candles") if key == "bad" else {"signal": key} for key in keys}
+
+        async def scenario():
+            self.cache.put("hit", {"signal": "hit"}, self.now + 60)
+            requests = {key: self.now + 60 for key in ("hit", "a", "b", "bad")}
+            first, second = await asyncio.gather(self.cache.get_or_compute_many(requests, compute_many),
+                                                 self.cache.get_or_compute_many(requests, compute_many))
+            self.assertEqual(batches, [["a", "b", "bad"]])
+            for result in (first, second):
+                self.assertEqual(result["a"], {"signal": "a"})
+                self.assertEqual(result["hit"], {"signal": "hit"})
+                self.assertIsInstance(result["bad"], RuntimeError)
+
+            # Ошибка не закэширована, удачные ключи — да
+            await self.cache.get_or_compute_many(requests, compute_many)
+            self.assertEqual(batches[-1], ["bad"])
+
+        asyncio.run(scenario())
+
+    def test_errors_are_not_cached(self):
+        async def failing():
+            self.calls += 1
+            raise RuntimeError("broker down")
+
+        async def scenario():
+            for _ in range(2):
+                with self.assertRaises(RuntimeError):
+                    await self.cache.get_or_compute("k", self.now + 60, failing)
+
+        asyncio.run(scenario())
+        self.assertEqual(self.calls, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
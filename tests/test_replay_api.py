@@ -0,0 +1,42 @@
+import time
+import unittest
+from datetime import datetime, timedelta, timezone
+
+from brokers.replay_api import ReplayBroker
+
+
+class TestReplayBroker(unittest.TestCase):
+    def test_synthetic_candles_are_consistent(self):
+        broker = ReplayBroker(seed=7)
+        start = datetime(2025, 1, 1, tzinfo=timezone.utc)
+        full = broker.get_market_data_history("BBG000B9XRY4", start, start + timedelta(hours=2), "1m")
+        part = broker.get_market_data_history("BBG000B9XRY4", start + timedelta(minutes=30),
+                                              start + timedelta(minutes=60), "1m")
+
+        self.assertEqual(len(full), 120)
+        self.assertEqual(len(part), 30)
+        self.assertEqual(full["time"].iloc[0], start)
+        self.assertEqual(full.iloc[30:60]["close"].tolist(), part["close"].tolist())
+        self.assertTrue((full["high"] >= full[["open", "close"]].max(axis=1)).all())
+        self.assertTrue((full["low"] <= full[["open", "close"]].min(axis=1)).all())
+
+        other = broker.get_market_data_history("BBG004730N88", start, start + timedelta(hours=2), "1m")
+        self.assertNotEqual(full["close"].tolist(), other["close"].tolist())
+
+    def test_no_future_candles(self):
+        broker = ReplayBroker()
+        now = datetime.now(timezone.utc)
+        df = broker.get_market_data_history("BBG000B9XRY4", now - timedelta(hours=1), now + timedelta(hours=1), "5m")
+        self.assertLessEqual(df["time"].max(), now)
+        self.assertGreaterEqual(len(df), 12)
+
+    def test_latency(self):
+        broker = ReplayBroker(latency_ms=20)
+        start = time.perf_counter()
+        broker.get_latest_candles("BBG000B9XRY4", "1h", 10)
+        self.assertGreaterEqual(time.perf_counter() - start, 0.02)
+        self.assertEqual(broker.calls, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
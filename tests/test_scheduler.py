@@ -0,0 +1,148 @@
+import threading
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from unittest import mock
+
+import pandas as pd
+
+from ppo_agent import scheduler
+from ppo_agent.scheduler import TrainingExecutor
+
+TERMINAL = ("finished", "cancelled", "failed")
+
+
+class ThreadTrainingExecutor(TrainingExecutor):
+    """Тот же планировщик на пуле потоков: задачи видят подменённый _train_group"""
+
+    def _make_pool(self):
+        return ThreadPoolExecutor(max_workers=self.max_workers)
+
+
+class BrokenPool:
+    def submit(self, fn, *args):
+        raise BrokenProcessPool("worker killed")
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        pass
+
+
+def groups(*assets):
+    return {(asset, "1m"): pd.DataFrame({"close": [1.0]}) for asset in assets}
+
+
+class TestTrainingExecutor(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+        self.gates = {}
+        self.failing = set()
+        patches = [
+            mock.patch.object(scheduler, "_train_group", self.fake_train),
+            mock.patch.object(scheduler, "save_training_status"),
+            mock.patch.object(scheduler, "save_group_status"),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def fake_train(self, asset, timeframe, features):
+        self.calls.append(asset)
+        gate = self.gates.get(asset)
+        if gate is not None:
+            gate.wait(5)
+        if asset in self.failing:
+            raise ValueError("bad data")
+        return len(features)
+
+    def make_executor(self, cls=ThreadTrainingExecutor, **kwargs):
+        executor = cls(**kwargs)
+        self.addCleanup(executor.shutdown)
+        return executor
+
+    def wait_status(self, executor, job_id, prefixes=TERMINAL, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            status = executor.progress(job_id)["status"]
+            if status.startswith(prefixes):
+                return status
+            time.sleep(0.01)
+        self.fail(f"{job_id}: статус {executor.progress(job_id)['status']}")
+
+    def test_jobs_dispatched_in_order(self):
+        executor = self.make_executor(max_workers=1, max_concurrent_jobs=1)
+        for asset in ("A", "B", "C"):
+            executor.submit(asset, f"{asset}.csv", groups(asset))
+        for asset in ("A", "B", "C"):
+            self.assertEqual(self.wait_status(executor, asset), "finished")
+        self.assertEqual(self.calls, ["A", "B", "C"])
+
+    def test_concurrent_jobs_capped(self):
+        self.gates = {asset: threading.Event() for asset in ("A", "B", "C")}
+        executor = self.make_executor(max_workers=4, max_concurrent_jobs=2)
+        for asset in ("A", "B", "C"):
+            executor.submit(asset, f"{asset}.csv", groups(asset))
+        self.wait_status(executor, "A", ("started",))
+        self.wait_status(executor, "B", ("started",))
+        time.sleep(0.05)
+        self.assertEqual(executor.progress("C")["status"], "queued")
+
+        self.gates["A"].set()
+        self.wait_status(executor, "C", ("started",))
+        for gate in self.gates.values():
+            gate.set()
+        for asset in ("A", "B", "C"):
+            self.assertEqual(self.wait_status(executor, asset), "finished")
+
+    def test_cancel_queued_and_pending_groups(self):
+        self.gates = {"A": threading.Event()}
+        executor = self.make_executor(max_workers=1, max_concurrent_jobs=1)
+        executor.submit("job1", "1.csv", groups("A", "B"))
+        executor.submit("job2", "2.csv", groups("C"))
+        self.wait_status(executor, "job1", ("started",))
+
+        self.assertTrue(executor.cancel("job2"))
+        self.assertTrue(executor.cancel("job1"))
+        self.gates["A"].set()
+
+        self.assertEqual(self.wait_status(executor, "job1"), "cancelled")
+        self.assertEqual(self.wait_status(executor, "job2"), "cancelled")
+        self.assertEqual(executor.progress("job1")["groups"], {"A/1m": "finished", "B/1m": "cancelled"})
+        self.assertEqual(self.calls, ["A"])
+        self.assertFalse(executor.cancel("job1"))
+
+    def test_failed_group_fails_job(self):
+        self.failing = {"B"}
+        executor = self.make_executor(max_workers=2, max_concurrent_jobs=1)
+        executor.submit("job", "data.csv", groups("A", "B"))
+        self.assertEqual(self.wait_status(executor, "job"), "failed: 1 of 2 groups")
+        self.assertTrue(executor.progress("job")["groups"]["B/1m"].startswith("failed"))
+
+    def test_broken_pool_is_recreated(self):
+        pools = [BrokenPool()]
+
+        class FlakyExecutor(ThreadTrainingExecutor):
+            def _make_pool(self):
+                return pools.pop(0) if pools else super()._make_pool()
+
+        executor = self.make_executor(FlakyExecutor, max_workers=1, max_concurrent_jobs=1)
+        executor.submit("job", "data.csv", groups("A"))
+        self.assertEqual(self.wait_status(executor, "job"), "finished")
+        self.assertEqual(self.calls, ["A"])
+
+    def test_pool_broken_for_good_releases_slot(self):
+        class DeadExecutor(ThreadTrainingExecutor):
+            def _make_pool(self):
+                return BrokenPool()
+
+        executor = self.make_executor(DeadExecutor, max_workers=1, max_concurrent_jobs=1)
+        executor.submit("job1", "1.csv", groups("A"))
+        executor.submit("job2", "2.csv", groups("B"))
+        self.assertTrue(self.wait_status(executor, "job1").startswith("failed"))
+        # Слот освобождён: следующее задание тоже обработано, диспетчер жив
+        self.assertTrue(self.wait_status(executor, "job2").startswith("failed"))
+        self.assertTrue(executor.dispatcher.is_alive())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,70 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+import numpy as np
+import torch
+
+from ppo_agent.shared_policy import SharedPolicy
+
+
+class TestSharedPolicy(unittest.TestCase):
+    def setUp(self):
+        torch.set_num_threads(1)
+        self.columns = ["close", "rsi", "macd"]
+
+    def test_embeddings_separate_assets(self):
+        # Наблюдения одинаковые, различаются только активы: выучить это можно лишь через эмбеддинги
+        policy = SharedPolicy(self.columns, learning_rate=3e-3, seed=0)
+        obs = np.zeros((200, 3), dtype=np.float32)
+        policy.learn([("UP", "1h", obs, np.full(200, 0.01)), ("DOWN", "1h", obs, np.full(200, -0.01))],
+                     total_timesteps=12_000, n_envs=16, episode_length=32, n_steps=64)
+
+        signals, confidences = policy.predict(["UP", "DOWN"], ["1h", "1h"], np.zeros((2, 3)))
+        np.testing.assert_array_equal(signals, [1.0, -1.0])
+        self.assertTrue(((confidences > 0.5) & (confidences <= 1.0)).all())
+        self.assertEqual(policy.series, {"UP_1h", "DOWN_1h"})
+        self.assertGreaterEqual(policy.num_timesteps, 12_000)
+
+    def test_batch_predict_and_roundtrip(self):
+        policy = SharedPolicy(self.columns, asset_capacity=2, seed=1)
+        rng = np.random.default_rng(0)
+        series = [(f"FIGI{i}", tf, rng.normal(size=(50, 3)).astype(np.float32), rng.normal(0, 0.01, 50))
+                  for i in range(5) for tf in ("1m", "1d")]
+        policy.learn(series, total_timesteps=256, n_envs=4, episode_length=16, n_steps=32)
+        # Таблица эмбеддингов выросла, моменты Adam перенесены
+        self.assertGreaterEqual(policy.model.asset_embedding.num_embeddings, 5)
+        state = policy.optimizer.state[policy.model.asset_embedding.weight]
+        self.assertEqual(state["exp_avg"].shape, policy.model.asset_embedding.weight.shape)
+
+        figis = [s[0] for s in series]
+        timeframes = [s[1] for s in series]
+        obs = np.stack([s[2][-1] for s in series])
+        signals, confidences = policy.predict(figis, timeframes, obs)
+        self.assertEqual(signals.shape, (10,))
+        self.assertTrue(set(signals) <= {-1.0, 0.0, 1.0})
+
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "shared_policy.pt"
+            policy.save(path)
+            loaded = SharedPolicy.load(path)
+        np.testing.assert_allclose(loaded.predict(figis, timeframes, obs)[1], confidences, rtol=1e-6)
+        self.assertEqual(loaded.num_timesteps, policy.num_timesteps)
+        self.assertEqual(loaded.series, policy.series)
+
+        # Обучение продолжается с сохранённым оптимизатором
+        loaded.learn(series[:2], total_timesteps=64, n_envs=2, episode_length=16, n_steps=32)
+        self.assertEqual(loaded.num_timesteps, policy.num_timesteps + 64)
+
+    def test_validation(self):
+        policy = SharedPolicy(self.columns)
+        with self.assertRaises(ValueError):
+            policy.learn([("A", "1h", np.zeros((20, 2)), np.zeros(20))], total_timesteps=10)
+        with self.assertRaises(KeyError):
+            policy.predict(["UNKNOWN"], ["1h"], np.zeros((1, 3)))
+        with self.assertRaises(KeyError):
+            policy.timeframe_id("3w")
+
+
+if __name__ == '__main__':
+    unittest.main()
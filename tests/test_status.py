@@ -0,0 +1,39 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from ppo_agent.status import JobStore
+
+
+class TestJobStore(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.store = JobStore(Path(self.tmp.name) / "training_status.db")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_upsert_and_groups(self):
+        self.store.save("job", "started", "data.csv", {"total": 2})
+        self.store.save_group("job", "FIGI", "1m", "finished")
+        self.store.save("job", "failed: 1 of 2 groups", None, {"total": 2, "finished": 1, "failed": 1})
+
+        job = self.store.get("job")
+        self.assertEqual(job["state"], "failed")
+        self.assertEqual(job["filename"], "data.csv")
+        self.assertEqual(job["progress"]["finished"], 1)
+        self.assertEqual(job["groups"], {"FIGI/1m": "finished"})
+
+    def test_filter_and_pagination(self):
+        for i in range(25):
+            self.store.save(f"job{i}", "finished" if i % 5 else "started", f"{i}.csv")
+
+        self.assertEqual(self.store.count(), 25)
+        self.assertEqual(self.store.count("started"), 5)
+        self.assertEqual(len(self.store.list(limit=10)), 10)
+        self.assertEqual(len(self.store.list(limit=10, offset=20)), 5)
+        self.assertTrue(all(job["state"] == "started" for job in self.store.list("started").values()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+import threading
+import unittest
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+from unittest import mock
+
+import numpy as np
+
+from brokers import tinkoff_api
+from brokers.tinkoff_api import TinkoffAPI, candles_to_frame, quotations_to_numpy
+
+
+def quotation(value: float):
+    units = int(value)
+    return SimpleNamespace(units=units, nano=int(round((value - units) * 1e9)))
+
+
+def make_candle(i: int, price: float = 100.25):
+    return SimpleNamespace(
+        time=datetime(2025, 1, 1, tzinfo=timezone.utc) + timedelta(minutes=i),
+        open=quotation(price), high=quotation(price + 1), low=quotation(price - 1),
+        close=quotation(price + 0.5), volume=10 + i,
+    )
+
+
+class FakeClient:
+    """Client с тем же протоколом контекстного менеджера; считает открытые и закрытые каналы"""
+    instances = []
+    failing = set()
+
+    def __init__(self, token):
+        self.token = token
+        self.closed = False
+        self.thread = threading.get_ident()
+        FakeClient.instances.append(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.closed = True
+
+    def get_all_candles(self, figi, from_, to, interval):
+        if figi in FakeClient.failing:
+            raise ConnectionError("channel lost")
+        return [make_candle(i) for i in range(3)]
+
+
+class TestConversion(unittest.TestCase):
+    def test_quotations_to_numpy(self):
+        values = quotations_to_numpy([SimpleNamespace(units=1, nano=500_000_000),
+                                      SimpleNamespace(units=-2, nano=-250_000_000),
+                                      SimpleNamespace(units=0, nano=1)])
+        self.assertEqual(values.dtype, np.float64)
+        np.testing.assert_allclose(values, [1.5, -2.25, 1e-9])
+
+    def test_candles_to_frame(self):
+        df = candles_to_frame([make_candle(i) for i in range(3)])
+        self.assertEqual(list(df.columns), ["open", "high", "low", "close", "volume"])
+        self.assertEqual(str(df.index.tz), "UTC")
+        np.testing.assert_allclose(df["close"], 100.75)
+        self.assertEqual(df["volume"].tolist(), [10, 11, 12])
+        self.assertTrue(candles_to_frame([]).empty)
+
+
+class TestTinkoffAPI(unittest.TestCase):
+    def setUp(self):
+        FakeClient.instances = []
+        FakeClient.failing = set()
+        patch = mock.patch.object(tinkoff_api, "Client", FakeClient)
+        patch.start()
+        self.addCleanup(patch.stop)
+        self.api = TinkoffAPI("token", max_workers=2)
+        self.addCleanup(self.api.close)
+        self.range = (datetime(2025, 1, 1), datetime(2025, 1, 2), "CANDLE_INTERVAL_1_MIN")
+
+    def test_client_reused_per_thread(self):
+        self.api.get_candles("A", *self.range)
+        self.api.get_candles("B", *self.range)
+        self.assertEqual(len(FakeClient.instances), 1)
+
+        thread = threading.Thread(target=self.api.get_candles, args=("C", *self.range))
+        thread.start()
+        thread.join()
+        self.assertEqual(len(FakeClient.instances), 2)
+        self.assertNotEqual(FakeClient.instances[0].thread, FakeClient.instances[1].thread)
+
+    def test_error_drops_client(self):
+        self.api.get_candles("A", *self.range)
+        FakeClient.failing = {"BAD"}
+        self.assertTrue(self.api.get_candles("BAD", *self.range).empty)
+        self.assertTrue(FakeClient.instances[0].closed)
+        self.assertEqual(self.api._clients, [])
+
+        # Следующий запрос открывает новый канал
+        self.assertEqual(len(self.api.get_candles("A", *self.range)), 3)
+        self.assertEqual(len(FakeClient.instances), 2)
+
+    def test_get_candles_many(self):
+        frames = self.api.get_candles_many(["A", "B", "C", "D"], *self.range)
+        self.assertEqual(list(frames), ["A", "B", "C", "D"])
+        self.assertTrue(all(len(df) == 3 for df in frames.values()))
+        self.assertLessEqual(len(FakeClient.instances), 2)
+
+        self.api.close()
+        self.assertIsNone(self.api._executor)
+        self.assertTrue(all(client.closed for client in FakeClient.instances))
+
+    def test_single_executor_under_concurrency(self):
+        created = []
+        real_executor = tinkoff_api.ThreadPoolExecutor
+
+        def slow_executor(*args, **kwargs):
+            # Окно гонки: без блокировки второй поток успел бы создать свой пул
+            created.append(1)
+            threading.Event().wait(0.05)
+            return real_executor(*args, **kwargs)
+
+        with mock.patch.object(tinkoff_api, "ThreadPoolExecutor", slow_executor):
+            threads = [threading.Thread(target=self.api.get_candles_many, args=(["A", "B"], *self.range))
+                       for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(len(created), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()